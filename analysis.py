@@ -0,0 +1,259 @@
+"""Telemetry analysis pipeline: log entries in, JSON-ready result out.
+
+Kept free of web-server state so background job processes can import it
+without starting the Flask app.
+"""
+import os
+import logging
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Sequence
+import pandas as pd
+import numpy as np
+from extraction import FLOAT_FIELDS, extract_telemetry_parallel
+from scoring import compute_fleet_metrics, PartialMetrics
+from progress import ProgressCallback
+from serialization import frame_to_records
+
+logger = logging.getLogger(__name__)
+
+# Parallel extraction of nested payloads (1 = extract in-process)
+EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', 1))
+EXTRACTION_CHUNK_SIZE = int(os.getenv('EXTRACTION_CHUNK_SIZE', 2000))
+
+# Log entries parsed between two progress reports
+PROGRESS_ENTRIES = 100
+
+# Devices scored, and telemetry rows converted for the result, between two
+# progress reports
+PROGRESS_DEVICES = 500
+PROGRESS_ROWS = 50000
+
+# Version of the analysis output, stored with each analysis. Uploads with
+# the same content reuse an analysis of the same version; bump it whenever
+# a change alters the results, so such uploads are processed again.
+ANALYZER_VERSION = '2'
+
+# Analyzer versions (None: not recorded) whose analyses stored an absent
+# ignitionOn as 0, like a false one; see stored_telemetry_frame
+ZERO_FLAG_VERSIONS = frozenset({None, '1'})
+
+# Timestamp fields, parsed to UTC datetimes floored to the second
+TIME_FIELDS = ('time', 'lastFixTime', 'receiveTimestamp')
+
+# Extraction quality flags that are not stored with the telemetry, and the
+# stored field each is rederived from: the payload carried a value (or, for
+# gps_ok, a 'Good' quality).
+STORED_FLAG_SOURCES = {
+    'has_rpm': 'engineRPM',
+    'has_speed': 'vehicleSpeed',
+    'has_temp': 'engineCoolantTemperature',
+    'has_dist': 'totalDistance',
+    'has_fuel_total': 'totalFuelUsed',
+    'has_fuel_level': 'fuelLevelInput',
+    'has_ignition': 'ignitionOn',
+    'gps_ok': 'quality',
+}
+
+
+def sanitize_for_json(obj):
+    """Recursively convert NaN, Inf, -Inf to None for JSON serialization."""
+    if isinstance(obj, dict):
+        return {k: sanitize_for_json(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [sanitize_for_json(v) for v in obj]
+    elif isinstance(obj, float):
+        if np.isnan(obj) or np.isinf(obj):
+            return None
+    return obj
+
+def clean_df_for_json(df):
+    """Convert a DataFrame to a list of dicts suitable for JSON serialization.
+
+    NaN/Inf become None and timestamps strings, one column at a time; see
+    serialization.frame_to_records.
+    """
+    return frame_to_records(df)
+
+
+def lean_result(result):
+    """Return an analysis result without its telemetry rows.
+
+    Same shape as Database.get_analysis returns: the rows are paged through
+    /api/result/<id>/telemetry instead.
+    """
+    return {**result, 'raw_data_sample': []}
+
+
+def _report_parsing(logs_data: Iterable, progress: ProgressCallback) -> Iterator:
+    """Pass log entries through, reporting entries parsed and bytes read.
+
+    Bytes are reported when logs_data tracks them (a LogStreamReader).
+    """
+    total_bytes = getattr(logs_data, 'total_bytes', None)
+    count = 0
+    for count, entry in enumerate(logs_data, 1):
+        if count % PROGRESS_ENTRIES == 0:
+            progress('parse', count, None)
+            if total_bytes is not None:
+                progress('read', logs_data.bytes_read, total_bytes)
+        yield entry
+    progress('parse', count, None)
+    if total_bytes is not None:
+        progress('read', total_bytes, total_bytes)
+
+
+def _score_devices(df: pd.DataFrame, progress: ProgressCallback):
+    """compute_fleet_metrics, reporting devices scored.
+
+    The devices are scored PROGRESS_DEVICES at a time, in IMEI order, and
+    the parts' PartialMetrics merged; rows without an IMEI go with the last
+    part.
+    """
+    codes, imeis = pd.factorize(df['imei'], sort=True)
+    codes = np.where(codes < 0, len(imeis), codes)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(PROGRESS_DEVICES, len(imeis), PROGRESS_DEVICES))
+    partials = []
+    for part, rows in enumerate(np.split(order, bounds), 1):
+        partials.append(PartialMetrics.from_frame(df.iloc[rows]))
+        progress('score', min(part * PROGRESS_DEVICES, len(imeis)), len(imeis))
+    return PartialMetrics.merge(partials).finalize()
+
+
+def _convert_rows(df: pd.DataFrame, progress: ProgressCallback):
+    """clean_df_for_json, reporting the rows converted every PROGRESS_ROWS."""
+    records = []
+    progress('convert', 0, len(df))
+    for start in range(0, len(df), PROGRESS_ROWS):
+        records += clean_df_for_json(df.iloc[start:start + PROGRESS_ROWS])
+        progress('convert', len(records), len(df))
+    return records
+
+
+def process_log_data(logs_data, filename, progress: Optional[ProgressCallback] = None):
+    """
+    Advanced Analytics v2.0 - Deep Telemetry Forensic Logic
+
+    logs_data may be a list or any iterable of log entries (e.g. a
+    LogStreamReader), so uploads can be consumed as a stream.
+
+    progress, if given, is called as progress(stage, done, total) with the
+    entries parsed ('parse'), bytes read ('read'), devices scored ('score')
+    and rows converted for the result ('convert'); see the progress module.
+    """
+    if progress is not None:
+        logs_data = _report_parsing(logs_data, progress)
+
+    columns = extract_telemetry_parallel(
+        logs_data, workers=EXTRACTION_WORKERS, chunk_size=EXTRACTION_CHUNK_SIZE
+    )
+
+    logger.info(f"Processed {columns.entries_seen} records for v2.0...")
+    if not len(columns): return None
+
+    df = columns.to_dataframe()
+    
+    # Conversions
+    for col in TIME_FIELDS:
+        df[col] = pd.to_datetime(df[col], format='ISO8601', errors='coerce', utc=True).dt.floor('s')
+    
+    df['delay_seconds'] = (df['receiveTimestamp'] - df['time']).dt.total_seconds().clip(lower=0)
+
+    return analyze_frame(df, filename, progress)
+
+
+def stored_telemetry_frame(batches: Iterable[List[tuple]], keys: Sequence[str],
+                           null_flags: bool = True) -> pd.DataFrame:
+    """Rebuild the analysis frame of stored telemetry rows.
+
+    Args:
+        batches: Lists of row tuples, as Database.iter_telemetry yields them
+        keys: Result key of each tuple position
+        null_flags: False for rows stored with an absent ignitionOn as 0
+            (ZERO_FLAG_VERSIONS); only a true one then counts as ignition data
+
+    Returns:
+        Frame with the columns process_log_data scores: the stored fields
+        (numeric ones as float64, as extracted), times parsed back to
+        datetimes and the quality flags rederived (see STORED_FLAG_SOURCES)
+    """
+    rows = [row for batch in batches for row in batch]
+    df = pd.DataFrame.from_records(rows, columns=list(keys), coerce_float=True)
+    # A column with no values at all comes back as object
+    for col in FLOAT_FIELDS.intersection(df.columns):
+        df[col] = df[col].astype(np.float64)
+    for col in TIME_FIELDS:
+        df[col] = pd.to_datetime(df[col], format='ISO8601', errors='coerce', utc=True)
+    for flag, source in STORED_FLAG_SOURCES.items():
+        if flag == 'gps_ok':
+            df[flag] = df[source] == 'Good'
+        elif flag == 'has_ignition' and not null_flags:
+            df[flag] = df[source] == 1
+        else:
+            df[flag] = df[source].notna()
+    return df
+
+
+def merge_frames(frames: Iterable[pd.DataFrame], filename: str,
+                 progress: Optional[ProgressCallback] = None):
+    """Analyze the telemetry of several analyses as a single upload.
+
+    The frames are concatenated in the given order, so a row duplicated
+    across analyses is kept from the first, as when the uploads' logs are
+    concatenated and processed.
+
+    Args:
+        frames: Frames from stored_telemetry_frame, one per analysis
+        filename: Name of the merged analysis
+        progress: Optional callback, as for process_log_data ('score' and
+            'convert' only)
+
+    Returns:
+        The analysis result, or None if there are no rows
+    """
+    df = pd.concat(list(frames), ignore_index=True)
+    if df.empty:
+        return None
+    return analyze_frame(df, filename, progress)
+
+
+def analyze_frame(df: pd.DataFrame, filename: str, progress: Optional[ProgressCallback] = None):
+    """Deduplicate and score a telemetry frame into an analysis result."""
+    # Deduplication
+    df = df.drop_duplicates(subset=['imei', 'time', 'lat', 'lng'], keep='first')
+
+    # Mark ignition as available for devices that have ignition events or addOns.ignitionOn
+    ign_events = df['event_type'].isin(['Ignition On', 'Ignition Off'])
+    devices_with_ignition = df.loc[ign_events | df['has_ignition'], 'imei'].unique()
+    df.loc[df['imei'].isin(devices_with_ignition), 'has_ignition'] = True
+
+    # --- ADVANCED METRICS, STATISTICS AND GLOBAL RADAR PER IMEI (single pass) ---
+    total_devices = int(df['imei'].nunique())
+    if progress is None:
+        scorecard, global_quality = compute_fleet_metrics(df)
+    else:
+        progress('score', 0, total_devices)
+        scorecard, global_quality = _score_devices(df, progress)
+
+    summary = {
+        "filename": filename,
+        "processed_at": datetime.now().isoformat(),
+        "total_devices": total_devices,
+        "total_records": int(len(df)),
+        "total_distance_km": float(round(scorecard['Distancia_Recorrida_(KM)'].sum(), 2)),
+        "average_quality_score": float(round(scorecard['Puntaje_Calidad'].mean(), 2))
+    }
+    
+    # Row lists come out of clean_df_for_json JSON-ready; only the small
+    # parts need the recursive sanitizer
+    result = {
+        "summary": sanitize_for_json(summary),
+        "scorecard": clean_df_for_json(scorecard),
+        "raw_data_sample": clean_df_for_json(df) if progress is None else _convert_rows(df, progress),
+        "data_quality": sanitize_for_json(global_quality),
+        "chart_data": sanitize_for_json({
+            "score_distribution": scorecard['Puntaje_Calidad'].tolist(),
+            "events_summary": df['event_type'].value_counts().to_dict()
+        })
+    }
+    return result
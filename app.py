@@ -1,16 +1,20 @@
 import os
 import json
 import uuid
-import codecs
 import logging
 from logging.handlers import RotatingFileHandler
-from datetime import datetime
-import pandas as pd
-import numpy as np
-from flask import Flask, render_template, request, jsonify, send_from_directory
-from flask_restx import Api, Resource, Namespace, fields
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory
+from flask_restx import Api, Resource, Namespace, fields, inputs
 from werkzeug.datastructures import FileStorage
-from database import Database, migrate_json_to_sqlite
+import pandas as pd
+from database import Database, TELEMETRY_COLUMN_MAP, TELEMETRY_RANGE_COLUMNS, migrate_json_to_sqlite
+from ingest import LogStreamReader, save_upload
+from extraction import normalize_event_type
+from analysis import (ANALYZER_VERSION, ZERO_FLAG_VERSIONS, process_log_data, stored_telemetry_frame,
+                      merge_frames, lean_result, sanitize_for_json, clean_df_for_json)
+from export import EXPORT_FORMATS, parquet_available, stream_csv, stream_parquet
+from serialization import dumps
+from geo import DEFAULT_ROUTE_POINTS, MAX_ROUTE_POINTS, MAX_MAP_ZOOM, build_route, parse_bbox
 from worker import (
     BackgroundWorker, submit_job, get_job_status,
     generate_progress_events, should_process_async
@@ -33,6 +37,14 @@ api = Api(
     catch_all_404s=False  # Allow regular Flask routes to work
 )
 
+
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    """Encode API responses with the fast JSON backend (orjson if installed)."""
+    response = app.response_class(dumps(data), status=code, mimetype='application/json')
+    response.headers.extend(headers or {})
+    return response
+
 # Namespaces
 ns_analysis = api.namespace('api', description='Telemetry analysis operations')
 
@@ -47,13 +59,26 @@ LOGS_FOLDER = os.path.join(DATA_DIR, 'logs')
 MAX_UPLOAD_SIZE_MB = int(os.getenv('MAX_UPLOAD_SIZE_MB', 100))
 app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE_MB * 1024 * 1024
 
+# Background jobs: concurrent jobs, and per-job limits (0 = unlimited).
+# JOB_ISOLATION=thread runs jobs in-process, where the limits do not apply.
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 1))
+JOB_TIMEOUT_SECONDS = int(os.getenv('JOB_TIMEOUT_SECONDS', 3600))
+JOB_MEMORY_LIMIT_MB = int(os.getenv('JOB_MEMORY_LIMIT_MB', 0))
+JOB_ISOLATION = os.getenv('JOB_ISOLATION', 'process').lower()
+# Durable queue: lease renewed by heartbeat, claims before a crashing job fails
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 60))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 os.makedirs(LOGS_FOLDER, exist_ok=True)
 
-# Initialize SQLite database
+# Initialize SQLite database. Raw telemetry rows of new analyses are kept
+# in the telemetry_data table (sqlite) or as column files (columnar).
 DB_PATH = os.path.join(DATA_DIR, 'telemetry.db')
-db = Database(DB_PATH)
+TELEMETRY_STORAGE = os.getenv('TELEMETRY_STORAGE', 'sqlite').lower()
+TELEMETRY_DIR = os.path.join(DATA_DIR, 'telemetry')
+db = Database(DB_PATH, TELEMETRY_STORAGE, TELEMETRY_DIR)
 
 # Initialize background worker (will be started after process_log_data is defined)
 background_worker = None
@@ -90,7 +115,8 @@ history_entry_model = api.model('HistoryEntry', {
 
 upload_response_model = api.model('UploadResponse', {
     'id': fields.String(description='Analysis ID'),
-    'data': fields.Raw(description='Full analysis result')
+    'data': fields.Raw(description='Analysis result; raw_data_sample is empty unless full=true'),
+    'deduplicated': fields.Boolean(description='True if an identical upload was already analyzed and its analysis is returned')
 })
 
 error_model = api.model('Error', {
@@ -105,6 +131,39 @@ rename_model = api.model('RenameInput', {
     'filename': fields.String(required=True, description='New display name')
 })
 
+merge_model = api.model('MergeInput', {
+    'analysis_ids': fields.List(fields.String, required=True,
+                                description='Analyses to merge (at least two); a row found in several '
+                                            'is kept from the first listed'),
+    'filename': fields.String(description='Name of the merged analysis (default merged_<n>_analyses)')
+})
+
+fleet_map_model = api.model('FleetMap', {
+    'type': fields.String(description='FeatureCollection'),
+    'bbox': fields.List(fields.Float, description='West, south, east, north of all the devices'),
+    'devices': fields.Integer(description='Devices with a GPS fix in the analysis'),
+    'zoom': fields.Integer(description='Zoom the clusters were built for'),
+    'features': fields.Raw(description='GeoJSON points: clusters with devices and points counts; '
+                                       'single devices also carry imei and time')
+})
+
+route_model = api.model('Route', {
+    'imei': fields.String(description='Device IMEI'),
+    'total_points': fields.Integer(description='Points with a valid GPS fix before simplification'),
+    'points': fields.Raw(description='Simplified route as [lat, lng] pairs, in time order'),
+    'events': fields.Raw(description='Event points (lat, lng, time, speed, event_type), all kept'),
+    'start': fields.Raw(description='First point (lat, lng, time)'),
+    'end': fields.Raw(description='Last point (lat, lng, time)')
+})
+
+device_history_model = api.model('DeviceHistory', {
+    'imei': fields.String(description='Device IMEI'),
+    'total': fields.Integer(description='Analyses with a scorecard for the device'),
+    'history': fields.Raw(description='Per analysis, oldest period first: analysis_id, filename, '
+                                      'processed_at, Primer_Reporte/Ultimo_Reporte and the score '
+                                      'components (Puntaje_Calidad, Odo_Quality_Score, ...)')
+})
+
 job_response_model = api.model('JobResponse', {
     'job_id': fields.String(description='Background job ID'),
     'status': fields.String(description='Job status (pending/processing/completed/failed)')
@@ -113,14 +172,30 @@ job_response_model = api.model('JobResponse', {
 job_status_model = api.model('JobStatus', {
     'status': fields.String(description='Job status'),
     'progress': fields.Integer(description='Processing progress (0-100)'),
+    'stage': fields.String(description='Pipeline stage being run (read/score/save)'),
+    'eta_seconds': fields.Float(description='Estimated seconds left, from the throughput so far'),
+    'detail': fields.Raw(description='Records parsed, bytes read, devices scored and rows persisted'),
     'analysis_id': fields.String(description='Analysis ID when completed'),
     'error': fields.String(description='Error message if failed'),
-    'data': fields.Raw(description='Analysis result when completed')
+    'data': fields.Raw(description='Analysis result when completed, loaded from the database')
+})
+
+job_queue_model = api.model('JobQueue', {
+    'queued': fields.Integer(description='Jobs waiting for a worker, across all app processes'),
+    'processing': fields.Integer(description='Jobs being processed, across all app processes'),
+    'running': fields.Integer(description='Jobs being processed by this app process'),
+    'workers': fields.Integer(description='Maximum concurrent jobs'),
+    'isolated': fields.Boolean(description='Whether jobs run in separate processes'),
+    'running_jobs': fields.Raw(description='Job IDs being processed, with their process IDs')
 })
 
 # File upload parser
 upload_parser = api.parser()
 upload_parser.add_argument('file', location='files', type=FileStorage, required=True, help='JSON telemetry log file')
+upload_parser.add_argument('full', location='args', type=inputs.boolean, default=False,
+                           help='Include every telemetry row in the response (default false)')
+upload_parser.add_argument('reprocess', location='args', type=inputs.boolean, default=False,
+                           help='Analyze the file even if identical content was already analyzed (default false)')
 
 # Migrate existing JSON data to SQLite on startup
 if os.path.exists(HISTORY_FILE):
@@ -152,359 +227,6 @@ def load_history():
         return []
 
 
-def sanitize_for_json(obj):
-    """Recursively convert NaN, Inf, -Inf to None for JSON serialization."""
-    if isinstance(obj, dict):
-        return {k: sanitize_for_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [sanitize_for_json(v) for v in obj]
-    elif isinstance(obj, float):
-        if np.isnan(obj) or np.isinf(obj):
-            return None
-    return obj
-
-def normalize_event_type(raw_type):
-    """Map raw event types/codes to normalized strings expected by frontend."""
-    if not raw_type:
-        return None
-    
-    # Handle numeric types directly
-    if isinstance(raw_type, int):
-        mapping = {
-            6: 'Ignition On',
-            7: 'Ignition Off',
-            16: 'Harsh Breaking',
-            17: 'Harsh Acceleration',
-            18: 'Harsh Turn',
-            1: 'SOS'
-        }
-        return mapping.get(raw_type, str(raw_type))
-    
-    # Convert to lowercase for case-insensitive matching
-    raw_lower = str(raw_type).lower().strip()
-    
-    # Common mappings based on typical provider JSON
-    mapping = {
-        '6': 'Ignition On',
-        'ignition_on': 'Ignition On',
-        'ignitionon': 'Ignition On',
-        '7': 'Ignition Off',
-        'ignition_off': 'Ignition Off',
-        'ignitionoff': 'Ignition Off',
-        '16': 'Harsh Breaking',
-        'braking_harsh': 'Harsh Breaking',
-        'harsh_braking': 'Harsh Breaking',
-        'harshbraking': 'Harsh Breaking',
-        '17': 'Harsh Acceleration',
-        'acceleration_harsh': 'Harsh Acceleration',
-        'harsh_acceleration': 'Harsh Acceleration',
-        'harshacceleration': 'Harsh Acceleration',
-        '18': 'Harsh Turn',
-        'cornering_harsh': 'Harsh Turn',
-        'harsh_turn': 'Harsh Turn',
-        'harshturn': 'Harsh Turn',
-        'sos': 'SOS',
-        'panic': 'SOS',
-        '1': 'SOS'
-    }
-    return mapping.get(raw_lower, str(raw_type))
-
-def clean_df_for_json(df):
-    """Convert a DataFrame to a list of dicts suitable for JSON serialization."""
-    df_clean = df.copy()
-    # Handle Timestamps
-    for col in df_clean.select_dtypes(include=['datetime64[ns]', 'datetime64[ns, UTC]', 'datetime64']).columns:
-        df_clean[col] = df_clean[col].astype(str).replace(['NaT', 'nan', 'None'], None)
-    
-    # Handle NaNs and Infs explicitly by converting to object and replacing
-    df_clean = df_clean.replace([np.inf, -np.inf, np.nan], None)
-    
-    # Final safety pass via dictionary conversion + recursive sanitizer
-    data_list = df_clean.to_dict(orient='records')
-    return sanitize_for_json(data_list)
-
-def process_log_data(logs_data, filename):
-    """
-    Advanced Analytics v2.0 - Deep Telemetry Forensic Logic
-    """
-    print(f"Processing {len(logs_data)} records for v2.0...")
-    
-    all_telemetry_data = []
-    processed_logs_insertIds = set()
-    decoder = json.JSONDecoder()
-
-    # --- EXTRACTION LOGIC ---
-    for log_entry in logs_data:
-        try:
-            receive_ts = log_entry.get('receiveTimestamp')
-            json_payload = log_entry.get('jsonPayload', {})
-            data_obj = json_payload.get('data', {}) if isinstance(json_payload, dict) else {}
-            additional_info_str = data_obj.get('AdditionalInformation')
-            
-            if not additional_info_str:
-                continue
-
-            telemetry_list = []
-            try:
-                additional_info_data = json.loads(additional_info_str)
-                arguments_str = additional_info_data.get('Arguments')
-                if arguments_str:
-                    arguments_data = json.loads(arguments_str)
-                    message_content = arguments_data.get('message')
-                    if message_content:
-                        parsed_data = json.loads(message_content) if isinstance(message_content, str) else message_content
-                        if isinstance(parsed_data, dict): telemetry_list.append(parsed_data)
-                        elif isinstance(parsed_data, list): telemetry_list = parsed_data
-            except Exception as e:
-                logger.debug(f"Primary JSON parsing failed, trying fallback: {e}")
-                # Fallback extraction
-                start_marker = '\\"message\\":'
-                start_index = additional_info_str.find(start_marker)
-                if start_index != -1:
-                    text_to_decode = additional_info_str[start_index + len(start_marker):]
-                    try:
-                        clean_text = codecs.decode(text_to_decode, 'unicode_escape').strip().strip('"')
-                        parsed_data, _ = decoder.raw_decode(clean_text)
-                        if isinstance(parsed_data, dict): telemetry_list.append(parsed_data)
-                        elif isinstance(parsed_data, list): telemetry_list = parsed_data
-                    except Exception as e:
-                        logger.debug(f"Fallback JSON parsing failed: {e}")
-
-            for point in telemetry_list:
-                if not isinstance(point, dict) or 'imei' not in point: continue
-                
-                addons = point.get('addOns', {})
-                canbus = addons.get('canbus', {})
-                event = point.get('event', {})
-
-                all_telemetry_data.append({
-                    'imei': point.get('imei'),
-                    'time': point.get('time'),
-                    'receiveTimestamp': receive_ts,
-                    'lat': point.get('lat'),
-                    'lng': point.get('lng'),
-                    'altitude': point.get('altitude'),
-                    'speed': point.get('speed'),
-                    'heading': point.get('heading'),
-                    'lastFixTime': point.get('lastFixTime'),
-                    'isMoving': point.get('isMoving'),
-                    'batteryLevelPercentage': point.get('batteryLevelPercentage'),
-                    'reportMode': point.get('reportMode'),
-                    'quality': point.get('quality'),
-                    'mileage': addons.get('mileage'),
-                    'ignitionOn': addons.get('ignitionOn'),
-                    'externalPowerVcc': addons.get('externalPowerVcc'),
-                    'digitalInput': addons.get('digitalInput'),
-                    'driverId': addons.get('driverId'),
-                    'engineRPM': canbus.get('engineRPM'),
-                    'vehicleSpeed': canbus.get('vehicleSpeed'),
-                    'engineCoolantTemperature': canbus.get('engineCoolantTemperature'),
-                    'totalDistance': canbus.get('totalDistance'),
-                    'totalFuelUsed': canbus.get('totalFuelUsed'),
-                    'fuelLevelInput': canbus.get('fuelLevelInput'),
-                    'event_type': normalize_event_type(
-                        point.get('event', {}).get('type') or 
-                        point.get('alert', {}).get('type') or 
-                        point.get('type') or 
-                        point.get('eventId') or 
-                        addons.get('alert')
-                    ),
-                    # Quality Indicators for Radar
-                    'has_rpm': canbus.get('engineRPM') is not None,
-                    'has_speed': canbus.get('vehicleSpeed') is not None,
-                    'has_temp': canbus.get('engineCoolantTemperature') is not None,
-                    'has_dist': canbus.get('totalDistance') is not None,
-                    'has_fuel_total': canbus.get('totalFuelUsed') is not None,
-                    'has_fuel_level': canbus.get('fuelLevelInput') is not None,
-                    'has_ignition': addons.get('ignitionOn') is not None,
-                    'gps_ok': point.get('quality') == 'Good'
-                })
-        except Exception as e:
-            logger.warning(f"Failed to process log entry: {e}")
-
-    if not all_telemetry_data: return None
-
-    df = pd.DataFrame(all_telemetry_data)
-    
-    # Conversions
-    for col in ['time', 'lastFixTime', 'receiveTimestamp']:
-        df[col] = pd.to_datetime(df[col], format='ISO8601', errors='coerce', utc=True).dt.floor('s')
-    
-    df['delay_seconds'] = (df['receiveTimestamp'] - df['time']).dt.total_seconds().clip(lower=0)
-    df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
-    df['lng'] = pd.to_numeric(df['lng'], errors='coerce')
-    df['speed'] = pd.to_numeric(df['speed'], errors='coerce')
-    df['mileage'] = pd.to_numeric(df['mileage'], errors='coerce')
-    df['engineRPM'] = pd.to_numeric(df['engineRPM'], errors='coerce')
-
-    # Deduplication
-    df = df.drop_duplicates(subset=['imei', 'time', 'lat', 'lng'], keep='first')
-
-    # Mark ignition as available for devices that have ignition events or addOns.ignitionOn
-    ign_events = df['event_type'].isin(['Ignition On', 'Ignition Off'])
-    devices_with_ignition = df.loc[ign_events | df['has_ignition'], 'imei'].unique()
-    df.loc[df['imei'].isin(devices_with_ignition), 'has_ignition'] = True
-
-    # --- IGNITION QUALITY HELPER ---
-    def calc_ignition_quality(group):
-        ign_on = (group['event_type'] == 'Ignition On').sum()
-        ign_off = (group['event_type'] == 'Ignition Off').sum()
-        has_addon = group['has_ignition'].any()
-        if ign_on == 0 and ign_off == 0 and not has_addon:
-            return 0.0
-        if ign_on == 0 and ign_off == 0 and has_addon:
-            return 100.0
-        max_ign = max(ign_on, ign_off)
-        min_ign = min(ign_on, ign_off)
-        if abs(ign_on - ign_off) <= 1:
-            return 100.0
-        return (min_ign / max_ign) * 100 if max_ign > 0 else 0.0
-
-    # --- ADVANCED METRICS PER IMEI ---
-    def calculate_v2_metrics(group):
-        group = group.sort_values('time')
-        total = len(group)
-        
-        # 1. Odometer Quality
-        # a) Decreasing
-        odo_diff = group['mileage'].diff()
-        odo_drops = (odo_diff < 0).sum()
-        # b) Frozen (Moving but mileage static)
-        # Using a simple threshold for movement: speed > 5 or lat/lng diff
-        dist_change = (group['lat'].diff().abs() > 0.0001) | (group['lng'].diff().abs() > 0.0001)
-        frozen_odo = (dist_change & (odo_diff == 0)).sum()
-        odo_score = max(0, 100 - (odo_drops + frozen_odo) / total * 100)
-        
-        # 2. CAN Bus Completeness (6 specific fields)
-        canbus_fields = ['has_rpm', 'has_speed', 'has_temp', 'has_dist', 'has_fuel_total', 'has_fuel_level']
-        canbus_score = group[canbus_fields].mean().mean() * 100
-        
-        # 3. Latency
-        avg_delay = group['delay_seconds'].mean()
-        # Points: 100 if < 30s, linear drop to 0 at 300s
-        delay_score = 100 if avg_delay <= 30 else max(0, 100 - (avg_delay - 30) * (100/270))
-        
-        # 4. GPS Integrity
-        gps_score = (group['gps_ok'].sum() / total) * 100
-
-        # 5. Ignition Balance
-        ign_on = (group['event_type'] == 'Ignition On').sum()
-        ign_off = (group['event_type'] == 'Ignition Off').sum()
-        ign_balance = abs(ign_on - ign_off)
-        ign_score = 100 if ign_balance <= 1 else max(0, 100 - (ign_balance * 10))
-
-        # --- FORENSIC INTELLIGENCE (V2.1) ---
-        # 6. Frozen Sensor Penalties
-        # RPM Frozen: If Ign On and Moving, but RPM is 0 or static
-        moving = (group['speed'] > 5) & (group['ignitionOn'] == 1)
-        rpm_variability = group.loc[moving, 'engineRPM'].nunique() if moving.any() else 2
-        rpm_frozen_penalty = 15 if (moving.any() and (rpm_variability <= 1 or group.loc[moving, 'engineRPM'].mean() == 0)) else 0
-        
-        # Temp/Speed Frozen: General check if changing over session
-        has_temp = group['engineCoolantTemperature'].notnull().any()
-        temp_variability = group['engineCoolantTemperature'].nunique() if has_temp else 2
-        temp_frozen_penalty = 10 if (has_temp and temp_variability <= 1 and total > 10) else 0
-
-        # Final Weighted Score (35% CAN, 25% ODO, 20% GPS, 10% Delay, 10% IGN)
-        final_score = (canbus_score * 0.35 + odo_score * 0.25 + gps_score * 0.20 + delay_score * 0.10 + ign_score * 0.10)
-        
-        # Penalties application
-        final_score = max(0, final_score - rpm_frozen_penalty - temp_frozen_penalty)
-        
-        # RPM Anormal penalty (Existing)
-        rpm_anormal_penalty = (group['engineRPM'] > 8000).sum() / total * 50
-        final_score = max(0, final_score - rpm_anormal_penalty)
-
-        # Event counts for Stats
-        harsh_breaking = (group['event_type'] == 'Harsh Breaking').sum()
-        harsh_accel = (group['event_type'] == 'Harsh Acceleration').sum()
-        harsh_turn = (group['event_type'] == 'Harsh Turn').sum()
-        sos = (group['event_type'] == 'SOS').sum()
-
-        driver_id = group['driverId'].dropna().iloc[0] if not group['driverId'].dropna().empty else "N/A"
-
-        return pd.Series({
-            'Puntaje_Calidad': round(final_score, 2),
-            'Total_Reportes': total,
-            'Delay_Avg': round(avg_delay, 2),
-            'Odo_Quality_Score': round(odo_score, 2),
-            'Canbus_Completeness': round(canbus_score, 2),
-            'GPS_Integrity': round(gps_score, 2),
-            'Ignition_Balance': ign_balance,
-            'Ignition_On': ign_on,
-            'Ignition_Off': ign_off,
-            'Harsh_Events': harsh_breaking + harsh_accel + harsh_turn,
-            'SOS_Count': sos,
-            'Harsh_Breaking': harsh_breaking,
-            'Harsh_Acceleration': harsh_accel,
-            'Harsh_Turn': harsh_turn,
-            'RPM_Anormal_Count': (group['engineRPM'] > 8000).sum(),
-            'Lat_Lng_Correct_Variation': "OK" if dist_change.sum() > 0 else "Static",
-            'Driver_ID': str(driver_id),
-            'Frozen_Sensors': (("RPM " if rpm_frozen_penalty > 0 else "") + ("Temp" if temp_frozen_penalty > 0 else "")).strip() or "None",
-            'Radar_GPS': round(gps_score, 2),
-            'Radar_Ignition': round(calc_ignition_quality(group), 2),
-            'Radar_Delay': round((group['delay_seconds'] < 60).mean() * 100, 2),
-            'Radar_RPM': round(group['has_rpm'].mean() * 100, 2),
-            'Radar_Speed': round(group['has_speed'].mean() * 100, 2),
-            'Radar_Temp': round(group['has_temp'].mean() * 100, 2),
-            'Radar_Dist': round(group['has_dist'].mean() * 100, 2),
-            'Radar_Fuel': round(group['has_fuel_total'].mean() * 100, 2)
-        })
-
-    imei_metrics = df.groupby('imei').apply(calculate_v2_metrics).reset_index()
-
-    # --- STATISTICS ---
-    stats = df.groupby('imei').agg({
-        'time': [('Primer_Reporte', 'min'), ('Ultimo_Reporte', 'max')],
-        'mileage': [('KM_Inicial', 'min'), ('KM_Final', 'max')],
-        'speed': [('Velocidad_Promedio_(KPH)', 'mean'), ('Velocidad_Maxima_(KPH)', 'max')],
-        'engineRPM': [('RPM_Promedio', 'mean')],
-        'fuelLevelInput': [('Nivel_Combustible_Promedio_%', 'mean')]
-    })
-    stats.columns = stats.columns.droplevel(0)
-    stats = stats.reset_index()
-    stats['Distancia_Recorrida_(KM)'] = (stats['KM_Final'] - stats['KM_Inicial']).clip(lower=0)
-    
-    # Merge all into scorecard for Frontend
-    scorecard = imei_metrics.merge(stats[['imei', 'Distancia_Recorrida_(KM)', 'KM_Inicial', 'KM_Final', 'Primer_Reporte', 'Ultimo_Reporte', 'Velocidad_Promedio_(KPH)', 'Velocidad_Maxima_(KPH)', 'RPM_Promedio', 'Nivel_Combustible_Promedio_%']], on='imei', how='left')
-
-    # --- GLOBAL RADAR DATA ---
-    ignition_scores = df.groupby('imei').apply(calc_ignition_quality)
-    ignition_avg = float(ignition_scores.mean()) if len(ignition_scores) > 0 else 0.0
-
-    global_quality = {
-        'gps_validity': df['gps_ok'].mean() * 100,
-        'ignition': ignition_avg,
-        'delay': (df['delay_seconds'] < 60).mean() * 100,
-        'rpm': df['has_rpm'].mean() * 100,
-        'speed': df['has_speed'].mean() * 100,
-        'temp': df['has_temp'].mean() * 100,
-        'dist': df['has_dist'].mean() * 100,
-        'fuel': df['has_fuel_total'].mean() * 100
-    }
-
-    summary = {
-        "filename": filename,
-        "processed_at": datetime.now().isoformat(),
-        "total_devices": int(df['imei'].nunique()),
-        "total_records": int(len(df)),
-        "total_distance_km": float(round(stats['Distancia_Recorrida_(KM)'].sum(), 2)),
-        "average_quality_score": float(round(scorecard['Puntaje_Calidad'].mean(), 2))
-    }
-    
-    result = {
-        "summary": summary,
-        "scorecard": clean_df_for_json(scorecard),
-        "raw_data_sample": clean_df_for_json(df),
-        "data_quality": global_quality,
-        "chart_data": {
-            "score_distribution": scorecard['Puntaje_Calidad'].tolist(),
-            "events_summary": df['event_type'].value_counts().to_dict()
-        }
-    }
-    return sanitize_for_json(result)
-
 @app.before_request
 def check_content_length():
     if request.content_length and request.content_length > app.config['MAX_CONTENT_LENGTH']:
@@ -518,6 +240,79 @@ def request_entity_too_large(error):
     return jsonify({"error": f"File too large. Maximum size: {MAX_UPLOAD_SIZE_MB}MB"}), 413
 
 
+def find_existing_analysis(content_hash):
+    """Return the ID of a saved analysis of identical content, if any."""
+    try:
+        return db.find_analysis_by_content(content_hash, ANALYZER_VERSION)
+    except Exception as e:
+        logger.warning(f"Content lookup failed, processing upload: {e}")
+        return None
+
+
+def load_existing_analysis(analysis_id, full):
+    """Load a saved analysis for an upload response, with its rows if full."""
+    result = db.get_analysis(analysis_id)
+    if full:
+        total = max(1, result['summary']['total_records'])
+        result['raw_data_sample'] = db.get_telemetry_page(analysis_id, per_page=total)['rows']
+    return result
+
+
+def parse_time(text, ceil=False):
+    """Parse an ISO 8601 time into the stored format (UTC, whole seconds).
+
+    Times without an offset are taken as UTC. Fractions of a second round
+    down, or up with ceil, so inclusive bounds stay exact.
+
+    Raises:
+        ValueError: If the time is malformed
+    """
+    try:
+        value = pd.Timestamp(text)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid time: {text}") from e
+    if pd.isna(value):
+        raise ValueError(f"Invalid time: {text}")
+    value = value.tz_localize('UTC') if value.tzinfo is None else value.tz_convert('UTC')
+    value = value.ceil('s') if ceil else value.floor('s')
+    return value.strftime('%Y-%m-%d %H:%M:%S+00:00')
+
+
+def telemetry_filters(args):
+    """Build the range-query filters of a telemetry request.
+
+    Returns:
+        Filters for Database.get_telemetry_page, or None if none were given
+
+    Raises:
+        ValueError: If a filter is malformed
+    """
+    filters = {}
+    if args.get('start'):
+        filters['start'] = parse_time(args['start'], ceil=True)
+    if args.get('end'):
+        filters['end'] = parse_time(args['end'])
+    if args.get('bbox'):
+        filters['bbox'] = parse_bbox(args['bbox'])
+    if args.get('event_type'):
+        filters['event_types'] = [normalize_event_type(t) for t in args['event_type'].split(',') if t.strip()]
+
+    ranges = {}
+    for name, column in TELEMETRY_RANGE_COLUMNS.items():
+        bounds = []
+        for bound in ('min', 'max'):
+            text = args.get(f'{bound}_{name}')
+            try:
+                bounds.append(float(text) if text else None)
+            except ValueError as e:
+                raise ValueError(f"Invalid {bound}_{name}: {text}") from e
+        if bounds != [None, None]:
+            ranges[column] = tuple(bounds)
+    if ranges:
+        filters['ranges'] = ranges
+    return filters or None
+
+
 @ns_analysis.route('/upload')
 class Upload(Resource):
     @ns_analysis.doc('upload_file')
@@ -531,6 +326,12 @@ class Upload(Resource):
 
         For files larger than 10MB, processing is done in the background.
         Returns 202 Accepted with a job_id that can be used to track progress.
+        Otherwise returns the analysis without its telemetry rows, like
+        /result/<id>; pass full=true to include them.
+
+        A file identical to one already analyzed (same SHA-256 and analyzer
+        version) returns the existing analysis at once, with
+        deduplicated=true; pass reprocess=true to analyze it again.
         """
         if 'file' not in request.files:
             return {"error": "No file part"}, 400
@@ -541,39 +342,34 @@ class Upload(Resource):
         if file:
             filename = file.filename
             file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
+            file_size, content_hash = save_upload(file.stream, file_path)
+            full = request.args.get('full', False, type=inputs.boolean)
+
+            # Identical content already analyzed by this version: reuse it
+            if not request.args.get('reprocess', False, type=inputs.boolean):
+                existing_id = find_existing_analysis(content_hash)
+                if existing_id:
+                    logger.info(f"Upload {filename} matches analysis {existing_id}, reusing it")
+                    return {"id": existing_id, "data": load_existing_analysis(existing_id, full),
+                            "deduplicated": True}
 
             # Check file size for async processing
-            file_size = os.path.getsize(file_path)
             if should_process_async(file_size):
                 # Process large files in background
-                job_id = submit_job(file_path, filename, db)
+                job_id = submit_job(file_path, filename, db, content_hash)
                 logger.info(f"Large file ({file_size} bytes), processing async: job {job_id}")
                 return {"job_id": job_id, "status": "pending"}, 202
 
-            # Synchronous processing for smaller files
-            logs_data = []
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    logs_data = json.load(f)
-            except json.JSONDecodeError:
-                # Try line by line
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        if line.strip():
-                            try:
-                                logs_data.append(json.loads(line))
-                            except Exception as e:
-                                logger.debug(f"Failed to parse line as JSON: {e}")
-
-            result = process_log_data(logs_data, filename)
+            # Synchronous processing for smaller files (JSON array or NDJSON)
+            result = process_log_data(LogStreamReader(file_path), filename)
             if not result:
                 return {"error": "No valid telemetry data found"}, 400
 
             # Save Result to SQLite
             result_id = str(uuid.uuid4())
             try:
-                db.save_analysis(result_id, result)
+                db.save_analysis(result_id, result, content_hash=content_hash,
+                                 analyzer_version=ANALYZER_VERSION)
                 logger.info(f"Saved analysis {result_id} to database")
             except Exception as e:
                 logger.error(f"Failed to save to database: {e}")
@@ -582,9 +378,55 @@ class Upload(Resource):
                 with open(os.path.join(PROCESSED_FOLDER, result_filename), 'w') as f:
                     json.dump(result, f, indent=2)
 
+            # Telemetry rows are paged separately unless explicitly requested
+            if not full:
+                result = lean_result(result)
             return {"id": result_id, "data": result}
 
 
+@ns_analysis.route('/merge')
+class Merge(Resource):
+    @ns_analysis.doc('merge_analyses')
+    @ns_analysis.expect(merge_model)
+    @ns_analysis.response(200, 'Success', upload_response_model)
+    @ns_analysis.response(400, 'Bad Request', error_model)
+    @ns_analysis.response(404, 'Not Found', error_model)
+    def post(self):
+        """Merge analyses into a new one, as if their files were uploaded together.
+
+        The stored telemetry of each analysis is scored again as one
+        dataset, without reading the original logs; the merged analysis
+        is returned like an upload's, without its telemetry rows.
+        """
+        data = request.get_json(silent=True) or {}
+        analysis_ids = data.get('analysis_ids')
+        if not isinstance(analysis_ids, list) or not all(isinstance(i, str) for i in analysis_ids):
+            return {"error": "analysis_ids must be a list of analysis IDs"}, 400
+        analysis_ids = list(dict.fromkeys(analysis_ids))
+        if len(analysis_ids) < 2:
+            return {"error": "At least two distinct analyses are required"}, 400
+        for analysis_id in analysis_ids:
+            if not db.analysis_exists(analysis_id):
+                return {"error": f"Result not found: {analysis_id}"}, 404
+
+        filename = data.get('filename') or f"merged_{len(analysis_ids)}_analyses"
+        keys = [key for _, key in TELEMETRY_COLUMN_MAP]
+        result = merge_frames(
+            (stored_telemetry_frame(
+                db.iter_telemetry(analysis_id), keys,
+                null_flags=db.get_analyzer_version(analysis_id) not in ZERO_FLAG_VERSIONS
+            ) for analysis_id in analysis_ids),
+            filename
+        )
+        if not result:
+            return {"error": "No telemetry data to merge"}, 400
+
+        result_id = str(uuid.uuid4())
+        db.save_analysis(result_id, result, analyzer_version=ANALYZER_VERSION)
+        logger.info(f"Merged analyses {', '.join(analysis_ids)} into {result_id}")
+        return {"id": result_id, "data": lean_result(result)}
+
+
 @ns_analysis.route('/history')
 class HistoryList(Resource):
     @ns_analysis.doc('list_history')
@@ -594,6 +436,18 @@ class HistoryList(Resource):
         return load_history()
 
 
+@ns_analysis.route('/devices/<string:imei>/history')
+@ns_analysis.param('imei', 'The device IMEI')
+class DeviceHistory(Resource):
+    @ns_analysis.doc('get_device_history',
+        params={'limit': 'Optional number of most recent analyses to return'})
+    @ns_analysis.response(200, 'Success', device_history_model)
+    def get(self, imei):
+        """Retrieve a device's scorecard across all analyses, to follow its trend"""
+        limit = request.args.get('limit', None, type=int)
+        return db.get_device_history(imei, limit=max(0, limit) if limit is not None else None)
+
+
 @ns_analysis.route('/result/<string:id>')
 @ns_analysis.param('id', 'The analysis identifier')
 class Result(Resource):
@@ -622,24 +476,132 @@ class Telemetry(Resource):
         params={
             'page': 'Page number (default 1)',
             'per_page': 'Rows per page (default 100, max 500)',
-            'imei': 'Optional IMEI filter'
+            'imei': 'Optional IMEI filter',
+            'cursor': 'next_cursor/prev_cursor from a previous page; empty for the first page. '
+                      'Switches to keyset paging, where every page costs the same (no total)',
+            'start': 'Optional range query: rows at or after this ISO 8601 time (UTC if no offset)',
+            'end': 'Optional range query: rows at or before this ISO 8601 time',
+            'bbox': 'Optional range query: rows within west,south,east,north degrees',
+            'event_type': 'Optional range query: comma-separated event types',
+            'min_speed': 'Optional range query: minimum speed',
+            'max_speed': 'Optional range query: maximum speed',
+            'min_rpm': 'Optional range query: minimum engine RPM',
+            'max_rpm': 'Optional range query: maximum engine RPM'
         })
     @ns_analysis.response(200, 'Success')
+    @ns_analysis.response(400, 'Invalid cursor or filter', error_model)
     @ns_analysis.response(404, 'Not Found', error_model)
     def get(self, id):
         """Retrieve paginated raw telemetry data for an analysis"""
         page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 100, type=int), 500)
+        per_page = max(1, min(request.args.get('per_page', 100, type=int), 500))
         imei = request.args.get('imei', None)
         if imei == 'all':
             imei = None
+        cursor = request.args.get('cursor', None)
+
+        try:
+            filters = telemetry_filters(request.args)
+            result = db.get_telemetry_page(id, page=page, per_page=per_page, imei=imei,
+                                           cursor=cursor, filters=filters)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        if result is None:
+            return {"error": "Result not found"}, 404
+        return result
+
 
-        result = db.get_telemetry_page(id, page=page, per_page=per_page, imei=imei)
+@ns_analysis.route('/result/<string:id>/map')
+@ns_analysis.param('id', 'The analysis identifier')
+class FleetMap(Resource):
+    @ns_analysis.doc('get_fleet_map',
+        params={
+            'zoom': f'Map zoom (default 2, max {MAX_MAP_ZOOM}); clusters are about 64 pixels wide',
+            'bbox': 'Optional viewport as west,south,east,north in degrees'
+        })
+    @ns_analysis.response(200, 'Success', fleet_map_model)
+    @ns_analysis.response(400, 'Invalid bbox', error_model)
+    @ns_analysis.response(404, 'Not Found', error_model)
+    def get(self, id):
+        """Retrieve every device's first position, clustered for a map viewport"""
+        zoom = max(0, min(request.args.get('zoom', 2, type=int), MAX_MAP_ZOOM))
+        bbox = request.args.get('bbox', None)
+        try:
+            bbox = parse_bbox(bbox) if bbox else None
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        result = db.get_fleet_map(id, zoom, bbox)
         if result is None:
             return {"error": "Result not found"}, 404
         return result
 
 
+@ns_analysis.route('/result/<string:id>/route/<string:imei>')
+@ns_analysis.param('id', 'The analysis identifier')
+@ns_analysis.param('imei', 'The device IMEI')
+class Route(Resource):
+    @ns_analysis.doc('get_route',
+        params={
+            'max_points': f'Route vertices at most, event points aside '
+                          f'(default {DEFAULT_ROUTE_POINTS}, max {MAX_ROUTE_POINTS})',
+            'zoom': f'Optional map zoom (max {MAX_MAP_ZOOM}): vertices within one pixel of the '
+                    f'route at that zoom are dropped'
+        })
+    @ns_analysis.response(200, 'Success', route_model)
+    @ns_analysis.response(404, 'Not Found', error_model)
+    def get(self, id, imei):
+        """Retrieve a device's full route, simplified for the map"""
+        max_points = max(2, min(request.args.get('max_points', DEFAULT_ROUTE_POINTS, type=int),
+                                MAX_ROUTE_POINTS))
+        zoom = request.args.get('zoom', None, type=float)
+        if zoom is not None:
+            zoom = max(0, min(zoom, MAX_MAP_ZOOM))
+
+        points = db.get_route_points(id, imei)
+        if points is None:
+            return {"error": "Result not found"}, 404
+        return {"imei": imei, **build_route(points, max_points=max_points, zoom=zoom)}
+
+
+@ns_analysis.route('/result/<string:id>/export')
+@ns_analysis.param('id', 'The analysis identifier')
+class TelemetryExport(Resource):
+    @ns_analysis.doc('export_telemetry',
+        params={
+            'format': 'csv (default) or parquet (requires pyarrow)',
+            'imei': 'Optional IMEI filter'
+        })
+    @ns_analysis.response(200, 'Streamed export file')
+    @ns_analysis.response(400, 'Unsupported format', error_model)
+    @ns_analysis.response(404, 'Not Found', error_model)
+    def get(self, id):
+        """Download all raw telemetry of an analysis as a single streamed file"""
+        export_format = request.args.get('format', 'csv').lower()
+        imei = request.args.get('imei', None)
+        if imei == 'all':
+            imei = None
+
+        if export_format not in EXPORT_FORMATS:
+            return {"error": f"Unsupported export format: {export_format}"}, 400
+        if export_format == 'parquet' and not parquet_available():
+            return {"error": "Parquet export requires pyarrow"}, 400
+        if not db.analysis_exists(id):
+            return {"error": "Result not found"}, 404
+
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        encode = stream_parquet if export_format == 'parquet' else stream_csv
+        download_name = f"export_{imei or 'all'}_{id}.{extension}"
+        return Response(
+            encode(db.iter_telemetry(id, imei=imei)),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename="{download_name}"',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+
+
 @ns_analysis.route('/history/<string:id>')
 @ns_analysis.param('id', 'The analysis identifier')
 class HistoryItem(Resource):
@@ -704,6 +666,15 @@ class HistoryItem(Resource):
         return {"error": "Item not found"}, 404
 
 
+@ns_analysis.route('/jobs/queue')
+class JobQueue(Resource):
+    @ns_analysis.doc('get_job_queue')
+    @ns_analysis.response(200, 'Success', job_queue_model)
+    def get(self):
+        """Get the background job queue depth and the jobs being processed"""
+        return background_worker.stats()
+
+
 @ns_analysis.route('/job/<string:job_id>')
 @ns_analysis.param('job_id', 'The job identifier')
 class JobStatus(Resource):
@@ -715,6 +686,9 @@ class JobStatus(Resource):
         status = get_job_status(job_id, db)
         if not status:
             return {"error": "Job not found"}, 404
+        # Job statuses hold no payload; load the saved analysis on demand
+        if status.get('status') == 'completed' and status.get('analysis_id'):
+            status['data'] = db.get_analysis(status['analysis_id'])
         return status
 
 
@@ -726,8 +700,6 @@ class JobProgress(Resource):
     @ns_analysis.response(404, 'Not Found', error_model)
     def get(self, job_id):
         """Get real-time progress updates via Server-Sent Events"""
-        from flask import Response
-
         # Verify job exists
         status = get_job_status(job_id, db)
         if not status:
@@ -745,7 +717,15 @@ class JobProgress(Resource):
 
 
 # Initialize and start background worker
-background_worker = BackgroundWorker(process_log_data, db)
+background_worker = BackgroundWorker(
+    process_log_data, db,
+    workers=JOB_WORKERS,
+    job_timeout=JOB_TIMEOUT_SECONDS,
+    memory_limit_mb=JOB_MEMORY_LIMIT_MB,
+    isolate=JOB_ISOLATION != 'thread',
+    lease_seconds=JOB_LEASE_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS
+)
 background_worker.start()
 
 
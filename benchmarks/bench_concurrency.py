@@ -0,0 +1,114 @@
+"""Benchmark: UI reads while the background worker saves an analysis.
+
+A writer thread saves a large analysis (as the worker does) while reader
+threads page telemetry and poll job status (as the table and the SSE
+progress stream do). Compares the pooled WAL connection layer with the
+previous per-call connections on a rollback journal.
+
+Usage:
+    python benchmarks/bench_concurrency.py [--rows 300000] [--readers 4] [--interval 0.02]
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from database import Database
+from bench_save import make_result
+
+
+class LegacyDatabase(Database):
+    """Per-call connections on a rollback journal, as before pooling."""
+
+    def _init_schema(self):
+        super()._init_schema()
+        with self.get_connection() as conn:
+            conn.execute('PRAGMA journal_mode = DELETE')
+
+    @contextmanager
+    def get_connection(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def run(db_class, result, readers, interval):
+    """Return (reader latencies in ms, reader errors, write seconds)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = db_class(os.path.join(tmp, 'bench.db'))
+        db.save_analysis('seed', make_result(20000))
+        db.create_job('job', 'bench.json')
+
+        done = threading.Event()
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def reader(n):
+            cursor = ''
+            while not done.is_set():
+                start = time.perf_counter()
+                try:
+                    if n % 2:
+                        db.get_job('job')
+                    else:
+                        page = db.get_telemetry_page('seed', per_page=100, cursor=cursor)
+                        cursor = page['next_cursor'] or ''
+                except sqlite3.OperationalError:
+                    with lock:
+                        errors.append(1)
+                    continue
+                with lock:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                done.wait(interval)
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+        for t in threads:
+            t.start()
+        start = time.perf_counter()
+        db.save_analysis('bench', result)
+        write_seconds = time.perf_counter() - start
+        done.set()
+        for t in threads:
+            t.join()
+        return np.array(latencies), len(errors), write_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=0.02,
+                        help='Pause between requests of one reader, in seconds')
+    args = parser.parse_args()
+
+    result = make_result(args.rows)
+    print(f"{args.rows:,} rows written, {args.readers} readers")
+    for label, db_class in (('per-call', LegacyDatabase), ('pooled WAL', Database)):
+        latencies, errors, write_seconds = run(db_class, result, args.readers, args.interval)
+        if len(latencies):
+            stats = (f"p50 {np.percentile(latencies, 50):8.2f} ms  "
+                     f"p99 {np.percentile(latencies, 99):8.2f} ms  "
+                     f"max {latencies.max():8.2f} ms")
+        else:
+            stats = "no successful reads"
+        print(f"{label:11s} write {write_seconds:6.2f} s  reads {len(latencies):7,}  "
+              f"{stats}  errors {errors}")
+
+
+if __name__ == '__main__':
+    main()
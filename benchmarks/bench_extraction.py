@@ -0,0 +1,149 @@
+"""Benchmark: columnar telemetry extraction vs the legacy list-of-dicts path.
+
+Usage:
+    python benchmarks/bench_extraction.py [--points 1000000] [--per-entry 10] [--workers N]
+
+Builds a synthetic gateway log in memory, then times (and measures the peak
+traced memory of) turning it into the telemetry DataFrame with:
+
+* legacy   - one 33-key dict per point followed by pd.DataFrame(list_of_dicts)
+* columnar - extraction.TelemetryColumns + to_dataframe()
+* parallel - extract_telemetry_parallel on N worker processes (--workers > 1)
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from extraction import (
+    decode_telemetry_list, extract_telemetry, extract_telemetry_parallel, normalize_event_type
+)
+
+EVENT_CODES = [None] * 20 + [6, 7, 16, 17, 18, 1]
+
+
+def make_logs(total_points, per_entry, devices=500, seed=42):
+    """Build a synthetic log list with total_points telemetry points."""
+    rng = random.Random(seed)
+    logs = []
+    for i in range(0, total_points, per_entry):
+        points = []
+        for j in range(min(per_entry, total_points - i)):
+            n = i + j
+            point = {
+                'imei': f'35{n % devices:013d}',
+                'time': f'2024-01-15T{(n // 3600) % 24:02d}:{(n // 60) % 60:02d}:{n % 60:02d}Z',
+                'lat': 19.4 + rng.random() / 100, 'lng': -99.1 + rng.random() / 100,
+                'altitude': 2240, 'speed': rng.randint(0, 120), 'heading': rng.randint(0, 359),
+                'quality': 'Good' if rng.random() > 0.05 else 'Bad',
+                'addOns': {
+                    'mileage': 15000 + n // devices, 'ignitionOn': 1, 'driverId': f'D{n % 50}',
+                    'canbus': {
+                        'engineRPM': rng.randint(800, 3000), 'vehicleSpeed': rng.randint(0, 120),
+                        'engineCoolantTemperature': 85, 'totalDistance': 15000 + n // devices,
+                        'totalFuelUsed': 1200, 'fuelLevelInput': 64
+                    }
+                },
+                'event': {'type': rng.choice(EVENT_CODES)}
+            }
+            points.append(point)
+        message = json.dumps(points)
+        additional = json.dumps({'Arguments': json.dumps({'message': message})})
+        logs.append({
+            'receiveTimestamp': '2024-01-15T12:00:00Z',
+            'jsonPayload': {'data': {'AdditionalInformation': additional}}
+        })
+    return logs
+
+
+def legacy_dataframe(logs):
+    """The pre-columnar extraction: a dict per point, then pd.DataFrame."""
+    rows = []
+    decoder = json.JSONDecoder()
+    for log_entry in logs:
+        receive_ts = log_entry.get('receiveTimestamp')
+        data_obj = log_entry.get('jsonPayload', {}).get('data', {})
+        for point in decode_telemetry_list(data_obj.get('AdditionalInformation'), decoder):
+            addons = point.get('addOns', {})
+            canbus = addons.get('canbus', {})
+            rows.append({
+                'imei': point.get('imei'), 'time': point.get('time'), 'receiveTimestamp': receive_ts,
+                'lat': point.get('lat'), 'lng': point.get('lng'), 'altitude': point.get('altitude'),
+                'speed': point.get('speed'), 'heading': point.get('heading'),
+                'lastFixTime': point.get('lastFixTime'), 'isMoving': point.get('isMoving'),
+                'batteryLevelPercentage': point.get('batteryLevelPercentage'),
+                'reportMode': point.get('reportMode'), 'quality': point.get('quality'),
+                'mileage': addons.get('mileage'), 'ignitionOn': addons.get('ignitionOn'),
+                'externalPowerVcc': addons.get('externalPowerVcc'),
+                'digitalInput': addons.get('digitalInput'), 'driverId': addons.get('driverId'),
+                'engineRPM': canbus.get('engineRPM'), 'vehicleSpeed': canbus.get('vehicleSpeed'),
+                'engineCoolantTemperature': canbus.get('engineCoolantTemperature'),
+                'totalDistance': canbus.get('totalDistance'), 'totalFuelUsed': canbus.get('totalFuelUsed'),
+                'fuelLevelInput': canbus.get('fuelLevelInput'),
+                'event_type': normalize_event_type(
+                    point.get('event', {}).get('type') or point.get('alert', {}).get('type') or
+                    point.get('type') or point.get('eventId') or addons.get('alert')
+                ),
+                'has_rpm': canbus.get('engineRPM') is not None,
+                'has_speed': canbus.get('vehicleSpeed') is not None,
+                'has_temp': canbus.get('engineCoolantTemperature') is not None,
+                'has_dist': canbus.get('totalDistance') is not None,
+                'has_fuel_total': canbus.get('totalFuelUsed') is not None,
+                'has_fuel_level': canbus.get('fuelLevelInput') is not None,
+                'has_ignition': addons.get('ignitionOn') is not None,
+                'gps_ok': point.get('quality') == 'Good'
+            })
+    return pd.DataFrame(rows)
+
+
+def columnar_dataframe(logs):
+    return extract_telemetry(logs).to_dataframe()
+
+
+def measure(func, logs):
+    gc.collect()
+    start = time.perf_counter()
+    df = func(logs)
+    elapsed = time.perf_counter() - start
+    rows = len(df)
+    del df
+    gc.collect()
+    tracemalloc.start()
+    df = func(logs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    frame_bytes = df.memory_usage(deep=True).sum()
+    return rows, elapsed, peak, frame_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=1_000_000)
+    parser.add_argument('--per-entry', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"Building synthetic log with {args.points:,} points...")
+    logs = make_logs(args.points, args.per_entry)
+
+    print(f"{'path':<10} {'rows':>10} {'seconds':>9} {'points/s':>12} {'peak MB':>9} {'frame MB':>9}")
+    paths = [('legacy', legacy_dataframe), ('columnar', columnar_dataframe)]
+    if args.workers > 1:
+        paths.append(('parallel', lambda logs: extract_telemetry_parallel(
+            logs, workers=args.workers, chunk_size=args.chunk_size).to_dataframe()))
+    for name, func in paths:
+        rows, elapsed, peak, frame_bytes = measure(func, logs)
+        print(f"{name:<10} {rows:>10,} {elapsed:>9.2f} {rows / elapsed:>12,.0f} "
+              f"{peak / 2**20:>9.1f} {frame_bytes / 2**20:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark: Database.save_analysis bulk path vs per-row inserts.
+
+Usage:
+    python benchmarks/bench_save.py [--rows 500000]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from database import Database, TELEMETRY_COLUMN_MAP
+
+
+def make_result(rows, seed=11):
+    """Analysis result with `rows` telemetry rows as produced by the app."""
+    rng = np.random.default_rng(seed)
+    lat = (19.4 + rng.random(rows) / 100).tolist()
+    speed = rng.integers(0, 120, rows).astype(float).tolist()
+    raw = [{
+        'imei': f'35{i % 500:013d}',
+        'time': f'2024-01-15 00:{(i // 60) % 60:02d}:{i % 60:02d}+00:00',
+        'receiveTimestamp': '2024-01-15 01:00:00+00:00',
+        'lat': lat[i], 'lng': -99.1, 'altitude': 2240.0, 'speed': speed[i],
+        'heading': 90.0, 'lastFixTime': None, 'isMoving': speed[i] > 5,
+        'batteryLevelPercentage': 98.0, 'reportMode': '0', 'quality': 'Good',
+        'mileage': 15000.0 + i / 1000, 'ignitionOn': True, 'externalPowerVcc': 12.6,
+        'digitalInput': None, 'driverId': 'D1', 'engineRPM': 1500.0,
+        'vehicleSpeed': speed[i], 'engineCoolantTemperature': 85.0,
+        'totalDistance': 1.0, 'totalFuelUsed': 2.0, 'fuelLevelInput': 50.0,
+        'event_type': None, 'delay_seconds': 12.0,
+    } for i in range(rows)]
+    return {
+        'summary': {
+            'filename': 'bench.json', 'processed_at': '2024-01-15T00:00:00',
+            'total_devices': 500, 'total_records': rows,
+            'total_distance_km': 0.0, 'average_quality_score': 0.0,
+        },
+        'scorecard': [], 'data_quality': {}, 'chart_data': {},
+        'raw_data_sample': raw,
+    }
+
+
+def save_per_row(db, analysis_id, result):
+    """The previous save path: one execute() per telemetry row."""
+    summary = result['summary']
+    columns = ', '.join(['analysis_id'] + [c for c, _ in TELEMETRY_COLUMN_MAP])
+    placeholders = ', '.join('?' * (len(TELEMETRY_COLUMN_MAP) + 1))
+    with db.get_connection() as conn:
+        conn.execute('''
+            INSERT INTO analyses (id, filename, original_filename, processed_at,
+                total_devices, total_records, total_distance_km, average_quality_score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (analysis_id, summary['filename'], summary['filename'], summary['processed_at'],
+              summary['total_devices'], summary['total_records'],
+              summary['total_distance_km'], summary['average_quality_score']))
+        for row in result['raw_data_sample']:
+            values = [analysis_id]
+            for _, key in TELEMETRY_COLUMN_MAP:
+                value = row.get(key)
+                if key in ('isMoving', 'ignitionOn'):
+                    value = 1 if value else 0
+                values.append(value)
+            conn.execute(f'INSERT INTO telemetry_data ({columns}) VALUES ({placeholders})', values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500000)
+    args = parser.parse_args()
+
+    result = make_result(args.rows)
+    print(f"{args.rows:,} telemetry rows")
+
+    for label, save in (('per-row', save_per_row),
+                        ('bulk', lambda db, i, r: db.save_analysis(i, r))):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, 'bench.db'))
+            start = time.perf_counter()
+            save(db, 'bench', result)
+            elapsed = time.perf_counter() - start
+        print(f"{label:10s} {elapsed:8.2f} s   {args.rows / elapsed:12,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark: fused fleet metrics vs the per-group apply pipeline.
+
+The legacy pipeline is groupby().apply(calculate_v2_metrics), the separate
+statistics aggregation and the groupby().apply(calc_ignition_quality) pass
+for the global radar. Also times chunked scoring: the frame split into
+--chunks time ranges, each reduced to a PartialMetrics, merged and
+finalized.
+
+Usage:
+    python benchmarks/bench_scoring.py [--devices 5000] [--points 200] [--chunks 10]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from scoring import calculate_v2_metrics, calc_ignition_quality, compute_fleet_metrics, PartialMetrics
+
+EVENTS = np.array([None] * 20 + ['Ignition On', 'Ignition Off', 'Harsh Breaking', 'SOS'], dtype=object)
+
+
+def make_frame(devices, points, seed=7):
+    """Pre-scoring frame with `points` rows for each of `devices` IMEIs."""
+    rng = np.random.default_rng(seed)
+    n = devices * points
+    imeis = np.array([f'35{i:013d}' for i in range(devices)], dtype=object)
+    return pd.DataFrame({
+        'imei': imeis[rng.integers(0, devices, n)],
+        'time': pd.Timestamp('2024-01-15T00:00:00Z') + pd.to_timedelta(rng.permutation(n), unit='s'),
+        'lat': 19.4 + rng.random(n) / 100,
+        'lng': -99.1 + rng.random(n) / 100,
+        'speed': rng.integers(0, 120, n).astype(float),
+        'ignitionOn': pd.Series(rng.integers(0, 2, n), dtype=object),
+        'mileage': 15000 + rng.integers(0, 500, n).astype(float),
+        'engineRPM': rng.integers(700, 3000, n).astype(float),
+        'engineCoolantTemperature': rng.choice([85.0, 86.0, np.nan], n),
+        'fuelLevelInput': rng.choice([40.0, 60.0, np.nan], n),
+        'driverId': pd.Series(rng.choice([None, 'D1', 'D2'], n), dtype=object),
+        'event_type': EVENTS[rng.integers(0, len(EVENTS), n)],
+        'delay_seconds': rng.exponential(30, n),
+        **{f: rng.random(n) < 0.9 for f in (
+            'has_rpm', 'has_speed', 'has_temp', 'has_dist', 'has_fuel_total',
+            'has_fuel_level', 'has_ignition', 'gps_ok')}
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=5000)
+    parser.add_argument('--points', type=int, default=200)
+    parser.add_argument('--chunks', type=int, default=10)
+    args = parser.parse_args()
+
+    df = make_frame(args.devices, args.points)
+    print(f"{len(df):,} rows, {args.devices:,} devices")
+
+    start = time.perf_counter()
+    compute_fleet_metrics(df)
+    vectorized = time.perf_counter() - start
+    print(f"fused        {vectorized:8.2f} s")
+
+    ordered = df.sort_values('time', kind='mergesort')
+    chunks = [ordered.iloc[i] for i in np.array_split(np.arange(len(ordered)), args.chunks)]
+    start = time.perf_counter()
+    partials = [PartialMetrics.from_frame(chunk) for chunk in chunks]
+    reduced = time.perf_counter() - start
+    PartialMetrics.merge(partials).finalize()
+    merged = time.perf_counter() - start - reduced
+    print(f"chunked      {reduced:8.2f} s   ({args.chunks} parts, then {merged:.2f} s to merge and finalize)")
+
+    start = time.perf_counter()
+    df.groupby('imei').apply(calculate_v2_metrics)
+    df.groupby('imei').agg({
+        'time': ['min', 'max'], 'mileage': ['min', 'max'], 'speed': ['mean', 'max'],
+        'engineRPM': ['mean'], 'fuelLevelInput': ['mean']
+    })
+    df.groupby('imei').apply(calc_ignition_quality)
+    legacy = time.perf_counter() - start
+    print(f"apply        {legacy:8.2f} s   ({legacy / vectorized:.0f}x slower)")
+
+
+if __name__ == '__main__':
+    main()
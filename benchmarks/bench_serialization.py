@@ -0,0 +1,66 @@
+"""Benchmark: JSON-ready records and encoding of a large telemetry payload.
+
+The legacy pipeline is clean_df_for_json as it was (copy, replace over the
+whole frame, to_dict, recursive sanitize) followed by the standard library
+encoder. It is compared with serialization.frame_to_records followed by
+serialization.dumps on each available backend.
+
+Usage:
+    python benchmarks/bench_serialization.py [--rows 500000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import serialization
+from analysis import sanitize_for_json
+from bench_scoring import make_frame
+
+
+def legacy_records(df):
+    """clean_df_for_json before the serialization module."""
+    df_clean = df.copy()
+    for col in df_clean.select_dtypes(include=['datetime64[ns]', 'datetime64[ns, UTC]', 'datetime64']).columns:
+        df_clean[col] = df_clean[col].astype(str).replace(['NaT', 'nan', 'None'], None)
+    df_clean = df_clean.replace([np.inf, -np.inf, np.nan], None)
+    return sanitize_for_json(df_clean.to_dict(orient='records'))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    value = func(*args)
+    return value, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500000)
+    args = parser.parse_args()
+
+    df = make_frame(devices=max(1, args.rows // 200), points=200)
+    print(f"{len(df):,} rows x {len(df.columns)} columns")
+
+    records, legacy_seconds = timed(legacy_records, df)
+    body, encode_seconds = timed(lambda r: json.dumps(r).encode('utf-8'), records)
+    print(f"{'legacy':22s} records {legacy_seconds:6.2f} s  encode {encode_seconds:6.2f} s  "
+          f"total {legacy_seconds + encode_seconds:6.2f} s  ({len(body) / 1e6:.0f} MB)")
+
+    records, records_seconds = timed(serialization.frame_to_records, df)
+    backends = [('json', None)]
+    if serialization.orjson is not None:
+        backends.append(('orjson', serialization.orjson))
+    for name, module in backends:
+        serialization.orjson = module
+        body, encode_seconds = timed(serialization.dumps, records)
+        print(f"{'frame_to_records+' + name:22s} records {records_seconds:6.2f} s  "
+              f"encode {encode_seconds:6.2f} s  total {records_seconds + encode_seconds:6.2f} s  "
+              f"({len(body) / 1e6:.0f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark: raw telemetry in the telemetry_data table vs the columnar store.
+
+Saves the same result with each telemetry storage and reports the save
+time, the size on disk and the time of typical reads.
+
+Usage:
+    python benchmarks/bench_storage.py [--rows 500000]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, SQLITE_STORAGE, COLUMNAR_STORAGE
+from bench_save import make_result
+
+
+def disk_usage(path):
+    """Bytes used by the files under `path`."""
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def timed(func, repeat=20):
+    """Mean seconds per call of func()."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500000)
+    args = parser.parse_args()
+
+    result = make_result(args.rows)
+    print(f"{args.rows:,} telemetry rows")
+
+    for storage in (SQLITE_STORAGE, COLUMNAR_STORAGE):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, 'bench.db'), telemetry_storage=storage)
+            start = time.perf_counter()
+            db.save_analysis('bench', result)
+            save_seconds = time.perf_counter() - start
+            with db.get_connection() as conn:
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+            middle = db.get_telemetry_page('bench', page=args.rows // 200, per_page=100)
+            reads = {
+                'first page': lambda: db.get_telemetry_page('bench', per_page=100),
+                'middle page': lambda: db.get_telemetry_page('bench', page=args.rows // 200, per_page=100),
+                'cursor page': lambda: db.get_telemetry_page('bench', per_page=100,
+                                                             cursor=middle['next_cursor']),
+                'imei page': lambda: db.get_telemetry_page('bench', per_page=100, imei=f'35{7:013d}'),
+            }
+            print(f"{storage:9s} save {save_seconds:6.2f} s   disk {disk_usage(tmp) / 1e6:7.1f} MB")
+            for label, read in reads.items():
+                print(f"{'':9s} {label:12s} {timed(read) * 1000:8.2f} ms")
+            start = time.perf_counter()
+            rows = sum(len(batch) for batch in db.iter_telemetry('bench'))
+            print(f"{'':9s} {'export':12s} {(time.perf_counter() - start) * 1000:8.0f} ms  ({rows:,} rows)")
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
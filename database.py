@@ -1,184 +1,712 @@
 """SQLite database access layer for GPS Telemetry Analyzer."""
 import os
 import json
+import base64
+import time
 import sqlite3
+import threading
 from contextlib import contextmanager
-from typing import Optional, List, Dict, Any
+from itertools import islice
+from typing import Optional, List, Dict, Any, Callable, Iterable, Iterator, Tuple
+
+import geo
+import telemetry_store
+
+# Time a statement waits for a lock held by another connection
+BUSY_TIMEOUT_MS = 5000
+
+# Bytes of the database file memory-mapped per connection
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Rows sent to executemany per batch during bulk inserts
+INSERT_BATCH_SIZE = 5000
+
+# Page cache for bulk loads, in KiB (negative values are KiB for SQLite)
+BULK_CACHE_SIZE_KB = 64 * 1024
+
+# (column, result key) pairs for the per-row tables
+SCORECARD_COLUMN_MAP: List[Tuple[str, str]] = [
+    ('imei', 'imei'),
+    ('puntaje_calidad', 'Puntaje_Calidad'),
+    ('total_reportes', 'Total_Reportes'),
+    ('delay_avg', 'Delay_Avg'),
+    ('odo_quality_score', 'Odo_Quality_Score'),
+    ('canbus_completeness', 'Canbus_Completeness'),
+    ('gps_integrity', 'GPS_Integrity'),
+    ('ignition_balance', 'Ignition_Balance'),
+    ('ignition_on', 'Ignition_On'),
+    ('ignition_off', 'Ignition_Off'),
+    ('harsh_events', 'Harsh_Events'),
+    ('sos_count', 'SOS_Count'),
+    ('harsh_breaking', 'Harsh_Breaking'),
+    ('harsh_acceleration', 'Harsh_Acceleration'),
+    ('harsh_turn', 'Harsh_Turn'),
+    ('rpm_anormal_count', 'RPM_Anormal_Count'),
+    ('lat_lng_correct_variation', 'Lat_Lng_Correct_Variation'),
+    ('driver_id', 'Driver_ID'),
+    ('frozen_sensors', 'Frozen_Sensors'),
+    ('distancia_recorrida_km', 'Distancia_Recorrida_(KM)'),
+    ('km_inicial', 'KM_Inicial'),
+    ('km_final', 'KM_Final'),
+    ('primer_reporte', 'Primer_Reporte'),
+    ('ultimo_reporte', 'Ultimo_Reporte'),
+    ('velocidad_promedio_kph', 'Velocidad_Promedio_(KPH)'),
+    ('velocidad_maxima_kph', 'Velocidad_Maxima_(KPH)'),
+    ('rpm_promedio', 'RPM_Promedio'),
+    ('nivel_combustible_promedio', 'Nivel_Combustible_Promedio_%'),
+]
+
+TELEMETRY_COLUMN_MAP: List[Tuple[str, str]] = [
+    ('imei', 'imei'),
+    ('time', 'time'),
+    ('receive_timestamp', 'receiveTimestamp'),
+    ('lat', 'lat'),
+    ('lng', 'lng'),
+    ('altitude', 'altitude'),
+    ('speed', 'speed'),
+    ('heading', 'heading'),
+    ('last_fix_time', 'lastFixTime'),
+    ('is_moving', 'isMoving'),
+    ('battery_level_percentage', 'batteryLevelPercentage'),
+    ('report_mode', 'reportMode'),
+    ('quality', 'quality'),
+    ('mileage', 'mileage'),
+    ('ignition_on', 'ignitionOn'),
+    ('external_power_vcc', 'externalPowerVcc'),
+    ('digital_input', 'digitalInput'),
+    ('driver_id', 'driverId'),
+    ('engine_rpm', 'engineRPM'),
+    ('vehicle_speed', 'vehicleSpeed'),
+    ('engine_coolant_temperature', 'engineCoolantTemperature'),
+    ('total_distance', 'totalDistance'),
+    ('total_fuel_used', 'totalFuelUsed'),
+    ('fuel_level_input', 'fuelLevelInput'),
+    ('event_type', 'event_type'),
+    ('delay_seconds', 'delay_seconds'),
+]
+
+# Telemetry columns stored as text by the columnar store (the rest are
+# numeric, or 0/1 flags for FLAG_KEYS)
+TELEMETRY_TEXT_COLUMNS = frozenset({
+    'imei', 'time', 'receive_timestamp', 'last_fix_time', 'report_mode',
+    'quality', 'digital_input', 'driver_id', 'event_type'
+})
+
+# Backends for the raw telemetry rows of new analyses: the telemetry_data
+# table, or per-analysis column files (see telemetry_store)
+SQLITE_STORAGE = 'sqlite'
+COLUMNAR_STORAGE = 'columnar'
+TELEMETRY_STORAGES = (SQLITE_STORAGE, COLUMNAR_STORAGE)
+
+# Numeric telemetry columns with range-query thresholds: {API name: column}
+TELEMETRY_RANGE_COLUMNS = {'speed': 'speed', 'rpm': 'engine_rpm'}
+
+# Scorecard columns of a device's history across analyses, in the order of
+# idx_scorecard_imei_history (which covers them all, after imei)
+DEVICE_HISTORY_COLUMNS = (
+    'primer_reporte', 'analysis_id', 'ultimo_reporte', 'puntaje_calidad', 'total_reportes',
+    'odo_quality_score', 'canbus_completeness', 'gps_integrity', 'delay_avg',
+    'ignition_balance', 'harsh_events', 'distancia_recorrida_km'
+)
+
+# Telemetry columns read for a device's map route
+ROUTE_COLUMNS = ('time', 'lat', 'lng', 'speed', 'event_type')
+
+# Rows fetched per round trip when streaming an export
+EXPORT_BATCH_SIZE = 5000
+
+# Result keys stored as 0/1 flags (NULL when the payload had no value)
+FLAG_KEYS = frozenset({'isMoving', 'ignitionOn'})
+
+# Columns added to existing tables after their first release, applied to
+# older databases by Database._migrate_columns: {table: [(column, type)]}
+COLUMN_MIGRATIONS: Dict[str, List[Tuple[str, str]]] = {
+    'analyses': [
+        ('content_hash', 'TEXT'),
+        ('analyzer_version', 'TEXT'),
+        ('telemetry_storage', 'TEXT'),
+    ],
+    'processing_jobs': [
+        ('file_path', 'TEXT'),
+        ('attempts', 'INTEGER NOT NULL DEFAULT 0'),
+        ('lease_owner', 'TEXT'),
+        ('lease_expires_at', 'REAL'),
+        ('stage', 'TEXT'),
+        ('eta_seconds', 'REAL'),
+        ('progress_detail', 'TEXT'),
+        ('content_hash', 'TEXT'),
+    ],
+}
+
+# telemetry_counts key holding the analysis-wide total
+TOTAL_COUNT_KEY = ''
+
+
+def _batched(iterable: Iterable, size: int) -> Iterable[list]:
+    """Yield lists of up to `size` items from `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _insert_many(conn: sqlite3.Connection, table: str, column_map: List[Tuple[str, str]],
+                 analysis_id: str, rows: Iterable[Dict[str, Any]],
+                 batch_size: int = INSERT_BATCH_SIZE,
+                 on_batch: Optional[Callable[[int], None]] = None) -> int:
+    """Insert result rows into `table` with one prepared statement.
+
+    Rows are converted to parameter tuples lazily and handed to executemany
+    in batches, so the statement is compiled once and the tuples for the
+    whole table never exist in memory at the same time.
+
+    Args:
+        conn: Open connection (inside the caller's transaction)
+        table: Target table
+        column_map: (column, result key) pairs in insert order
+        analysis_id: Value for the analysis_id column of every row
+        rows: Result row dictionaries
+        batch_size: Rows per executemany call
+        on_batch: Optional callback receiving the size of each inserted batch
+
+    Returns:
+        Number of rows inserted
+    """
+    columns = ', '.join(['analysis_id'] + [column for column, _ in column_map])
+    placeholders = ', '.join('?' * (len(column_map) + 1))
+    sql = f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+
+    keys = [key for _, key in column_map]
+    flag_positions = [i for i, key in enumerate(keys) if key in FLAG_KEYS]
+
+    def to_params(row):
+        values = [analysis_id]
+        values.extend(map(row.get, keys))
+        for i in flag_positions:
+            if values[i + 1] is not None:
+                values[i + 1] = 1 if values[i + 1] else 0
+        return values
+
+    inserted = 0
+    for batch in _batched(map(to_params, rows), batch_size):
+        conn.executemany(sql, batch)
+        inserted += len(batch)
+        if on_batch:
+            on_batch(len(batch))
+    return inserted
+
+
+@contextmanager
+def bulk_load_pragmas(conn: sqlite3.Connection):
+    """Tune a connection for a large import and restore it afterwards.
+
+    Relaxes fsync to NORMAL (the database stays consistent after an
+    application crash; only the last transaction can be lost on power
+    failure), enlarges the page cache and keeps temporary b-trees in
+    memory. journal_mode is left alone: it is a database-wide setting
+    (WAL, see Database._init_schema), not a per-connection one.
+
+    Must be entered outside a transaction, since SQLite ignores a change
+    of synchronous level inside one. The block's transaction is committed
+    (or rolled back on error) on exit.
+    """
+    previous = {
+        name: conn.execute(f'PRAGMA {name}').fetchone()[0]
+        for name in ('synchronous', 'cache_size', 'temp_store')
+    }
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = -{BULK_CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    else:
+        # End the transaction here: the pragmas below are no-ops inside one
+        conn.commit()
+    finally:
+        for name, value in previous.items():
+            conn.execute(f'PRAGMA {name} = {int(value)}')
+
+
+def _store_telemetry_counts(conn: sqlite3.Connection, analysis_id: str) -> None:
+    """Materialize the per-IMEI and total telemetry row counts of an analysis.
+
+    Aggregates over the covering (analysis_id, imei, time, id) index. Uses
+    INSERT OR IGNORE so concurrent lazy backfills of the same analysis are
+    harmless.
+    """
+    conn.execute('''
+        INSERT OR IGNORE INTO telemetry_counts (analysis_id, imei, row_count)
+        SELECT analysis_id, imei, COUNT(*) FROM telemetry_data
+        WHERE analysis_id = ? AND imei IS NOT NULL AND imei != ?
+        GROUP BY imei
+    ''', (analysis_id, TOTAL_COUNT_KEY))
+    conn.execute('''
+        INSERT OR IGNORE INTO telemetry_counts (analysis_id, imei, row_count)
+        SELECT ?, ?, COUNT(*) FROM telemetry_data WHERE analysis_id = ?
+    ''', (analysis_id, TOTAL_COUNT_KEY, analysis_id))
+
+
+def _telemetry_count(conn: sqlite3.Connection, analysis_id: str, imei: Optional[str] = None) -> int:
+    """Return the telemetry row count of an analysis, optionally for one IMEI.
+
+    Analyses saved before counts were materialized are backfilled on first
+    access.
+    """
+    key = imei or TOTAL_COUNT_KEY
+    rows = conn.execute(
+        'SELECT imei, row_count FROM telemetry_counts WHERE analysis_id = ? AND imei IN (?, ?)',
+        (analysis_id, key, TOTAL_COUNT_KEY)
+    ).fetchall()
+    if not rows:
+        _store_telemetry_counts(conn, analysis_id)
+        return _telemetry_count(conn, analysis_id, imei)
+    counts = {r['imei']: r['row_count'] for r in rows}
+    return counts.get(key, 0)
+
+
+def _store_device_positions(conn: sqlite3.Connection, analysis_id: str,
+                            rows: Iterable[Tuple[Any, Any, Any, Any]]) -> None:
+    """Build the map grid index of an analysis from its (imei, time, lat, lng) rows."""
+    conn.executemany('''
+        INSERT OR IGNORE INTO device_positions
+            (analysis_id, imei, lat, lng, time, point_count, cell_x, cell_y)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (analysis_id, imei, lat, lng, time, count, *geo.grid_cell(lat, lng))
+        for imei, (time, lat, lng, count) in geo.first_fixes(rows).items()
+    ])
+
+
+def _filter_conditions(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Build the SQL conditions of telemetry range-query filters.
+
+    Each kind of condition has an index to drive the query: time bounds the
+    keyset indexes, event types, thresholds and the bounding box their
+    composite indexes.
+
+    Returns:
+        (conditions, each starting with ' AND ', and their params)
+
+    Raises:
+        ValueError: If a range is on a column without a threshold index
+    """
+    sql, params = '', []
+    if filters.get('start') is not None:
+        sql += ' AND time >= ?'
+        params.append(filters['start'])
+    if filters.get('end') is not None:
+        sql += ' AND time <= ?'
+        params.append(filters['end'])
+
+    event_types = filters.get('event_types')
+    if event_types is not None:
+        sql += f" AND event_type IN ({', '.join('?' * len(event_types))})"
+        params.extend(event_types)
+
+    for column, (low, high) in (filters.get('ranges') or {}).items():
+        if column not in TELEMETRY_RANGE_COLUMNS.values():
+            raise ValueError(f"Unsupported range filter column: {column}")
+        if low is not None:
+            sql += f' AND {column} >= ?'
+            params.append(low)
+        if high is not None:
+            sql += f' AND {column} <= ?'
+            params.append(high)
+
+    bbox = filters.get('bbox')
+    if bbox is not None:
+        west, south, east, north = bbox
+        if west <= east:
+            sql += ' AND lat BETWEEN ? AND ? AND lng BETWEEN ? AND ?'
+        else:
+            # A box crossing the antimeridian takes both ends of the range
+            sql += ' AND lat BETWEEN ? AND ? AND (lng >= ? OR lng <= ?)'
+        params += [south, north, west, east]
+    return sql, params
+
+
+def encode_cursor(direction: str, time: Optional[str], row_id: int) -> str:
+    """Encode a telemetry page boundary as an opaque URL-safe cursor.
+
+    Args:
+        direction: 'n' to continue after the row, 'p' to go back before it
+        time: The boundary row's time (None for rows without a timestamp)
+        row_id: The boundary row's id
+
+    Returns:
+        Cursor string
+    """
+    payload = json.dumps([direction, time, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Optional[str], int]:
+    """Decode a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, time, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if direction not in ('n', 'p') or not isinstance(row_id, int) or \
+            not (time is None or isinstance(time, str)):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return direction, time, row_id
+
+
+def _page_cursors(raw_rows: List[sqlite3.Row], has_next: bool, has_prev: bool) -> Dict[str, Optional[str]]:
+    """Build the next/prev cursors for a page of telemetry rows."""
+    if not raw_rows:
+        return {'next_cursor': None, 'prev_cursor': None}
+    first, last = raw_rows[0], raw_rows[-1]
+    return {
+        'next_cursor': encode_cursor('n', last['time'], last['id']) if has_next else None,
+        'prev_cursor': encode_cursor('p', first['time'], first['id']) if has_prev else None,
+    }
+
+
+def _seek_telemetry(conn: sqlite3.Connection, where: str, params: List[Any],
+                    position: Optional[Tuple[str, Optional[str], int]], limit: int) -> List[sqlite3.Row]:
+    """Fetch up to `limit` telemetry rows next to a cursor position.
+
+    SQLite sorts NULL times first, and a row-value comparison against NULL
+    is never true, so the NULL-time block and the timed rows are read as two
+    index range scans. Rows come back in (time, id) order either way.
+    """
+    select = f'SELECT * FROM telemetry_data WHERE {where}'
+    direction, time, row_id = position or ('n', None, None)
+
+    # Each segment is (extra condition, extra params, ORDER BY), in scan order
+    if direction == 'n':
+        asc = 'ORDER BY time, id'
+        if position is None:
+            segments = [('', [], asc)]
+        elif time is None:
+            segments = [(' AND time IS NULL AND id > ?', [row_id], asc),
+                        (' AND time IS NOT NULL', [], asc)]
+        else:
+            segments = [(' AND (time, id) > (?, ?)', [time, row_id], asc)]
+    else:
+        desc = 'ORDER BY time DESC, id DESC'
+        if time is None:
+            segments = [(' AND time IS NULL AND id < ?', [row_id], desc)]
+        else:
+            segments = [(' AND (time, id) < (?, ?)', [time, row_id], desc),
+                        (' AND time IS NULL', [], desc)]
+
+    rows: List[sqlite3.Row] = []
+    for condition, extra, order in segments:
+        if len(rows) >= limit:
+            break
+        rows.extend(conn.execute(
+            f'{select}{condition} {order} LIMIT ?', params + extra + [limit - len(rows)]
+        ).fetchall())
+    return rows if direction == 'n' else rows[::-1]
+
+
+def _flag(value: Optional[int]) -> Optional[bool]:
+    """A stored 0/1 flag as a bool (None when absent)."""
+    return None if value is None else bool(value)
+
+
+def _telemetry_row_to_dict(r: sqlite3.Row) -> Dict[str, Any]:
+    """Convert a telemetry_data row to the API's row dictionary."""
+    return {
+        'imei': r['imei'],
+        'time': r['time'],
+        'receiveTimestamp': r['receive_timestamp'],
+        'lat': r['lat'],
+        'lng': r['lng'],
+        'altitude': r['altitude'],
+        'speed': r['speed'],
+        'heading': r['heading'],
+        'lastFixTime': r['last_fix_time'],
+        'isMoving': _flag(r['is_moving']),
+        'batteryLevelPercentage': r['battery_level_percentage'],
+        'reportMode': r['report_mode'],
+        'quality': r['quality'],
+        'mileage': r['mileage'],
+        'ignitionOn': _flag(r['ignition_on']),
+        'externalPowerVcc': r['external_power_vcc'],
+        'digitalInput': r['digital_input'],
+        'driverId': r['driver_id'],
+        'engineRPM': r['engine_rpm'],
+        'vehicleSpeed': r['vehicle_speed'],
+        'engineCoolantTemperature': r['engine_coolant_temperature'],
+        'totalDistance': r['total_distance'],
+        'totalFuelUsed': r['total_fuel_used'],
+        'fuelLevelInput': r['fuel_level_input'],
+        'event_type': r['event_type'],
+        'delay_seconds': r['delay_seconds']
+    }
+
+
+class LeaseLost(Exception):
+    """The worker processing a job no longer holds its lease."""
 
 
 class Database:
     """SQLite database wrapper for telemetry analysis storage."""
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, telemetry_storage: str = SQLITE_STORAGE,
+                 telemetry_dir: Optional[str] = None):
         """Initialize database connection.
 
         Args:
             db_path: Path to SQLite database file
+            telemetry_storage: Where new analyses keep their raw telemetry
+                rows, SQLITE_STORAGE or COLUMNAR_STORAGE. Existing analyses
+                are read from wherever they were saved.
+            telemetry_dir: Directory of the columnar store (defaults to
+                'telemetry' next to the database file)
+
+        Raises:
+            ValueError: If telemetry_storage is unknown
         """
+        if telemetry_storage not in TELEMETRY_STORAGES:
+            raise ValueError(f"Unknown telemetry storage: {telemetry_storage}")
         self.db_path = db_path
+        self.telemetry_storage = telemetry_storage
+        self.telemetry_dir = telemetry_dir or os.path.join(
+            os.path.dirname(os.path.abspath(db_path)), 'telemetry'
+        )
+        self.telemetry_store = telemetry_store.ColumnarTelemetryStore(self.telemetry_dir, [
+            (column, key, telemetry_store.FLAG if key in FLAG_KEYS else
+             telemetry_store.TEXT if column in TELEMETRY_TEXT_COLUMNS else telemetry_store.REAL)
+            for column, key in TELEMETRY_COLUMN_MAP
+        ])
+        self._local = threading.local()
         self._init_schema()
 
+    def __reduce__(self):
+        # Pickle by path (e.g. for job processes); connections are per process
+        return (self.__class__, (self.db_path, self.telemetry_storage, self.telemetry_dir))
+
     def _init_schema(self):
         """Initialize database schema from schema.sql."""
         schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
         with self.get_connection() as conn:
+            # WAL is persistent and database-wide: readers no longer wait for
+            # the worker's import transaction, and it for them
+            conn.execute("PRAGMA journal_mode = WAL")
+            # Before the schema script, whose indexes may use new columns
+            self._migrate_columns(conn)
             with open(schema_path, 'r') as f:
                 conn.executescript(f.read())
 
-    @contextmanager
-    def get_connection(self):
-        """Context manager for database connections."""
-        conn = sqlite3.connect(self.db_path)
+    @staticmethod
+    def _migrate_columns(conn: sqlite3.Connection) -> None:
+        """Add the COLUMN_MIGRATIONS columns missing from existing tables."""
+        for table, columns in COLUMN_MIGRATIONS.items():
+            existing = {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+            if not existing:
+                continue  # Created with every column by schema.sql
+            for column, definition in columns:
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new connection."""
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000)
         conn.row_factory = sqlite3.Row
         conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        # Safe under WAL: a commit is durable once the WAL is checkpointed
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        """Return this thread's pooled connection, opening it if needed.
+
+        Connections are not shared between threads, and one inherited from
+        a parent process (e.g. a forking server) is never reused.
+        """
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is None or local.pid != os.getpid():
+            conn = self._connect()
+            local.conn = conn
+            local.pid = os.getpid()
+            local.depth = 0
+        return conn
+
+    @contextmanager
+    def get_connection(self):
+        """Context manager for database connections.
+
+        Yields the calling thread's pooled connection. The outermost block
+        commits on success and rolls back on error; nested blocks join the
+        enclosing transaction.
+        """
+        conn = self._thread_connection()
+        local = self._local
+        local.depth += 1
         try:
             yield conn
-            conn.commit()
+            if local.depth == 1:
+                conn.commit()
         except Exception:
-            conn.rollback()
+            if local.depth == 1:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    # Unusable connection: drop it so the next call reconnects
+                    self.close()
             raise
         finally:
-            conn.close()
-
-    def save_analysis(self, analysis_id: str, result: Dict[str, Any]) -> None:
+            local.depth -= 1
+
+    def close(self) -> None:
+        """Close the calling thread's pooled connection, if any."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            if self._local.pid == os.getpid():
+                conn.close()
+
+    def save_analysis(self, analysis_id: str, result: Dict[str, Any],
+                      progress: Optional[Callable[[str, int, Optional[int]], None]] = None,
+                      content_hash: Optional[str] = None,
+                      analyzer_version: Optional[str] = None,
+                      lease: Optional[Tuple[str, str, float]] = None) -> None:
         """Save complete analysis result to database.
 
+        The raw telemetry rows go to the telemetry_storage backend: the
+        telemetry_data table, or the columnar store, in which case the
+        database only keeps their counts.
+
         Args:
             analysis_id: Unique identifier for the analysis
             result: Full analysis result dictionary
+            progress: Optional callback, called as progress('save', rows
+                persisted, rows to save) after each batch
+            content_hash: SHA-256 of the uploaded file, for find_analysis_by_content
+            analyzer_version: Version of the analyzer that produced the result
+            lease: (job ID, owner, lease seconds) of the job saving the
+                analysis. Its lease is renewed on the saving connection at
+                the start, after each batch and before the commit, since the
+                save's write transaction blocks heartbeats from any other
+                connection.
+
+        Raises:
+            LeaseLost: If the job is no longer leased to the owner (the
+                save is rolled back)
         """
         summary = result['summary']
         scorecard = result.get('scorecard', [])
         data_quality = result.get('data_quality', {})
         chart_data = result.get('chart_data', {})
         raw_data = result.get('raw_data_sample', [])
+        columnar = self.telemetry_storage == COLUMNAR_STORAGE
+        # Set once this save has written column files, to remove on failure
+        written = False
+
+        def renew_lease():
+            if lease and not _renew_lease(conn, *lease):
+                raise LeaseLost()
+
+        total_rows = len(scorecard) + len(raw_data)
+        persisted = 0
+        if progress is not None:
+            progress('save', 0, total_rows)
+
+        def report_batch(rows):
+            nonlocal persisted
+            renew_lease()
+            if progress is not None:
+                persisted += rows
+                progress('save', persisted, total_rows)
+        on_batch = report_batch if progress is not None or lease else None
 
-        with self.get_connection() as conn:
-            # Insert analysis metadata
-            conn.execute('''
-                INSERT INTO analyses (id, filename, original_filename, processed_at,
-                    total_devices, total_records, total_distance_km, average_quality_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                analysis_id,
-                summary['filename'],
-                summary['filename'],
-                summary['processed_at'],
-                summary['total_devices'],
-                summary['total_records'],
-                summary['total_distance_km'],
-                summary['average_quality_score']
-            ))
-
-            # Insert scorecard data
-            for row in scorecard:
+        try:
+            with self.get_connection() as conn, bulk_load_pragmas(conn):
+                renew_lease()
+
+                # Insert analysis metadata
                 conn.execute('''
-                    INSERT INTO scorecard (analysis_id, imei, puntaje_calidad, total_reportes,
-                        delay_avg, odo_quality_score, canbus_completeness, gps_integrity,
-                        ignition_balance, ignition_on, ignition_off, harsh_events, sos_count,
-                        harsh_breaking, harsh_acceleration, harsh_turn, rpm_anormal_count,
-                        lat_lng_correct_variation, driver_id, frozen_sensors, distancia_recorrida_km,
-                        km_inicial, km_final, primer_reporte, ultimo_reporte, velocidad_promedio_kph,
-                        velocidad_maxima_kph, rpm_promedio, nivel_combustible_promedio)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO analyses (id, filename, original_filename, processed_at,
+                        total_devices, total_records, total_distance_km, average_quality_score,
+                        content_hash, analyzer_version, telemetry_storage)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     analysis_id,
-                    row.get('imei'),
-                    row.get('Puntaje_Calidad'),
-                    row.get('Total_Reportes'),
-                    row.get('Delay_Avg'),
-                    row.get('Odo_Quality_Score'),
-                    row.get('Canbus_Completeness'),
-                    row.get('GPS_Integrity'),
-                    row.get('Ignition_Balance'),
-                    row.get('Ignition_On'),
-                    row.get('Ignition_Off'),
-                    row.get('Harsh_Events'),
-                    row.get('SOS_Count'),
-                    row.get('Harsh_Breaking'),
-                    row.get('Harsh_Acceleration'),
-                    row.get('Harsh_Turn'),
-                    row.get('RPM_Anormal_Count'),
-                    row.get('Lat_Lng_Correct_Variation'),
-                    row.get('Driver_ID'),
-                    row.get('Frozen_Sensors'),
-                    row.get('Distancia_Recorrida_(KM)'),
-                    row.get('KM_Inicial'),
-                    row.get('KM_Final'),
-                    row.get('Primer_Reporte'),
-                    row.get('Ultimo_Reporte'),
-                    row.get('Velocidad_Promedio_(KPH)'),
-                    row.get('Velocidad_Maxima_(KPH)'),
-                    row.get('RPM_Promedio'),
-                    row.get('Nivel_Combustible_Promedio_%')
+                    summary['filename'],
+                    summary['filename'],
+                    summary['processed_at'],
+                    summary['total_devices'],
+                    summary['total_records'],
+                    summary['total_distance_km'],
+                    summary['average_quality_score'],
+                    content_hash,
+                    analyzer_version,
+                    self.telemetry_storage
                 ))
 
-            # Insert data quality
-            conn.execute('''
-                INSERT INTO data_quality (analysis_id, gps_validity, ignition, delay,
-                    rpm, speed, temp, dist, fuel)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                analysis_id,
-                data_quality.get('gps_validity'),
-                data_quality.get('ignition'),
-                data_quality.get('delay'),
-                data_quality.get('rpm'),
-                data_quality.get('speed'),
-                data_quality.get('temp'),
-                data_quality.get('dist'),
-                data_quality.get('fuel')
-            ))
-
-            # Insert chart data (events summary)
-            events_summary = chart_data.get('events_summary', {})
-            for event_type, count in events_summary.items():
-                if event_type and count:
-                    conn.execute('''
-                        INSERT INTO chart_data (analysis_id, event_type, count)
-                        VALUES (?, ?, ?)
-                    ''', (analysis_id, str(event_type), count))
-
-            # Insert all raw telemetry data
-            for row in raw_data:
+                # Insert scorecard data
+                _insert_many(conn, 'scorecard', SCORECARD_COLUMN_MAP, analysis_id, scorecard,
+                             on_batch=on_batch)
+
+                # Insert data quality
                 conn.execute('''
-                    INSERT INTO telemetry_data (analysis_id, imei, time, receive_timestamp,
-                        lat, lng, altitude, speed, heading, last_fix_time, is_moving,
-                        battery_level_percentage, report_mode, quality, mileage, ignition_on,
-                        external_power_vcc, digital_input, driver_id, engine_rpm, vehicle_speed,
-                        engine_coolant_temperature, total_distance, total_fuel_used,
-                        fuel_level_input, event_type, delay_seconds)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO data_quality (analysis_id, gps_validity, ignition, delay,
+                        rpm, speed, temp, dist, fuel)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     analysis_id,
-                    row.get('imei'),
-                    row.get('time'),
-                    row.get('receiveTimestamp'),
-                    row.get('lat'),
-                    row.get('lng'),
-                    row.get('altitude'),
-                    row.get('speed'),
-                    row.get('heading'),
-                    row.get('lastFixTime'),
-                    1 if row.get('isMoving') else 0,
-                    row.get('batteryLevelPercentage'),
-                    row.get('reportMode'),
-                    row.get('quality'),
-                    row.get('mileage'),
-                    1 if row.get('ignitionOn') else 0,
-                    row.get('externalPowerVcc'),
-                    row.get('digitalInput'),
-                    row.get('driverId'),
-                    row.get('engineRPM'),
-                    row.get('vehicleSpeed'),
-                    row.get('engineCoolantTemperature'),
-                    row.get('totalDistance'),
-                    row.get('totalFuelUsed'),
-                    row.get('fuelLevelInput'),
-                    row.get('event_type'),
-                    row.get('delay_seconds')
+                    data_quality.get('gps_validity'),
+                    data_quality.get('ignition'),
+                    data_quality.get('delay'),
+                    data_quality.get('rpm'),
+                    data_quality.get('speed'),
+                    data_quality.get('temp'),
+                    data_quality.get('dist'),
+                    data_quality.get('fuel')
                 ))
 
+                # Insert chart data (events summary)
+                events_summary = chart_data.get('events_summary', {})
+                for event_type, count in events_summary.items():
+                    if event_type and count:
+                        conn.execute('''
+                            INSERT INTO chart_data (analysis_id, event_type, count)
+                            VALUES (?, ?, ?)
+                        ''', (analysis_id, str(event_type), count))
+
+                # Insert all raw telemetry data
+                if columnar:
+                    counts = self.telemetry_store.write(analysis_id, raw_data)
+                    written = True
+                    counts[TOTAL_COUNT_KEY] = len(raw_data)
+                    conn.executemany(
+                        'INSERT INTO telemetry_counts (analysis_id, imei, row_count) VALUES (?, ?, ?)',
+                        [(analysis_id, imei, n) for imei, n in counts.items()]
+                    )
+                    if on_batch:
+                        on_batch(len(raw_data))
+                else:
+                    _insert_many(conn, 'telemetry_data', TELEMETRY_COLUMN_MAP, analysis_id, raw_data,
+                                 on_batch=on_batch)
+                    _store_telemetry_counts(conn, analysis_id)
+
+                # Map grid index: first fix of each device
+                _store_device_positions(conn, analysis_id, (
+                    (r.get('imei'), r.get('time'), r.get('lat'), r.get('lng')) for r in raw_data
+                ))
+                renew_lease()
+        except Exception:
+            if written:
+                self.telemetry_store.delete(analysis_id)
+            raise
+
     def get_analysis(self, analysis_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve a complete analysis result by ID.
 
@@ -281,6 +809,24 @@ class Database:
                 'raw_data_sample': []
             }
 
+    def find_analysis_by_content(self, content_hash: str, analyzer_version: str) -> Optional[str]:
+        """Return the ID of the latest analysis of an identical upload.
+
+        Args:
+            content_hash: SHA-256 of the uploaded file
+            analyzer_version: Analyzer version the analysis must come from
+
+        Returns:
+            Analysis ID or None if the content was not analyzed by this version
+        """
+        with self.get_connection() as conn:
+            row = conn.execute('''
+                SELECT id FROM analyses
+                WHERE content_hash = ? AND analyzer_version = ?
+                ORDER BY created_at DESC, rowid DESC LIMIT 1
+            ''', (content_hash, analyzer_version)).fetchone()
+            return row['id'] if row else None
+
     def get_history(self) -> List[Dict[str, Any]]:
         """Get list of all analyses for history display.
 
@@ -337,7 +883,8 @@ class Database:
         """
         with self.get_connection() as conn:
             row = conn.execute(
-                'SELECT original_filename FROM analyses WHERE id = ?', (analysis_id,)
+                'SELECT original_filename, telemetry_storage FROM analyses WHERE id = ?',
+                (analysis_id,)
             ).fetchone()
 
             if not row:
@@ -348,7 +895,9 @@ class Database:
             # Delete cascades to related tables
             conn.execute('DELETE FROM analyses WHERE id = ?', (analysis_id,))
 
-            return original_filename
+        if row['telemetry_storage'] == COLUMNAR_STORAGE:
+            self.telemetry_store.delete(analysis_id)
+        return original_filename
 
     def analysis_exists(self, analysis_id: str) -> bool:
         """Check if an analysis exists.
@@ -365,126 +914,507 @@ class Database:
             ).fetchone()
             return row is not None
 
+    def get_analyzer_version(self, analysis_id: str) -> Optional[str]:
+        """Return the analyzer version of an analysis (None if not recorded or not found)."""
+        with self.get_connection() as conn:
+            row = conn.execute(
+                'SELECT analyzer_version FROM analyses WHERE id = ?', (analysis_id,)
+            ).fetchone()
+            return row['analyzer_version'] if row else None
+
+    def _telemetry_storage_of(self, analysis_id: str) -> Optional[str]:
+        """Return the telemetry storage of an analysis (None if not found)."""
+        with self.get_connection() as conn:
+            row = conn.execute(
+                'SELECT telemetry_storage FROM analyses WHERE id = ?', (analysis_id,)
+            ).fetchone()
+            return (row['telemetry_storage'] or SQLITE_STORAGE) if row else None
+
     def get_telemetry_page(self, analysis_id: str, page: int = 1,
-                          per_page: int = 100, imei: str = None) -> Optional[Dict[str, Any]]:
+                          per_page: int = 100, imei: str = None,
+                          cursor: Optional[str] = None,
+                          filters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """Retrieve paginated telemetry data for an analysis.
 
+        Rows are ordered by (time, id), rows without a timestamp first.
+        Without a cursor the page number is used (OFFSET paging, with the
+        total row count). With a cursor the rows are fetched by seeking the
+        (analysis_id, [imei,] time, id) index from the cursor position, so
+        every page costs the same no matter how deep it is; pass an empty
+        cursor for the first page.
+
+        With filters, only the matching rows are paged, found through the
+        index of each condition (see _filter_conditions); their total is
+        counted rather than read from telemetry_counts.
+
         Args:
             analysis_id: The analysis identifier
-            page: Page number (1-based)
+            page: Page number (1-based), ignored when a cursor is given
             per_page: Rows per page
             imei: Optional IMEI filter
+            cursor: Optional next_cursor/prev_cursor from a previous page
+            filters: Optional range-query conditions, all of which a row
+                must meet: 'start' and 'end' times (inclusive, in the
+                stored format), 'bbox' as (west, south, east, north)
+                degrees, 'event_types' as a list, and 'ranges' as
+                {column: (low, high)} for TELEMETRY_RANGE_COLUMNS, with
+                None for an open bound
 
         Returns:
-            Dict with rows, total, page, pages or None if analysis not found
+            Dict with rows, per_page, next_cursor and prev_cursor (plus
+            total, page and pages in page mode) or None if analysis not found
+
+        Raises:
+            ValueError: If the cursor or a filter is malformed
         """
+        position = decode_cursor(cursor) if cursor else None
+
         with self.get_connection() as conn:
             # Check analysis exists
-            if not conn.execute(
-                'SELECT 1 FROM analyses WHERE id = ?', (analysis_id,)
-            ).fetchone():
+            row = conn.execute(
+                'SELECT telemetry_storage FROM analyses WHERE id = ?', (analysis_id,)
+            ).fetchone()
+            if not row:
                 return None
 
-            # Count total
+            # Rows of the columnar store come back keyed like telemetry_data rows
+            stored = None
+            if row['telemetry_storage'] == COLUMNAR_STORAGE:
+                stored = self.telemetry_store.open(analysis_id)
+
+            where = 'analysis_id = ?'
+            params: List[Any] = [analysis_id]
             if imei:
+                where += ' AND imei = ?'
+                params.append(imei)
+            if filters:
+                conditions, extra = _filter_conditions(filters)
+                where += conditions
+                params += extra
+
+            if cursor is not None:
+                direction = position[0] if position else 'n'
+                if stored:
+                    raw_rows = stored.seek(imei, position, per_page + 1, filters)
+                else:
+                    raw_rows = _seek_telemetry(conn, where, params, position, per_page + 1)
+                has_more = len(raw_rows) > per_page
+                if direction == 'n':
+                    raw_rows = raw_rows[:per_page]
+                    has_next, has_prev = has_more, position is not None
+                else:
+                    raw_rows = raw_rows[-per_page:] if has_more else raw_rows
+                    has_next, has_prev = True, has_more
+                return {
+                    'rows': [_telemetry_row_to_dict(r) for r in raw_rows],
+                    'per_page': per_page,
+                    **_page_cursors(raw_rows, has_next, has_prev)
+                }
+
+            if stored:
+                total = stored.count(imei, filters)
+            elif filters:
                 total = conn.execute(
-                    'SELECT COUNT(*) FROM telemetry_data WHERE analysis_id = ? AND imei = ?',
-                    (analysis_id, imei)
+                    f'SELECT COUNT(*) FROM telemetry_data WHERE {where}', params
                 ).fetchone()[0]
             else:
-                total = conn.execute(
-                    'SELECT COUNT(*) FROM telemetry_data WHERE analysis_id = ?',
-                    (analysis_id,)
-                ).fetchone()[0]
+                total = _telemetry_count(conn, analysis_id, imei)
 
             total_pages = max(1, (total + per_page - 1) // per_page)
             page = max(1, min(page, total_pages))
             offset = (page - 1) * per_page
 
-            if imei:
-                raw_rows = conn.execute(
-                    'SELECT * FROM telemetry_data WHERE analysis_id = ? AND imei = ? ORDER BY time LIMIT ? OFFSET ?',
-                    (analysis_id, imei, per_page, offset)
-                ).fetchall()
+            if stored:
+                raw_rows = stored.slice(imei, offset, per_page, filters)
             else:
                 raw_rows = conn.execute(
-                    'SELECT * FROM telemetry_data WHERE analysis_id = ? ORDER BY time LIMIT ? OFFSET ?',
-                    (analysis_id, per_page, offset)
+                    f'SELECT * FROM telemetry_data WHERE {where} ORDER BY time, id LIMIT ? OFFSET ?',
+                    params + [per_page, offset]
                 ).fetchall()
 
-            rows = []
-            for r in raw_rows:
-                rows.append({
-                    'imei': r['imei'],
-                    'time': r['time'],
-                    'receiveTimestamp': r['receive_timestamp'],
-                    'lat': r['lat'],
-                    'lng': r['lng'],
-                    'altitude': r['altitude'],
-                    'speed': r['speed'],
-                    'heading': r['heading'],
-                    'lastFixTime': r['last_fix_time'],
-                    'isMoving': bool(r['is_moving']),
-                    'batteryLevelPercentage': r['battery_level_percentage'],
-                    'reportMode': r['report_mode'],
-                    'quality': r['quality'],
-                    'mileage': r['mileage'],
-                    'ignitionOn': bool(r['ignition_on']),
-                    'externalPowerVcc': r['external_power_vcc'],
-                    'digitalInput': r['digital_input'],
-                    'driverId': r['driver_id'],
-                    'engineRPM': r['engine_rpm'],
-                    'vehicleSpeed': r['vehicle_speed'],
-                    'engineCoolantTemperature': r['engine_coolant_temperature'],
-                    'totalDistance': r['total_distance'],
-                    'totalFuelUsed': r['total_fuel_used'],
-                    'fuelLevelInput': r['fuel_level_input'],
-                    'event_type': r['event_type'],
-                    'delay_seconds': r['delay_seconds']
-                })
-
             return {
-                'rows': rows,
+                'rows': [_telemetry_row_to_dict(r) for r in raw_rows],
                 'total': total,
                 'page': page,
                 'pages': total_pages,
-                'per_page': per_page
+                'per_page': per_page,
+                **_page_cursors(raw_rows, page < total_pages, page > 1)
             }
 
-    # Job management methods for background processing
-    def create_job(self, job_id: str, filename: str) -> None:
-        """Create a new processing job."""
+    def get_fleet_map(self, analysis_id: str, zoom: int,
+                      bbox: Optional[Tuple[float, float, float, float]] = None) -> Optional[Dict[str, Any]]:
+        """Return the devices of an analysis clustered for a map viewport.
+
+        Devices are placed at their first GPS fix and grouped by grid cell
+        at the zoom (about 64 pixels wide), using the device_positions
+        index built at save time. Analyses saved before the index existed
+        are indexed on first access.
+
+        Args:
+            analysis_id: The analysis identifier
+            zoom: Map zoom level
+            bbox: Optional (west, south, east, north) viewport in degrees
+
+        Returns:
+            GeoJSON FeatureCollection of the clusters, with the bbox of all
+            the devices and their count, or None if analysis not found
+        """
+        storage = self._telemetry_storage_of(analysis_id)
+        if storage is None:
+            return None
+
         with self.get_connection() as conn:
-            conn.execute(
-                'INSERT INTO processing_jobs (id, filename, status) VALUES (?, ?, ?)',
-                (job_id, filename, 'pending')
-            )
+            if not conn.execute(
+                'SELECT 1 FROM device_positions WHERE analysis_id = ? LIMIT 1', (analysis_id,)
+            ).fetchone():
+                columns = [column for column, _ in TELEMETRY_COLUMN_MAP]
+                positions = [columns.index(c) for c in ('imei', 'time', 'lat', 'lng')]
+                _store_device_positions(conn, analysis_id, (
+                    tuple(row[i] for i in positions)
+                    for batch in self.iter_telemetry(analysis_id) for row in batch
+                ))
+
+            extent = conn.execute('''
+                SELECT COUNT(*), MIN(lng), MIN(lat), MAX(lng), MAX(lat)
+                FROM device_positions WHERE analysis_id = ?
+            ''', (analysis_id,)).fetchone()
+
+            where = 'analysis_id = ?'
+            params: List[Any] = [analysis_id]
+            if bbox:
+                west, south, east, north = bbox
+                x0, y0 = geo.grid_cell(north, west)
+                x1, y1 = geo.grid_cell(south, east)
+                # A box crossing the antimeridian wraps around x
+                where += ' AND cell_x >= ? AND cell_x <= ?' if west <= east else \
+                    ' AND (cell_x >= ? OR cell_x <= ?)'
+                where += ' AND cell_y BETWEEN ? AND ?'
+                params += [x0, x1, y0, y1]
+
+            shift = geo.cluster_shift(zoom)
+            clusters = conn.execute(f'''
+                SELECT COUNT(*) AS devices, SUM(point_count) AS points,
+                    AVG(lat) AS lat, AVG(lng) AS lng, MIN(imei) AS imei, MIN(time) AS time
+                FROM device_positions WHERE {where}
+                GROUP BY cell_x >> ?, cell_y >> ?
+            ''', params + [shift, shift]).fetchall()
+
+        return {
+            'type': 'FeatureCollection',
+            'bbox': list(extent[1:]) if extent[0] else None,
+            'devices': extent[0],
+            'zoom': zoom,
+            'features': geo.fleet_features(clusters)
+        }
+
+    def get_device_history(self, imei: str, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Return a device's scorecard across all analyses, oldest period first.
+
+        Reads idx_scorecard_imei_history alone (it covers every history
+        column), so the cost depends on the device's analyses, not on how
+        many analyses exist.
+
+        Args:
+            imei: The device IMEI
+            limit: Optional number of most recent periods to return
+
+        Returns:
+            Dict with the imei, the total number of analyses of the device,
+            and its history: analysis_id, filename and processed_at, plus
+            the scorecard period and score components keyed as in the
+            scorecard (Primer_Reporte, Puntaje_Calidad, ...)
+        """
+        keys = dict(SCORECARD_COLUMN_MAP)
+        columns = ', '.join(f's.{column}' for column in DEVICE_HISTORY_COLUMNS)
+        with self.get_connection() as conn:
+            total = conn.execute(
+                'SELECT COUNT(*) FROM scorecard WHERE imei = ?', (imei,)
+            ).fetchone()[0]
+            # Latest first through the index, then back to period order
+            rows = conn.execute(f'''
+                SELECT {columns}, a.filename, a.processed_at
+                FROM scorecard s JOIN analyses a ON a.id = s.analysis_id
+                WHERE s.imei = ?
+                ORDER BY s.primer_reporte DESC, s.analysis_id DESC
+                LIMIT ?
+            ''', (imei, -1 if limit is None else limit)).fetchall()
+
+        history = []
+        for r in reversed(rows):
+            entry = {
+                'analysis_id': r['analysis_id'],
+                'filename': r['filename'],
+                'processed_at': r['processed_at']
+            }
+            entry.update((keys[column], r[column]) for column in DEVICE_HISTORY_COLUMNS
+                         if column != 'analysis_id')
+            history.append(entry)
+        return {'imei': imei, 'total': total, 'history': history}
+
+    def get_route_points(self, analysis_id: str, imei: str) -> Optional[Dict[str, list]]:
+        """Return the positions and events of one device, in (time, id) order.
+
+        Args:
+            analysis_id: The analysis identifier
+            imei: The device IMEI
+
+        Returns:
+            Dict of column lists ('time', 'lat', 'lng', 'speed',
+            'event_type') or None if analysis not found
+        """
+        storage = self._telemetry_storage_of(analysis_id)
+        if storage is None:
+            return None
+        if storage == COLUMNAR_STORAGE:
+            return self.telemetry_store.open(analysis_id).column_lists(imei, ROUTE_COLUMNS)
 
-    def update_job_progress(self, job_id: str, progress: int, status: str = 'processing') -> None:
-        """Update job progress."""
         with self.get_connection() as conn:
-            conn.execute(
-                'UPDATE processing_jobs SET progress = ?, status = ? WHERE id = ?',
-                (progress, status, job_id)
+            rows = conn.execute(f'''
+                SELECT {', '.join(ROUTE_COLUMNS)} FROM telemetry_data
+                WHERE analysis_id = ? AND imei = ? ORDER BY time, id
+            ''', (analysis_id, imei)).fetchall()
+        columns = list(zip(*rows)) or [()] * len(ROUTE_COLUMNS)
+        return {name: list(values) for name, values in zip(ROUTE_COLUMNS, columns)}
+
+    def iter_telemetry(self, analysis_id: str, imei: Optional[str] = None,
+                       batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[tuple]]:
+        """Stream all telemetry rows of an analysis in (time, id) order.
+
+        Uses a dedicated connection, held for the lifetime of the generator,
+        so a long export never ties up the thread's pooled connection. Rows
+        are read with fetchmany, keeping memory bounded by `batch_size`.
+        Analyses in the columnar store are read from their column files.
+
+        Args:
+            analysis_id: The analysis identifier
+            imei: Optional IMEI filter
+            batch_size: Rows per yielded batch
+
+        Yields:
+            Lists of row tuples with values in TELEMETRY_COLUMN_MAP order
+            (flags as 0/1)
+        """
+        if self._telemetry_storage_of(analysis_id) == COLUMNAR_STORAGE:
+            yield from self.telemetry_store.open(analysis_id).iter_tuples(imei, batch_size)
+            return
+
+        columns = ', '.join(column for column, _ in TELEMETRY_COLUMN_MAP)
+        where = 'analysis_id = ?'
+        params: List[Any] = [analysis_id]
+        if imei:
+            where += ' AND imei = ?'
+            params.append(imei)
+
+        conn = self._connect()
+        conn.row_factory = None
+        try:
+            cursor = conn.execute(
+                f'SELECT {columns} FROM telemetry_data WHERE {where} ORDER BY time, id', params
             )
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    return
+                yield batch
+        finally:
+            conn.close()
+
+    # Job management methods for background processing
+    def create_job(self, job_id: str, filename: str, file_path: Optional[str] = None,
+                   content_hash: Optional[str] = None) -> None:
+        """Create a new processing job.
 
-    def complete_job(self, job_id: str, analysis_id: str) -> None:
-        """Mark job as complete with analysis ID."""
+        Args:
+            job_id: The job identifier
+            filename: Original upload filename
+            file_path: Path of the upload to process; jobs with a path are
+                picked up by claim_job
+            content_hash: SHA-256 of the upload
+        """
         with self.get_connection() as conn:
             conn.execute('''
+                INSERT INTO processing_jobs (id, filename, status, file_path, content_hash)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (job_id, filename, 'pending', file_path, content_hash))
+
+    def claim_job(self, owner: str, lease_seconds: float,
+                  now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest pending job and lease it to `owner`.
+
+        A single UPDATE ... RETURNING, so concurrent workers in any number
+        of processes never claim the same job.
+
+        Args:
+            owner: Identifier of the claiming worker
+            lease_seconds: Lease duration; renew it with heartbeat_job
+            now: Current Unix time (defaults to time.time())
+
+        Returns:
+            The claimed job (see get_job) or None if the queue is empty
+        """
+        now = time.time() if now is None else now
+        with self.get_connection() as conn:
+            row = conn.execute('''
                 UPDATE processing_jobs
-                SET status = 'completed', analysis_id = ?, completed_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (analysis_id, job_id))
+                SET status = 'processing', attempts = attempts + 1,
+                    lease_owner = ?, lease_expires_at = ?
+                WHERE id = (
+                    SELECT id FROM processing_jobs
+                    WHERE status = 'pending' AND file_path IS NOT NULL
+                    ORDER BY created_at, rowid LIMIT 1
+                )
+                RETURNING *
+            ''', (owner, now + lease_seconds)).fetchone()
+            return _job_row_to_dict(row) if row else None
+
+    def heartbeat_job(self, job_id: str, owner: str, lease_seconds: float,
+                      now: Optional[float] = None) -> bool:
+        """Extend the lease of a job still held by `owner`.
 
-    def fail_job(self, job_id: str, error_message: str) -> None:
-        """Mark job as failed with error message."""
+        Returns:
+            False if the lease was lost (expired and recovered, or finished)
+        """
         with self.get_connection() as conn:
-            conn.execute('''
+            return _renew_lease(conn, job_id, owner, lease_seconds, now)
+
+    def holds_lease(self, job_id: str, owner: str) -> bool:
+        """Return True if `owner` still holds the lease of a processing job."""
+        with self.get_connection() as conn:
+            row = conn.execute('''
+                SELECT 1 FROM processing_jobs
+                WHERE id = ? AND lease_owner = ? AND status = 'processing'
+            ''', (job_id, owner)).fetchone()
+            return row is not None
+
+    def retry_job(self, job_id: str, error_message: str, max_attempts: int,
+                  owner: Optional[str] = None) -> bool:
+        """Return a job to the queue after an infrastructure failure.
+
+        Args:
+            job_id: The job identifier
+            error_message: Reason, kept in error_message
+            max_attempts: Attempts after which the job fails instead
+            owner: If given, only a job still leased to this owner changes
+
+        Returns:
+            True if requeued, False if it was marked failed (or left alone,
+            its lease lost)
+        """
+        owned, params = _lease_condition(owner)
+        with self.get_connection() as conn:
+            cursor = conn.execute(f'''
+                UPDATE processing_jobs
+                SET status = 'pending', progress = 0, error_message = ?,
+                    stage = NULL, eta_seconds = NULL, progress_detail = NULL,
+                    lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ? AND attempts < ?{owned}
+            ''', (error_message, job_id, max_attempts, *params))
+            if cursor.rowcount:
+                return True
+        self.fail_job(job_id, f"{error_message} (gave up after {max_attempts} attempts)", owner=owner)
+        return False
+
+    def recover_jobs(self, max_attempts: int, now: Optional[float] = None) -> Tuple[int, int]:
+        """Requeue or fail 'processing' jobs whose worker is gone.
+
+        A job is abandoned when its lease expired without a heartbeat, or
+        when it has no lease at all (started before the durable queue).
+
+        Args:
+            max_attempts: Jobs with this many attempts are failed instead
+            now: Current Unix time (defaults to time.time())
+
+        Returns:
+            (requeued, failed) job counts
+        """
+        now = time.time() if now is None else now
+        abandoned = "status = 'processing' AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+        with self.get_connection() as conn:
+            failed = conn.execute(f'''
+                UPDATE processing_jobs
+                SET status = 'failed', completed_at = CURRENT_TIMESTAMP,
+                    error_message = 'Worker stopped responding (gave up after ' || attempts || ' attempts)',
+                    eta_seconds = NULL, lease_owner = NULL, lease_expires_at = NULL
+                WHERE {abandoned} AND (attempts >= ? OR file_path IS NULL)
+            ''', (now, max_attempts)).rowcount
+            requeued = conn.execute(f'''
                 UPDATE processing_jobs
-                SET status = 'failed', error_message = ?, completed_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (error_message, job_id))
+                SET status = 'pending', progress = 0,
+                    error_message = 'Worker stopped responding; requeued',
+                    stage = NULL, eta_seconds = NULL, progress_detail = NULL,
+                    lease_owner = NULL, lease_expires_at = NULL
+                WHERE {abandoned}
+            ''', (now,)).rowcount
+        return requeued, failed
+
+    def job_counts(self) -> Dict[str, int]:
+        """Return the number of jobs in each status."""
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                'SELECT status, COUNT(*) FROM processing_jobs GROUP BY status'
+            ).fetchall()
+            return {r[0]: r[1] for r in rows}
+
+    def update_job_progress(self, job_id: str, progress: int, status: str = 'processing',
+                            stage: Optional[str] = None, eta_seconds: Optional[float] = None,
+                            detail: Optional[Dict[str, Any]] = None,
+                            owner: Optional[str] = None) -> bool:
+        """Update job progress.
+
+        Args:
+            job_id: The job identifier
+            progress: Overall progress (0-100)
+            status: Job status
+            stage: Pipeline stage being run
+            eta_seconds: Estimated seconds left
+            detail: Pipeline progress counters, stored as JSON
+            owner: If given, only a job still leased to this owner is updated
+
+        Returns:
+            False if no job was updated (unknown, or its lease lost)
+        """
+        owned, params = _lease_condition(owner)
+        with self.get_connection() as conn:
+            cursor = conn.execute(f'''
+                UPDATE processing_jobs
+                SET progress = ?, status = ?, stage = ?, eta_seconds = ?, progress_detail = ?
+                WHERE id = ?{owned}
+            ''', (progress, status, stage, eta_seconds,
+                  json.dumps(detail) if detail is not None else None, job_id, *params))
+            return cursor.rowcount > 0
+
+    def complete_job(self, job_id: str, analysis_id: str, owner: Optional[str] = None) -> bool:
+        """Mark job as complete with analysis ID.
+
+        Only a job still leased to `owner` is completed, if one is given.
+        Returns False if no job was updated.
+        """
+        owned, params = _lease_condition(owner)
+        with self.get_connection() as conn:
+            cursor = conn.execute(f'''
+                UPDATE processing_jobs
+                SET status = 'completed', progress = 100, analysis_id = ?, error_message = NULL,
+                    eta_seconds = NULL, completed_at = CURRENT_TIMESTAMP,
+                    lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ?{owned}
+            ''', (analysis_id, job_id, *params))
+            return cursor.rowcount > 0
+
+    def fail_job(self, job_id: str, error_message: str, owner: Optional[str] = None) -> bool:
+        """Mark job as failed with error message.
+
+        Only a job still leased to `owner` is failed, if one is given.
+        Returns False if no job was updated.
+        """
+        owned, params = _lease_condition(owner)
+        with self.get_connection() as conn:
+            cursor = conn.execute(f'''
+                UPDATE processing_jobs
+                SET status = 'failed', error_message = ?, eta_seconds = NULL,
+                    completed_at = CURRENT_TIMESTAMP, lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ?{owned}
+            ''', (error_message, job_id, *params))
+            return cursor.rowcount > 0
 
     def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
         """Get job status."""
@@ -496,16 +1426,72 @@ class Database:
             if not row:
                 return None
 
-            return {
-                'id': row['id'],
-                'analysis_id': row['analysis_id'],
-                'filename': row['filename'],
-                'status': row['status'],
-                'progress': row['progress'],
-                'error_message': row['error_message'],
-                'created_at': row['created_at'],
-                'completed_at': row['completed_at']
-            }
+            return _job_row_to_dict(row)
+
+    def get_jobs(self, job_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the status of several jobs in one query, keyed by job ID.
+
+        Jobs that do not exist are left out.
+        """
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        placeholders = ', '.join('?' * len(job_ids))
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                f'SELECT * FROM processing_jobs WHERE id IN ({placeholders})', job_ids
+            ).fetchall()
+            return {row['id']: _job_row_to_dict(row) for row in rows}
+
+    def data_version(self) -> int:
+        """Return SQLite's data_version for this thread's connection.
+
+        The value changes whenever another connection, in this process or
+        any other, commits to the database. Reading it touches no table, so
+        it is a cheap check for whether anything needs re-reading.
+        """
+        with self.get_connection() as conn:
+            return conn.execute('PRAGMA data_version').fetchone()[0]
+
+
+def _renew_lease(conn: sqlite3.Connection, job_id: str, owner: str, lease_seconds: float,
+                 now: Optional[float] = None) -> bool:
+    """Extend a job's lease on `conn`; False if `owner` no longer holds it."""
+    now = time.time() if now is None else now
+    cursor = conn.execute('''
+        UPDATE processing_jobs SET lease_expires_at = ?
+        WHERE id = ? AND lease_owner = ? AND status = 'processing'
+    ''', (now + lease_seconds, job_id, owner))
+    return cursor.rowcount > 0
+
+
+def _lease_condition(owner: Optional[str]) -> Tuple[str, tuple]:
+    """SQL condition (and parameters) limiting a job update to its lease owner."""
+    if owner is None:
+        return '', ()
+    return " AND lease_owner = ? AND status = 'processing'", (owner,)
+
+
+def _job_row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    """Convert a processing_jobs row to the job status dictionary."""
+    return {
+        'id': row['id'],
+        'analysis_id': row['analysis_id'],
+        'filename': row['filename'],
+        'file_path': row['file_path'],
+        'content_hash': row['content_hash'],
+        'status': row['status'],
+        'progress': row['progress'],
+        'error_message': row['error_message'],
+        # Same key as the in-memory job status
+        'error': row['error_message'] if row['status'] == 'failed' else None,
+        'attempts': row['attempts'],
+        'stage': row['stage'],
+        'eta_seconds': row['eta_seconds'],
+        'detail': json.loads(row['progress_detail']) if row['progress_detail'] else None,
+        'created_at': row['created_at'],
+        'completed_at': row['completed_at']
+    }
 
 
 def migrate_json_to_sqlite(db: Database, history_file: str, processed_folder: str) -> int:
@@ -0,0 +1,133 @@
+"""Streaming CSV / Parquet encoders for telemetry exports."""
+import io
+import csv
+from typing import Iterable, Iterator, List
+
+from database import TELEMETRY_COLUMN_MAP, TELEMETRY_TEXT_COLUMNS, FLAG_KEYS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+# Export column names, in the order of Database.iter_telemetry rows
+EXPORT_COLUMNS = [key for _, key in TELEMETRY_COLUMN_MAP]
+
+# Columns stored as text; the rest are numeric (or 0/1 flags)
+TEXT_COLUMNS = frozenset(key for column, key in TELEMETRY_COLUMN_MAP if column in TELEMETRY_TEXT_COLUMNS)
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+_FLAG_POSITIONS = [i for i, key in enumerate(EXPORT_COLUMNS) if key in FLAG_KEYS]
+
+
+def parquet_available() -> bool:
+    """Return True if pyarrow is installed."""
+    return pa is not None
+
+
+def stream_csv(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """Encode batches of telemetry rows as CSV, one chunk per batch.
+
+    Flags are written as true/false, nulls (absent flags included) as
+    empty cells.
+
+    Args:
+        batches: Row batches from Database.iter_telemetry
+
+    Yields:
+        UTF-8 encoded CSV chunks, starting with the header line
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue().encode('utf-8')
+
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        if _FLAG_POSITIONS:
+            batch = [_flags_to_text(row) for row in batch]
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _flags_to_text(row: tuple) -> list:
+    row = list(row)
+    for i in _FLAG_POSITIONS:
+        if row[i] is not None:
+            row[i] = 'true' if row[i] else 'false'
+    return row
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the caller."""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_parquet(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """Encode batches of telemetry rows as Parquet, one row group per batch.
+
+    Args:
+        batches: Row batches from Database.iter_telemetry
+
+    Yields:
+        Parquet file bytes; the footer comes with the last chunk
+
+    Raises:
+        RuntimeError: If pyarrow is not installed
+    """
+    if pa is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+
+    schema = pa.schema([
+        (key, pa.string() if key in TEXT_COLUMNS else
+              pa.bool_() if key in FLAG_KEYS else pa.float64())
+        for key in EXPORT_COLUMNS
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            columns = list(zip(*batch))
+            arrays = [
+                pa.array([None if v is None else bool(v) for v in values] if key in FLAG_KEYS else values,
+                         type=field.type)
+                for key, field, values in zip(EXPORT_COLUMNS, schema, columns)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
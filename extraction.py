@@ -0,0 +1,363 @@
+"""Telemetry extraction from raw gateway log entries."""
+import json
+import codecs
+import logging
+import threading
+import multiprocessing
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Optional
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+NAN = float('nan')
+
+# Column layout of the extracted telemetry frame, in output order.
+# Numeric fields are stored in float64 buffers (None/invalid -> NaN), flags in
+# int8 buffers exposed as bool, everything else as Python objects.
+FIELDS = (
+    'imei', 'time', 'receiveTimestamp', 'lat', 'lng', 'altitude', 'speed',
+    'heading', 'lastFixTime', 'isMoving', 'batteryLevelPercentage',
+    'reportMode', 'quality', 'mileage', 'ignitionOn', 'externalPowerVcc',
+    'digitalInput', 'driverId', 'engineRPM', 'vehicleSpeed',
+    'engineCoolantTemperature', 'totalDistance', 'totalFuelUsed',
+    'fuelLevelInput', 'event_type', 'has_rpm', 'has_speed', 'has_temp',
+    'has_dist', 'has_fuel_total', 'has_fuel_level', 'has_ignition', 'gps_ok'
+)
+FLOAT_FIELDS = frozenset((
+    'lat', 'lng', 'altitude', 'speed', 'heading', 'batteryLevelPercentage',
+    'mileage', 'externalPowerVcc', 'engineRPM', 'vehicleSpeed',
+    'engineCoolantTemperature', 'totalDistance', 'totalFuelUsed', 'fuelLevelInput'
+))
+BOOL_FIELDS = frozenset((
+    'has_rpm', 'has_speed', 'has_temp', 'has_dist', 'has_fuel_total',
+    'has_fuel_level', 'has_ignition', 'gps_ok'
+))
+
+_NUMERIC_EVENT_TYPES = {
+    6: 'Ignition On',
+    7: 'Ignition Off',
+    16: 'Harsh Breaking',
+    17: 'Harsh Acceleration',
+    18: 'Harsh Turn',
+    1: 'SOS'
+}
+
+# Common mappings based on typical provider JSON
+_NAMED_EVENT_TYPES = {
+    '6': 'Ignition On',
+    'ignition_on': 'Ignition On',
+    'ignitionon': 'Ignition On',
+    '7': 'Ignition Off',
+    'ignition_off': 'Ignition Off',
+    'ignitionoff': 'Ignition Off',
+    '16': 'Harsh Breaking',
+    'braking_harsh': 'Harsh Breaking',
+    'harsh_braking': 'Harsh Breaking',
+    'harshbraking': 'Harsh Breaking',
+    '17': 'Harsh Acceleration',
+    'acceleration_harsh': 'Harsh Acceleration',
+    'harsh_acceleration': 'Harsh Acceleration',
+    'harshacceleration': 'Harsh Acceleration',
+    '18': 'Harsh Turn',
+    'cornering_harsh': 'Harsh Turn',
+    'harsh_turn': 'Harsh Turn',
+    'harshturn': 'Harsh Turn',
+    'sos': 'SOS',
+    'panic': 'SOS',
+    '1': 'SOS'
+}
+
+
+def normalize_event_type(raw_type):
+    """Map raw event types/codes to normalized strings expected by frontend."""
+    if not raw_type:
+        return None
+
+    # Handle numeric types directly
+    if isinstance(raw_type, int):
+        return _NUMERIC_EVENT_TYPES.get(raw_type, str(raw_type))
+
+    # Convert to lowercase for case-insensitive matching
+    raw_lower = str(raw_type).lower().strip()
+    return _NAMED_EVENT_TYPES.get(raw_lower, str(raw_type))
+
+
+def _to_float(value) -> float:
+    """Coerce a JSON value to float, mapping missing/invalid values to NaN."""
+    if value is None:
+        return NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+class TelemetryColumns:
+    """Columnar accumulator for extracted telemetry points.
+
+    Keeps one growable buffer per field instead of one dict per point.
+    Repeated strings (imei, quality, driverId, event_type) are interned
+    so each distinct value is stored once. to_dataframe() wraps the
+    numeric and flag buffers without copying them.
+    """
+
+    INTERNED_FIELDS = ('imei', 'quality', 'driverId', 'event_type')
+
+    def __init__(self):
+        self.size = 0
+        self.entries_seen = 0
+        self._strings: Dict[str, str] = {}
+        self._columns: Dict[str, Any] = {}
+        for name in FIELDS:
+            if name in FLOAT_FIELDS:
+                self._columns[name] = array('d')
+            elif name in BOOL_FIELDS:
+                self._columns[name] = array('b')
+            else:
+                self._columns[name] = []
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _intern(self, value):
+        if value.__class__ is str:
+            return self._strings.setdefault(value, value)
+        return value
+
+    def append_point(self, point: Dict[str, Any], receive_ts: Optional[str]) -> None:
+        """Append one telemetry point from a decoded gateway message."""
+        addons = point.get('addOns', {})
+        canbus = addons.get('canbus', {})
+        intern = self._intern
+        c = self._columns
+
+        rpm = canbus.get('engineRPM')
+        vehicle_speed = canbus.get('vehicleSpeed')
+        coolant = canbus.get('engineCoolantTemperature')
+        total_distance = canbus.get('totalDistance')
+        total_fuel = canbus.get('totalFuelUsed')
+        fuel_level = canbus.get('fuelLevelInput')
+        ignition_on = addons.get('ignitionOn')
+        quality = point.get('quality')
+        # Resolve everything that can raise before touching the buffers so a
+        # malformed point never leaves the columns with different lengths
+        event_type = normalize_event_type(
+            point.get('event', {}).get('type') or
+            point.get('alert', {}).get('type') or
+            point.get('type') or
+            point.get('eventId') or
+            addons.get('alert')
+        )
+
+        c['imei'].append(intern(point.get('imei')))
+        c['time'].append(point.get('time'))
+        c['receiveTimestamp'].append(receive_ts)
+        c['lat'].append(_to_float(point.get('lat')))
+        c['lng'].append(_to_float(point.get('lng')))
+        c['altitude'].append(_to_float(point.get('altitude')))
+        c['speed'].append(_to_float(point.get('speed')))
+        c['heading'].append(_to_float(point.get('heading')))
+        c['lastFixTime'].append(point.get('lastFixTime'))
+        c['isMoving'].append(point.get('isMoving'))
+        c['batteryLevelPercentage'].append(_to_float(point.get('batteryLevelPercentage')))
+        c['reportMode'].append(point.get('reportMode'))
+        c['quality'].append(intern(quality))
+        c['mileage'].append(_to_float(addons.get('mileage')))
+        c['ignitionOn'].append(ignition_on)
+        c['externalPowerVcc'].append(_to_float(addons.get('externalPowerVcc')))
+        c['digitalInput'].append(addons.get('digitalInput'))
+        c['driverId'].append(intern(addons.get('driverId')))
+        c['engineRPM'].append(_to_float(rpm))
+        c['vehicleSpeed'].append(_to_float(vehicle_speed))
+        c['engineCoolantTemperature'].append(_to_float(coolant))
+        c['totalDistance'].append(_to_float(total_distance))
+        c['totalFuelUsed'].append(_to_float(total_fuel))
+        c['fuelLevelInput'].append(_to_float(fuel_level))
+        c['event_type'].append(intern(event_type))
+        # Quality Indicators for Radar
+        c['has_rpm'].append(rpm is not None)
+        c['has_speed'].append(vehicle_speed is not None)
+        c['has_temp'].append(coolant is not None)
+        c['has_dist'].append(total_distance is not None)
+        c['has_fuel_total'].append(total_fuel is not None)
+        c['has_fuel_level'].append(fuel_level is not None)
+        c['has_ignition'].append(ignition_on is not None)
+        c['gps_ok'].append(quality == 'Good')
+        self.size += 1
+
+    def extend(self, other: 'TelemetryColumns') -> None:
+        """Append all points of another accumulator (e.g. a worker chunk)."""
+        for name in FIELDS:
+            if name in self.INTERNED_FIELDS:
+                self._columns[name].extend(map(self._intern, other._columns[name]))
+            else:
+                self._columns[name].extend(other._columns[name])
+        self.size += other.size
+        self.entries_seen += other.entries_seen
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Build a DataFrame that shares memory with the typed buffers."""
+        data = {}
+        for name in FIELDS:
+            col = self._columns[name]
+            if name in FLOAT_FIELDS:
+                data[name] = np.frombuffer(col, dtype=np.float64)
+            elif name in BOOL_FIELDS:
+                data[name] = np.frombuffer(col, dtype=np.int8).view(np.bool_)
+            else:
+                data[name] = np.fromiter(col, dtype=object, count=len(col))
+        return pd.DataFrame(data, copy=False)
+
+
+def decode_telemetry_list(additional_info_str: str, decoder: json.JSONDecoder) -> list:
+    """Decode the telemetry points nested in an AdditionalInformation string.
+
+    The payload is JSON-in-JSON: AdditionalInformation -> Arguments -> message.
+    When the nested strings are not valid JSON, falls back to locating the
+    escaped message marker and unescaping it.
+    """
+    telemetry_list = []
+    try:
+        additional_info_data = json.loads(additional_info_str)
+        arguments_str = additional_info_data.get('Arguments')
+        if arguments_str:
+            arguments_data = json.loads(arguments_str)
+            message_content = arguments_data.get('message')
+            if message_content:
+                parsed_data = json.loads(message_content) if isinstance(message_content, str) else message_content
+                if isinstance(parsed_data, dict): telemetry_list.append(parsed_data)
+                elif isinstance(parsed_data, list): telemetry_list = parsed_data
+    except Exception as e:
+        logger.debug(f"Primary JSON parsing failed, trying fallback: {e}")
+        # Fallback extraction
+        start_marker = '\\"message\\":'
+        start_index = additional_info_str.find(start_marker)
+        if start_index != -1:
+            text_to_decode = additional_info_str[start_index + len(start_marker):]
+            try:
+                clean_text = codecs.decode(text_to_decode, 'unicode_escape').strip().strip('"')
+                parsed_data, _ = decoder.raw_decode(clean_text)
+                if isinstance(parsed_data, dict): telemetry_list.append(parsed_data)
+                elif isinstance(parsed_data, list): telemetry_list = parsed_data
+            except Exception as e:
+                logger.debug(f"Fallback JSON parsing failed: {e}")
+    return telemetry_list
+
+
+def extract_telemetry(logs_data: Iterable[Dict[str, Any]],
+                      columns: Optional[TelemetryColumns] = None) -> TelemetryColumns:
+    """Extract telemetry points from log entries into a columnar accumulator.
+
+    Args:
+        logs_data: Iterable of raw log entries
+        columns: Optional accumulator to append to
+
+    Returns:
+        The accumulator holding all extracted points
+    """
+    if columns is None:
+        columns = TelemetryColumns()
+    decoder = json.JSONDecoder()
+    entries_seen = 0
+
+    for log_entry in logs_data:
+        entries_seen += 1
+        try:
+            receive_ts = log_entry.get('receiveTimestamp')
+            json_payload = log_entry.get('jsonPayload', {})
+            data_obj = json_payload.get('data', {}) if isinstance(json_payload, dict) else {}
+            additional_info_str = data_obj.get('AdditionalInformation')
+
+            if not additional_info_str:
+                continue
+
+            for point in decode_telemetry_list(additional_info_str, decoder):
+                if not isinstance(point, dict) or 'imei' not in point: continue
+                columns.append_point(point, receive_ts)
+        except Exception as e:
+            logger.warning(f"Failed to process log entry: {e}")
+
+    columns.entries_seen += entries_seen
+    return columns
+
+
+# Process pool shared by all parallel extractions in this process
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the shared extraction pool, (re)creating it for a new size."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # forkserver children start from a clean process, so forking the
+            # multi-threaded web server never copies held locks
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the shared extraction pool's processes, if it was started."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+            _pool_workers = 0
+
+
+def _extract_chunk(entries: list) -> TelemetryColumns:
+    """Worker entry point: extract one chunk of log entries."""
+    return extract_telemetry(entries)
+
+
+def extract_telemetry_parallel(logs_data: Iterable[Dict[str, Any]], workers: int,
+                               chunk_size: int = 2000) -> TelemetryColumns:
+    """Extract telemetry on a process pool, merging chunk results in order.
+
+    Log entries are grouped into chunks of chunk_size and decoded in worker
+    processes, with at most two chunks per worker in flight so a streamed
+    upload is never fully materialized. Inputs that fit in one chunk, or
+    workers <= 1, are extracted in-process.
+
+    Args:
+        logs_data: Iterable of raw log entries
+        workers: Number of worker processes
+        chunk_size: Log entries per chunk
+
+    Returns:
+        The merged accumulator, in input order
+    """
+    if workers <= 1:
+        return extract_telemetry(logs_data)
+
+    iterator = iter(logs_data)
+    first = list(islice(iterator, chunk_size))
+    if len(first) < chunk_size:
+        return extract_telemetry(first)
+
+    pool = _get_pool(workers)
+    columns = TelemetryColumns()
+    pending = deque([pool.submit(_extract_chunk, first)])
+    max_in_flight = workers * 2
+
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if chunk:
+            pending.append(pool.submit(_extract_chunk, chunk))
+        while pending and (len(pending) >= max_in_flight or not chunk):
+            columns.extend(pending.popleft().result())
+        if not chunk:
+            return columns
@@ -0,0 +1,254 @@
+"""Map geometry: route simplification and the fleet map grid.
+
+Routes are simplified with Douglas-Peucker, run top-down from a priority
+queue: the point farthest from the current polyline is always added
+next, so stopping after N points gives the best N-point approximation the
+algorithm can find, and stopping at a distance gives the classic
+tolerance-based result. Distances are in meters on an equirectangular
+projection around the route's mean latitude, which is accurate at the
+scale of a vehicle track.
+
+The fleet map indexes each device's first GPS fix by its Web Mercator
+tile coordinates at GRID_LEVEL. The cell of a point at any coarser zoom
+is its stored cell shifted right, so clustering for a viewport is an
+integer GROUP BY over an index range scan.
+"""
+import heapq
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Meters per degree of latitude
+METERS_PER_DEGREE = 111320.0
+
+# Ground meters per pixel at zoom 0 on the equator (256-pixel Web Mercator tiles)
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+# Route vertices returned by default, and at most (event points come on top)
+DEFAULT_ROUTE_POINTS = 5000
+MAX_ROUTE_POINTS = 50000
+
+# Event types that are not events (stored as text by some gateways)
+_NO_EVENT = (None, '', 'null')
+
+# Zoom of the stored map grid cells (about 2 m at the equator)
+GRID_LEVEL = 24
+
+# Fleet clusters span a quarter of a 256-pixel tile (64 pixels) at the map's zoom
+CLUSTER_LEVEL_OFFSET = 2
+
+# Map zoom levels accepted by the fleet map
+MAX_MAP_ZOOM = 22
+
+# Latitude limit of Web Mercator
+MAX_LATITUDE = 85.05112878
+
+
+def zoom_tolerance(zoom: float, latitude: float) -> float:
+    """Return the ground size of one map pixel, in meters.
+
+    Args:
+        zoom: Web Mercator zoom level
+        latitude: Latitude of the area shown, in degrees
+    """
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+
+def _segment_distances2(x: np.ndarray, y: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Squared distances of the points strictly between start and end to the start-end segment."""
+    px = x[start + 1:end] - x[start]
+    py = y[start + 1:end] - y[start]
+    dx, dy = x[end] - x[start], y[end] - y[start]
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return px * px + py * py
+    t = (px * dx + py * dy) / length2
+    np.maximum(t, 0.0, out=t)
+    np.minimum(t, 1.0, out=t)
+    px -= t * dx
+    py -= t * dy
+    return px * px + py * py
+
+
+def simplify(x: np.ndarray, y: np.ndarray, max_points: Optional[int] = None,
+             tolerance: float = 0.0, keep: Optional[np.ndarray] = None) -> np.ndarray:
+    """Douglas-Peucker simplification of a polyline.
+
+    Args:
+        x: Projected x coordinates (meters)
+        y: Projected y coordinates (meters)
+        max_points: Vertices to keep at most, endpoints included (None for no limit)
+        tolerance: Points closer than this to the simplified line are dropped
+        keep: Optional boolean mask of points kept regardless (e.g. events),
+            on top of max_points
+
+    Returns:
+        Sorted indices of the kept points
+    """
+    n = len(x)
+    selected = np.zeros(n, dtype=bool)
+    if n:
+        selected[[0, n - 1]] = True
+    budget = (n if max_points is None else max(max_points, 2)) - 2
+
+    heap: List[tuple] = []
+
+    def push(start: int, end: int) -> None:
+        if end - start < 2:
+            return
+        distances2 = _segment_distances2(x, y, start, end)
+        i = int(distances2.argmax())
+        heapq.heappush(heap, (-math.sqrt(distances2[i]), start, end, start + 1 + i))
+
+    push(0, n - 1)
+    while heap and budget > 0:
+        distance, start, end, i = heapq.heappop(heap)
+        if -distance <= tolerance:
+            break
+        selected[i] = True
+        budget -= 1
+        push(start, i)
+        push(i, end)
+
+    if keep is not None:
+        selected |= keep
+    return np.flatnonzero(selected)
+
+
+def has_fix(lat: Any, lng: Any) -> bool:
+    """Return True if lat/lng is a usable GPS fix (numeric, finite, not 0)."""
+    return (isinstance(lat, (int, float)) and isinstance(lng, (int, float))
+            and math.isfinite(lat) and math.isfinite(lng) and lat != 0 and lng != 0)
+
+
+def grid_cell(lat: float, lng: float, level: int = GRID_LEVEL) -> Tuple[int, int]:
+    """Return the Web Mercator tile (x, y) containing a point at a zoom level."""
+    scale = 2 ** level
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = (lng + 180.0) / 360.0 * scale
+    sin_lat = math.sin(math.radians(lat))
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return min(int(x), scale - 1), min(int(y), scale - 1)
+
+
+def cluster_shift(zoom: int) -> int:
+    """Bits to shift GRID_LEVEL cells right to get the cluster cells of a map zoom."""
+    return max(0, GRID_LEVEL - (zoom + CLUSTER_LEVEL_OFFSET))
+
+
+def parse_bbox(text: str) -> Tuple[float, float, float, float]:
+    """Parse a 'west,south,east,north' bounding box in degrees.
+
+    West may exceed east for a box crossing the antimeridian.
+
+    Raises:
+        ValueError: If the box is malformed or out of range
+    """
+    try:
+        west, south, east, north = (float(v) for v in text.split(','))
+    except ValueError as e:
+        raise ValueError(f"Invalid bbox: {text}") from e
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError(f"Invalid bbox: {text}")
+    return west, south, east, north
+
+
+def first_fixes(rows: Iterable[Tuple[Any, Any, Any, Any]]) -> Dict[str, Tuple[Any, float, float, int]]:
+    """Find each device's first GPS fix in time order.
+
+    Args:
+        rows: (imei, time, lat, lng) of every telemetry row, in id order
+
+    Returns:
+        {imei: (time, lat, lng, rows of the device)} for the devices with
+        at least one fix; rows without a time come first, as in paging
+    """
+    counts: Dict[str, int] = {}
+    fixes: Dict[str, Tuple[Any, float, float]] = {}
+    for imei, time, lat, lng in rows:
+        if not imei:
+            continue
+        counts[imei] = counts.get(imei, 0) + 1
+        if not has_fix(lat, lng):
+            continue
+        current = fixes.get(imei)
+        if current is None or (time is None and current[0] is not None) or \
+                (time is not None and current[0] is not None and time < current[0]):
+            fixes[imei] = (time, float(lat), float(lng))
+    return {imei: (*fix, counts[imei]) for imei, fix in fixes.items()}
+
+
+def fleet_features(clusters: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Build GeoJSON point features from fleet map clusters.
+
+    Args:
+        clusters: Dicts with lat, lng, devices and points, plus the imei
+            and time of single-device clusters
+
+    Returns:
+        GeoJSON Features; single devices carry their imei and time
+    """
+    features = []
+    for cluster in clusters:
+        properties = {'devices': cluster['devices'], 'points': cluster['points']}
+        if cluster['devices'] == 1:
+            properties['imei'] = cluster['imei']
+            properties['time'] = cluster['time']
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [cluster['lng'], cluster['lat']]},
+            'properties': properties
+        })
+    return features
+
+
+def build_route(points: Dict[str, list], max_points: int = DEFAULT_ROUTE_POINTS,
+                zoom: Optional[float] = None) -> Dict[str, Any]:
+    """Build the simplified route of a device for the map.
+
+    Points without a valid fix (missing or 0 coordinates) are skipped, as
+    the map does. Event points are always kept as vertices.
+
+    Args:
+        points: Columns 'time', 'lat', 'lng', 'speed' and 'event_type' of
+            the device's telemetry, in time order
+        max_points: Route vertices to keep at most, besides event points
+        zoom: Optional map zoom; points within one pixel of the line at
+            that zoom are dropped as well
+
+    Returns:
+        Dict with total_points, the route vertices as [lat, lng] pairs,
+        the events (lat, lng, time, speed, event_type) and the start and
+        end points (lat, lng, time)
+    """
+    lat = np.array(points['lat'], dtype=float)
+    lng = np.array(points['lng'], dtype=float)
+    valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lng) & (lat != 0) & (lng != 0))
+    lat, lng = lat[valid], lng[valid]
+    times = [points['time'][i] for i in valid.tolist()]
+    speeds = [points['speed'][i] for i in valid.tolist()]
+    event_types = [points['event_type'][i] for i in valid.tolist()]
+
+    route: Dict[str, Any] = {'total_points': len(valid), 'points': [], 'events': [],
+                             'start': None, 'end': None}
+    if not len(valid):
+        return route
+
+    mean_lat = float(lat.mean())
+    x = lng * math.cos(math.radians(mean_lat)) * METERS_PER_DEGREE
+    y = lat * METERS_PER_DEGREE
+    events = np.array([e not in _NO_EVENT for e in event_types], dtype=bool)
+    tolerance = zoom_tolerance(zoom, mean_lat) if zoom is not None else 0.0
+    kept = simplify(x, y, max_points=max_points, tolerance=tolerance, keep=events)
+
+    lat_list, lng_list = lat.tolist(), lng.tolist()
+    route['points'] = [[lat_list[i], lng_list[i]] for i in kept.tolist()]
+    route['events'] = [{
+        'lat': lat_list[i], 'lng': lng_list[i], 'time': times[i],
+        'speed': speeds[i], 'event_type': event_types[i]
+    } for i in np.flatnonzero(events).tolist()]
+    last = len(valid) - 1
+    route['start'] = {'lat': lat_list[0], 'lng': lng_list[0], 'time': times[0]}
+    route['end'] = {'lat': lat_list[last], 'lng': lng_list[last], 'time': times[last]}
+    return route
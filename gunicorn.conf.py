@@ -0,0 +1,13 @@
+"""Gunicorn settings.
+
+Threaded workers: a progress stream (SSE) waits on a condition variable
+for job updates, holding an idle thread rather than a whole sync worker,
+so hundreds of open streams cost little more than their sockets.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+# Concurrent requests per worker, open progress streams included
+threads = int(os.getenv('WEB_THREADS', 200))
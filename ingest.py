@@ -0,0 +1,177 @@
+"""Streaming ingestion of uploaded telemetry log files."""
+import os
+import json
+import codecs
+import hashlib
+import logging
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from disk per chunk while walking a top-level JSON array
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def save_upload(stream: BinaryIO, file_path: str,
+                chunk_size: int = READ_CHUNK_SIZE) -> Tuple[int, str]:
+    """Write an uploaded file to disk, hashing its content on the way.
+
+    Args:
+        stream: Readable binary stream of the upload (e.g. FileStorage.stream)
+        file_path: Destination path
+        chunk_size: Bytes copied per read
+
+    Returns:
+        (bytes written, SHA-256 hex digest of the content)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'wb') as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+class LogStreamReader:
+    """Iterate over the log entries of an upload without loading it whole.
+
+    Supports the two formats accepted by the uploader: a single top-level
+    JSON array of log entries, and newline-delimited JSON (one entry per
+    line). Entries are yielded one at a time, so memory is bounded by the
+    largest single entry rather than by the file size.
+    """
+
+    def __init__(self, file_path: str,
+                 on_progress: Optional[Callable[[int, int], None]] = None,
+                 chunk_size: int = READ_CHUNK_SIZE):
+        """Initialize the reader.
+
+        Args:
+            file_path: Path to the uploaded log file
+            on_progress: Optional callback receiving (bytes_read, total_bytes)
+                each time a new chunk or line is consumed from disk
+            chunk_size: Number of bytes read per chunk in array mode
+        """
+        self.file_path = file_path
+        self.on_progress = on_progress
+        self.chunk_size = chunk_size
+        self.total_bytes = os.path.getsize(file_path)
+        self.bytes_read = 0
+        self.entries_read = 0
+        self.skipped_lines = 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        with open(self.file_path, 'rb') as f:
+            if self._detect_array(f):
+                yield from self._iter_array(f)
+            else:
+                yield from self._iter_lines(f)
+
+    def _detect_array(self, f) -> bool:
+        """Return True if the first non-whitespace character is '['."""
+        head = f.read(4096).lstrip()
+        while not head:
+            chunk = f.read(4096)
+            if not chunk:
+                break
+            head = chunk.lstrip()
+        f.seek(0)
+        if head.startswith(codecs.BOM_UTF8):
+            head = head[len(codecs.BOM_UTF8):].lstrip()
+        return head[:1] == b'['
+
+    def _report(self, bytes_read: int) -> None:
+        self.bytes_read = bytes_read
+        if self.on_progress:
+            self.on_progress(bytes_read, self.total_bytes)
+
+    def _iter_lines(self, f) -> Iterator[Dict[str, Any]]:
+        """Yield one entry per non-empty line (NDJSON)."""
+        position = 0
+        for line in f:
+            position += len(line)
+            self._report(position)
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                self.skipped_lines += 1
+                logger.debug(f"Failed to parse line as JSON: {e}")
+                continue
+            self.entries_read += 1
+            yield entry
+
+    def _iter_array(self, f) -> Iterator[Dict[str, Any]]:
+        """Yield the elements of a top-level JSON array one by one."""
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        buffer = ''
+        pos = 0
+        eof = False
+        started = False
+
+        def fill(size):
+            nonlocal buffer, pos, eof
+            chunk = f.read(size)
+            if not chunk:
+                eof = True
+                buffer = buffer[pos:] + text_decoder.decode(b'', final=True)
+            else:
+                buffer = buffer[pos:] + text_decoder.decode(chunk)
+            pos = 0
+            self._report(f.tell())
+
+        while True:
+            # Skip whitespace and separators between elements
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                fill(self.chunk_size)
+
+            if pos >= len(buffer):
+                if started:
+                    logger.warning(f"Unterminated JSON array in {self.file_path}")
+                return
+
+            if not started:
+                if buffer[pos] != '[':
+                    return
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == ']':
+                return
+
+            # Decode the next element, reading more data until it is complete.
+            # A value ending exactly at the end of the buffer may be truncated
+            # (e.g. a number), so only accept it once a delimiter follows.
+            # The read size doubles on each retry to keep huge entries linear.
+            read_size = self.chunk_size
+            while True:
+                try:
+                    entry, end = decoder.raw_decode(buffer, pos)
+                    if end < len(buffer) or eof:
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        logger.warning(
+                            f"Malformed JSON array in {self.file_path} near byte "
+                            f"{self.bytes_read}, stopping after {self.entries_read} entries"
+                        )
+                        return
+                fill(read_size)
+                read_size *= 2
+
+            pos = end
+            self.entries_read += 1
+            yield entry
+
@@ -0,0 +1,132 @@
+"""Progress reporting for background analysis jobs.
+
+The analysis pipeline reports what it has done through a progress callback,
+``progress(stage, done, total)``:
+
+    read     bytes of the upload read (total: file size)
+    parse    log entries parsed (total unknown)
+    score    devices scored (total: devices in the upload)
+    convert  telemetry rows converted for the result (total: rows)
+    save     rows persisted (total: rows to save)
+
+ProgressTracker turns those calls into job status updates: an overall
+percentage, the counters, and an ETA from the observed throughput, published
+at most every PROGRESS_INTERVAL_SECONDS.
+"""
+import time
+from typing import Any, Callable, Dict, Optional
+
+ProgressCallback = Callable[[str, int, Optional[int]], None]
+
+# Minimum seconds between published updates of one job
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+# Overall percentage range covered by each stage. Parsing is interleaved
+# with reading, so it only updates its counter.
+STAGE_RANGES = {
+    'read': (5, 55),
+    'score': (55, 60),
+    'convert': (60, 70),
+    'save': (70, 99),
+}
+
+# Counters (done, total) of each stage in the published detail
+STAGE_COUNTERS = {
+    'read': ('bytes_read', 'bytes_total'),
+    'parse': ('records_parsed', None),
+    'score': ('devices_scored', 'devices_total'),
+    'convert': ('rows_converted', 'rows_to_convert'),
+    'save': ('rows_persisted', 'rows_total'),
+}
+
+# Progress of a claimed job before the pipeline reports anything
+START_PROGRESS = STAGE_RANGES['read'][0]
+
+
+class ProgressTracker:
+    """Progress callback that publishes throttled job status updates.
+
+    A status is published when a new stage starts, when a stage finishes,
+    and otherwise at most once per interval, so the callback can be invoked
+    for every batch without flooding the job store.
+    """
+
+    def __init__(self, publish: Callable[[Dict[str, Any]], None],
+                 interval: float = PROGRESS_INTERVAL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        """Initialize the tracker.
+
+        Args:
+            publish: Called with the status fields (progress, stage,
+                eta_seconds, detail) on every published update
+            interval: Minimum seconds between published updates
+            clock: Monotonic time source (for tests)
+        """
+        self.publish = publish
+        self.interval = interval
+        self.clock = clock
+        self.progress = START_PROGRESS
+        self.stage: Optional[str] = None
+        self.detail: Dict[str, Optional[int]] = {}
+        for done_key, total_key in STAGE_COUNTERS.values():
+            self.detail[done_key] = 0
+            if total_key:
+                self.detail[total_key] = None
+        self._started = clock()
+        self._stage_started = self._started
+        self._last_published: Optional[float] = None
+
+    def __call__(self, stage: str, done: int, total: Optional[int] = None) -> None:
+        done_key, total_key = STAGE_COUNTERS[stage]
+        self.detail[done_key] = done
+        if total_key:
+            self.detail[total_key] = total
+
+        now = self.clock()
+        force = False
+        if stage in STAGE_RANGES:
+            if stage != self.stage:
+                self.stage = stage
+                self._stage_started = now
+                force = True
+            low, high = STAGE_RANGES[stage]
+            fraction = min(1.0, done / total) if total else 1.0
+            self.progress = max(self.progress, int(low + (high - low) * fraction))
+            force = force or fraction >= 1.0
+
+        if force or self._last_published is None or now - self._last_published >= self.interval:
+            self._last_published = now
+            self.publish(self.status(now))
+
+    def status(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Return the current status fields."""
+        return {
+            'progress': self.progress,
+            'stage': self.stage,
+            'eta_seconds': self.eta_seconds(now),
+            'detail': dict(self.detail)
+        }
+
+    def eta_seconds(self, now: Optional[float] = None) -> Optional[float]:
+        """Estimate the seconds left from the throughput observed so far.
+
+        The rest of the current stage is extrapolated from the stage's own
+        rate; the stages after it from the overall rate in percentage points
+        per second. None until the current stage has made progress.
+        """
+        if self.stage is None:
+            return None
+        now = self.clock() if now is None else now
+        done_key, total_key = STAGE_COUNTERS[self.stage]
+        done, total = self.detail[done_key], self.detail[total_key]
+        stage_elapsed = now - self._stage_started
+        if not total or not done or stage_elapsed <= 0:
+            return None
+
+        fraction = min(1.0, done / total)
+        stage_left = stage_elapsed * (1 - fraction) / fraction
+
+        points_per_second = (self.progress - START_PROGRESS) / (now - self._started)
+        later_points = 100 - STAGE_RANGES[self.stage][1]
+        later_left = later_points / points_per_second if points_per_second > 0 else 0.0
+        return round(stage_left + later_left, 1)
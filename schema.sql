@@ -11,7 +11,14 @@ CREATE TABLE IF NOT EXISTS analyses (
     total_records INTEGER NOT NULL,
     total_distance_km REAL NOT NULL,
     average_quality_score REAL NOT NULL,
-    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    -- SHA-256 of the uploaded file and the analyzer version that produced
+    -- the result: identical re-uploads reuse the analysis
+    content_hash TEXT,
+    analyzer_version TEXT,
+    -- Where the raw telemetry rows are: 'sqlite' (telemetry_data, also
+    -- when NULL) or 'columnar' (the column files of telemetry_store)
+    telemetry_storage TEXT
 );
 
 -- Scorecard table: stores per-device quality metrics
@@ -106,6 +113,37 @@ CREATE TABLE IF NOT EXISTS telemetry_data (
     FOREIGN KEY (analysis_id) REFERENCES analyses(id) ON DELETE CASCADE
 );
 
+-- Telemetry row counts: materialized per analysis at save time so paging
+-- never runs COUNT(*). imei = '' holds the analysis total.
+CREATE TABLE IF NOT EXISTS telemetry_counts (
+    analysis_id TEXT NOT NULL,
+    imei TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    PRIMARY KEY (analysis_id, imei),
+    FOREIGN KEY (analysis_id) REFERENCES analyses(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- Replaced by idx_telemetry_analysis_position: the R*Tree was shared by
+-- every analysis and kept up per deleted row by a trigger
+DROP TRIGGER IF EXISTS telemetry_rtree_delete;
+DROP TABLE IF EXISTS telemetry_rtree;
+
+-- Map grid index: each device's first GPS fix, with its Web Mercator cell
+-- at level GRID_LEVEL (see geo.py), built at save time. Viewport queries
+-- range-scan the cells and cluster them by shifting to the map's zoom.
+CREATE TABLE IF NOT EXISTS device_positions (
+    analysis_id TEXT NOT NULL,
+    imei TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lng REAL NOT NULL,
+    time TEXT,
+    point_count INTEGER NOT NULL,
+    cell_x INTEGER NOT NULL,
+    cell_y INTEGER NOT NULL,
+    PRIMARY KEY (analysis_id, imei),
+    FOREIGN KEY (analysis_id) REFERENCES analyses(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
 -- Processing jobs table: for background processing
 CREATE TABLE IF NOT EXISTS processing_jobs (
     id TEXT PRIMARY KEY,
@@ -116,13 +154,50 @@ CREATE TABLE IF NOT EXISTS processing_jobs (
     error_message TEXT,
     created_at TEXT DEFAULT CURRENT_TIMESTAMP,
     completed_at TEXT,
+    -- Durable queue: the upload to process, claim attempts, and the lease
+    -- (owner and expiry as a Unix time) held while a worker processes it
+    file_path TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    -- Progress reported by the pipeline: stage, estimated seconds left,
+    -- and the stage counters as JSON
+    stage TEXT,
+    eta_seconds REAL,
+    progress_detail TEXT,
+    -- SHA-256 of the upload, stored with the resulting analysis
+    content_hash TEXT,
     FOREIGN KEY (analysis_id) REFERENCES analyses(id) ON DELETE SET NULL
 );
 
 -- Create indexes for common queries
 CREATE INDEX IF NOT EXISTS idx_scorecard_analysis ON scorecard(analysis_id);
-CREATE INDEX IF NOT EXISTS idx_scorecard_imei ON scorecard(imei);
-CREATE INDEX IF NOT EXISTS idx_telemetry_analysis ON telemetry_data(analysis_id);
+-- A device's scorecards across analyses, in period order: covers every
+-- column of DEVICE_HISTORY_COLUMNS (database.py), so the history is one index
+-- range scan. Replaces idx_scorecard_imei, which it also serves.
+DROP INDEX IF EXISTS idx_scorecard_imei;
+CREATE INDEX IF NOT EXISTS idx_scorecard_imei_history ON scorecard(
+    imei, primer_reporte, analysis_id, ultimo_reporte, puntaje_calidad, total_reportes,
+    odo_quality_score, canbus_completeness, gps_integrity, delay_avg, ignition_balance,
+    harsh_events, distancia_recorrida_km);
+-- Keyset pagination seeks on (analysis_id, [imei,] time, id); the first
+-- index also serves plain analysis_id lookups, replacing idx_telemetry_analysis
+DROP INDEX IF EXISTS idx_telemetry_analysis;
+CREATE INDEX IF NOT EXISTS idx_telemetry_analysis_time ON telemetry_data(analysis_id, time, id);
+CREATE INDEX IF NOT EXISTS idx_telemetry_analysis_imei_time ON telemetry_data(analysis_id, imei, time, id);
 CREATE INDEX IF NOT EXISTS idx_telemetry_imei ON telemetry_data(imei);
+-- Range queries: event types (few rows have one, hence partial),
+-- speed/RPM thresholds and bounding boxes; time ranges use the keyset
+-- indexes above
+CREATE INDEX IF NOT EXISTS idx_telemetry_analysis_event ON telemetry_data(analysis_id, event_type, time, id)
+    WHERE event_type IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_telemetry_analysis_speed ON telemetry_data(analysis_id, speed);
+CREATE INDEX IF NOT EXISTS idx_telemetry_analysis_rpm ON telemetry_data(analysis_id, engine_rpm);
+-- Bounding boxes: a latitude range scan within the analysis, with the
+-- longitude checked from the index entries
+CREATE INDEX IF NOT EXISTS idx_telemetry_analysis_position ON telemetry_data(analysis_id, lat, lng);
 CREATE INDEX IF NOT EXISTS idx_chart_data_analysis ON chart_data(analysis_id);
-CREATE INDEX IF NOT EXISTS idx_jobs_status ON processing_jobs(status);
+CREATE INDEX IF NOT EXISTS idx_device_positions_cell ON device_positions(analysis_id, cell_x, cell_y);
+DROP INDEX IF EXISTS idx_jobs_status;
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON processing_jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_analyses_content ON analyses(content_hash, analyzer_version);
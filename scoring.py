@@ -0,0 +1,540 @@
+"""Per-IMEI scorecard computation for telemetry analyses."""
+from typing import Any, Dict, Iterable, List, Tuple
+import numpy as np
+import pandas as pd
+from serialization import frame_to_records
+
+CANBUS_FIELDS = ['has_rpm', 'has_speed', 'has_temp', 'has_dist', 'has_fuel_total', 'has_fuel_level']
+
+SCORECARD_COLUMNS = [
+    'imei', 'Puntaje_Calidad', 'Total_Reportes', 'Delay_Avg', 'Odo_Quality_Score',
+    'Canbus_Completeness', 'GPS_Integrity', 'Ignition_Balance', 'Ignition_On',
+    'Ignition_Off', 'Harsh_Events', 'SOS_Count', 'Harsh_Breaking',
+    'Harsh_Acceleration', 'Harsh_Turn', 'RPM_Anormal_Count',
+    'Lat_Lng_Correct_Variation', 'Driver_ID', 'Frozen_Sensors', 'Radar_GPS',
+    'Radar_Ignition', 'Radar_Delay', 'Radar_RPM', 'Radar_Speed', 'Radar_Temp',
+    'Radar_Dist', 'Radar_Fuel'
+]
+
+STATS_COLUMNS = [
+    'Distancia_Recorrida_(KM)', 'KM_Inicial', 'KM_Final', 'Primer_Reporte',
+    'Ultimo_Reporte', 'Velocidad_Promedio_(KPH)', 'Velocidad_Maxima_(KPH)',
+    'RPM_Promedio', 'Nivel_Combustible_Promedio_%'
+]
+
+RADAR_FIELDS = ['gps_validity', 'ignition', 'delay', 'rpm', 'speed', 'temp', 'dist', 'fuel']
+
+
+# --- IGNITION QUALITY HELPER ---
+def calc_ignition_quality(group):
+    """Ignition radar score (0-100) from the balance of on/off events."""
+    ign_on = (group['event_type'] == 'Ignition On').sum()
+    ign_off = (group['event_type'] == 'Ignition Off').sum()
+    has_addon = group['has_ignition'].any()
+    if ign_on == 0 and ign_off == 0 and not has_addon:
+        return 0.0
+    if ign_on == 0 and ign_off == 0 and has_addon:
+        return 100.0
+    max_ign = max(ign_on, ign_off)
+    min_ign = min(ign_on, ign_off)
+    if abs(ign_on - ign_off) <= 1:
+        return 100.0
+    return (min_ign / max_ign) * 100 if max_ign > 0 else 0.0
+
+
+# --- ADVANCED METRICS PER IMEI ---
+def calculate_v2_metrics(group):
+    """Reference per-device scorecard, applied via df.groupby('imei').apply.
+
+    Kept as the specification for compute_fleet_metrics, which produces the
+    same metrics for all devices at once.
+    """
+    group = group.sort_values('time')
+    total = len(group)
+
+    # 1. Odometer Quality
+    # a) Decreasing
+    odo_diff = group['mileage'].diff()
+    odo_drops = (odo_diff < 0).sum()
+    # b) Frozen (Moving but mileage static)
+    # Using a simple threshold for movement: speed > 5 or lat/lng diff
+    dist_change = (group['lat'].diff().abs() > 0.0001) | (group['lng'].diff().abs() > 0.0001)
+    frozen_odo = (dist_change & (odo_diff == 0)).sum()
+    odo_score = max(0, 100 - (odo_drops + frozen_odo) / total * 100)
+
+    # 2. CAN Bus Completeness (6 specific fields)
+    canbus_score = group[CANBUS_FIELDS].mean().mean() * 100
+
+    # 3. Latency
+    avg_delay = group['delay_seconds'].mean()
+    # Points: 100 if < 30s, linear drop to 0 at 300s
+    delay_score = 100 if avg_delay <= 30 else max(0, 100 - (avg_delay - 30) * (100/270))
+
+    # 4. GPS Integrity
+    gps_score = (group['gps_ok'].sum() / total) * 100
+
+    # 5. Ignition Balance
+    ign_on = (group['event_type'] == 'Ignition On').sum()
+    ign_off = (group['event_type'] == 'Ignition Off').sum()
+    ign_balance = abs(ign_on - ign_off)
+    ign_score = 100 if ign_balance <= 1 else max(0, 100 - (ign_balance * 10))
+
+    # --- FORENSIC INTELLIGENCE (V2.1) ---
+    # 6. Frozen Sensor Penalties
+    # RPM Frozen: If Ign On and Moving, but RPM is 0 or static
+    moving = (group['speed'] > 5) & (group['ignitionOn'] == 1)
+    rpm_variability = group.loc[moving, 'engineRPM'].nunique() if moving.any() else 2
+    rpm_frozen_penalty = 15 if (moving.any() and (rpm_variability <= 1 or group.loc[moving, 'engineRPM'].mean() == 0)) else 0
+
+    # Temp/Speed Frozen: General check if changing over session
+    has_temp = group['engineCoolantTemperature'].notnull().any()
+    temp_variability = group['engineCoolantTemperature'].nunique() if has_temp else 2
+    temp_frozen_penalty = 10 if (has_temp and temp_variability <= 1 and total > 10) else 0
+
+    # Final Weighted Score (35% CAN, 25% ODO, 20% GPS, 10% Delay, 10% IGN)
+    final_score = (canbus_score * 0.35 + odo_score * 0.25 + gps_score * 0.20 + delay_score * 0.10 + ign_score * 0.10)
+
+    # Penalties application
+    final_score = max(0, final_score - rpm_frozen_penalty - temp_frozen_penalty)
+
+    # RPM Anormal penalty (Existing)
+    rpm_anormal_penalty = (group['engineRPM'] > 8000).sum() / total * 50
+    final_score = max(0, final_score - rpm_anormal_penalty)
+
+    # Event counts for Stats
+    harsh_breaking = (group['event_type'] == 'Harsh Breaking').sum()
+    harsh_accel = (group['event_type'] == 'Harsh Acceleration').sum()
+    harsh_turn = (group['event_type'] == 'Harsh Turn').sum()
+    sos = (group['event_type'] == 'SOS').sum()
+
+    driver_id = group['driverId'].dropna().iloc[0] if not group['driverId'].dropna().empty else "N/A"
+
+    return pd.Series({
+        'Puntaje_Calidad': round(final_score, 2),
+        'Total_Reportes': total,
+        'Delay_Avg': round(avg_delay, 2),
+        'Odo_Quality_Score': round(odo_score, 2),
+        'Canbus_Completeness': round(canbus_score, 2),
+        'GPS_Integrity': round(gps_score, 2),
+        'Ignition_Balance': ign_balance,
+        'Ignition_On': ign_on,
+        'Ignition_Off': ign_off,
+        'Harsh_Events': harsh_breaking + harsh_accel + harsh_turn,
+        'SOS_Count': sos,
+        'Harsh_Breaking': harsh_breaking,
+        'Harsh_Acceleration': harsh_accel,
+        'Harsh_Turn': harsh_turn,
+        'RPM_Anormal_Count': (group['engineRPM'] > 8000).sum(),
+        'Lat_Lng_Correct_Variation': "OK" if dist_change.sum() > 0 else "Static",
+        'Driver_ID': str(driver_id),
+        'Frozen_Sensors': (("RPM " if rpm_frozen_penalty > 0 else "") + ("Temp" if temp_frozen_penalty > 0 else "")).strip() or "None",
+        'Radar_GPS': round(gps_score, 2),
+        'Radar_Ignition': round(calc_ignition_quality(group), 2),
+        'Radar_Delay': round((group['delay_seconds'] < 60).mean() * 100, 2),
+        'Radar_RPM': round(group['has_rpm'].mean() * 100, 2),
+        'Radar_Speed': round(group['has_speed'].mean() * 100, 2),
+        'Radar_Temp': round(group['has_temp'].mean() * 100, 2),
+        'Radar_Dist': round(group['has_dist'].mean() * 100, 2),
+        'Radar_Fuel': round(group['has_fuel_total'].mean() * 100, 2)
+    })
+
+
+
+
+# --- MERGEABLE PER-IMEI STATE ---
+# Per-device sums that merge by addition: the row count, the row indicators
+# behind the scorecard and radar, and (sum, count) of each averaged field
+COUNT_FIELDS = [
+    'total', 'odo_drops', 'frozen_odo', 'dist_change', *CANBUS_FIELDS, 'gps_ok', 'delay_ok',
+    'has_ignition', 'ign_on', 'ign_off', 'harsh_breaking', 'harsh_accel', 'harsh_turn', 'sos',
+    'rpm_high', 'moving', 'temp_count'
+]
+MEAN_FIELDS = ['delay', 'moving_rpm', 'speed', 'rpm', 'fuel']
+SUM_FIELDS = COUNT_FIELDS + [f'{name}_{part}' for name in MEAN_FIELDS for part in ('sum', 'count')]
+
+# Per-device extremes and how they merge
+EXTREME_FIELDS = {
+    'first_report': 'min', 'last_report': 'max', 'km_start': 'min', 'km_end': 'max', 'speed_max': 'max'
+}
+
+# Fields whose distinct values are counted up to DISTINCT_LIMIT: the frozen
+# sensor penalties only ask whether a sensor ever reported two values, so a
+# count capped at two and one sample value merge exactly
+SKETCH_FIELDS = ['moving_rpm', 'temp']
+DISTINCT_LIMIT = 2
+
+# Values of each device's first and last row in time order, for the
+# odometer and position diffs across the boundary of two merged parts
+BOUNDARY_FIELDS = ['time', 'mileage', 'lat', 'lng']
+
+STATE_COLUMNS = (
+    ['imei'] + SUM_FIELDS + list(EXTREME_FIELDS) +
+    [f'{name}_{part}' for name in SKETCH_FIELDS for part in ('distinct', 'value')] + ['driver'] +
+    [f'{end}_{name}' for end in ('first', 'last') for name in BOUNDARY_FIELDS]
+)
+_INT_STATE_COLUMNS = frozenset(COUNT_FIELDS + [f'{name}_count' for name in MEAN_FIELDS])
+_TIME_STATE_COLUMNS = ['first_report', 'last_report', 'first_time', 'last_time']
+_TEXT_STATE_COLUMNS = ['imei', 'driver']
+
+
+def _block_starts(imei: np.ndarray) -> np.ndarray:
+    """Mark the first row of each run of equal IMEIs; missing IMEIs form one run."""
+    first_row = np.ones(len(imei), dtype=bool)
+    missing = pd.isna(imei)
+    first_row[1:] = (imei[1:] != imei[:-1]) & ~(missing[1:] & missing[:-1])
+    return first_row
+
+
+def _step_indicators(odo_diff, lat_diff, lng_diff):
+    """Odometer drop, frozen odometer and position change between consecutive rows.
+
+    A missing diff (first row, or a null value) counts as none of them.
+    """
+    dist_change = (np.abs(lat_diff) > 0.0001) | (np.abs(lng_diff) > 0.0001)
+    return odo_diff < 0, dist_change & (odo_diff == 0), dist_change
+
+
+def _mean(total: np.ndarray, count: np.ndarray) -> np.ndarray:
+    """Mean from a sum and a count; NaN where there were no values."""
+    mean = np.full(len(count), np.nan)
+    return np.divide(total.astype(np.float64), count, out=mean, where=count > 0)
+
+
+class PartialMetrics:
+    """Mergeable per-IMEI scoring state.
+
+    Holds, per device, what the scorecard is computed from: counts and
+    sums (see SUM_FIELDS), extremes, capped distinct-value sketches, the
+    first driver ID and the first and last rows' time, mileage and
+    position. States of separate parts of a dataset (chunks of rows, files,
+    or groups of devices) merge into the state of the whole, which
+    finalize() turns into the same scorecard compute_fleet_metrics returns.
+
+    The state is a DataFrame with STATE_COLUMNS, one row per IMEI in IMEI
+    order (rows without an IMEI last, as one row that only feeds the
+    fleet radar).
+    """
+
+    def __init__(self, state: pd.DataFrame):
+        self.state = state
+
+    def __len__(self) -> int:
+        return len(self.state)
+
+    @classmethod
+    def empty(cls) -> 'PartialMetrics':
+        state = pd.DataFrame({column: pd.Series(dtype=np.int64 if column in _INT_STATE_COLUMNS else object)
+                              for column in STATE_COLUMNS})
+        return cls(state)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'PartialMetrics':
+        """Build the state of a frame of telemetry rows (deduplicated, as scored).
+
+        Sorts once by (imei, time), derives every per-row indicator for the
+        whole frame and reduces them over a single grouping of the
+        contiguous device blocks. Rows with equal timestamps keep their input
+        order (stable sort).
+        """
+        d = df.sort_values(['imei', 'time'], kind='mergesort')
+        if d.empty:
+            return cls.empty()
+
+        imei = d['imei'].to_numpy()
+        first_row = _block_starts(imei)
+        codes = np.cumsum(first_row) - 1
+        starts = np.flatnonzero(first_row)
+        ends = np.append(starts[1:] - 1, len(d) - 1)
+
+        # Within-device diffs: a global diff with each device's first row blanked
+        odo_diff = d['mileage'].diff().mask(first_row)
+        odo_drops, frozen_odo, dist_change = _step_indicators(
+            odo_diff, d['lat'].diff().mask(first_row), d['lng'].diff().mask(first_row))
+        event = d['event_type']
+        moving = (d['speed'] > 5) & (d['ignitionOn'] == 1)
+        rpm = d['engineRPM']
+
+        indicators = {
+            'odo_drops': odo_drops,
+            'frozen_odo': frozen_odo,
+            'dist_change': dist_change,
+            **{field: d[field] for field in CANBUS_FIELDS},
+            'gps_ok': d['gps_ok'],
+            'delay_ok': d['delay_seconds'] < 60,
+            'has_ignition': d['has_ignition'],
+            'ign_on': event == 'Ignition On',
+            'ign_off': event == 'Ignition Off',
+            'harsh_breaking': event == 'Harsh Breaking',
+            'harsh_accel': event == 'Harsh Acceleration',
+            'harsh_turn': event == 'Harsh Turn',
+            'sos': event == 'SOS',
+            'rpm_high': rpm > 8000,
+            'moving': moving,
+        }
+        frame = pd.DataFrame({name: values.to_numpy(dtype=np.int64) for name, values in indicators.items()})
+        # Numeric inputs as float64: a column without values can be object
+        frame['delay'] = d['delay_seconds'].to_numpy(dtype=np.float64)
+        frame['moving_rpm'] = rpm.where(moving).to_numpy(dtype=np.float64)
+        frame['temp'] = d['engineCoolantTemperature'].to_numpy(dtype=np.float64)
+        frame['driverId'] = d['driverId'].to_numpy()
+        frame['time'] = d['time'].array
+        frame['mileage'] = d['mileage'].to_numpy(dtype=np.float64)
+        frame['speed'] = d['speed'].to_numpy(dtype=np.float64)
+        frame['rpm'] = rpm.to_numpy(dtype=np.float64)
+        frame['fuel'] = d['fuelLevelInput'].to_numpy(dtype=np.float64)
+
+        # The single grouping every reduction below shares
+        grouped = frame.groupby(codes, sort=False)
+        counts = grouped[list(indicators)].sum()
+        agg = grouped.agg(
+            temp_count=('temp', 'count'),
+            **{f'{name}_sum': (name, 'sum') for name in MEAN_FIELDS},
+            **{f'{name}_count': (name, 'count') for name in MEAN_FIELDS},
+            first_report=('time', 'min'),
+            last_report=('time', 'max'),
+            km_start=('mileage', 'min'),
+            km_end=('mileage', 'max'),
+            speed_max=('speed', 'max'),
+            **{f'{name}_distinct': (name, 'nunique') for name in SKETCH_FIELDS},
+            **{f'{name}_value': (name, 'first') for name in SKETCH_FIELDS},
+            driver=('driverId', 'first'),
+        )
+
+        state = {'imei': imei[starts], 'total': np.bincount(codes)}
+        for column in STATE_COLUMNS[2:]:
+            if column in counts.columns:
+                state[column] = counts[column].to_numpy()
+            elif column in agg.columns:
+                state[column] = agg[column].array
+        for name in SKETCH_FIELDS:
+            state[f'{name}_distinct'] = np.minimum(state[f'{name}_distinct'], DISTINCT_LIMIT)
+        for name in BOUNDARY_FIELDS:
+            values = d[name].array
+            state[f'first_{name}'] = values[starts]
+            state[f'last_{name}'] = values[ends]
+        return cls(pd.DataFrame(state, columns=STATE_COLUMNS))
+
+    @classmethod
+    def merge(cls, partials: Iterable['PartialMetrics']) -> 'PartialMetrics':
+        """Merge the states of consecutive parts of a dataset.
+
+        Parts are given in order: each device's rows in a part must all come
+        at or after (in time) its rows in the parts before, as when a
+        dataset is split by time or by device. Rows with equal timestamps
+        keep the part order, as a stable sort of the concatenated rows
+        would. The parts must not share rows, as they are not deduplicated.
+
+        Raises:
+            ValueError: If a device's rows in a part precede its rows in an
+                earlier part
+        """
+        states = [p.state for p in partials if len(p.state)]
+        if not states:
+            return cls.empty()
+        s = pd.concat(states, ignore_index=True)
+        s = s.sort_values('imei', kind='mergesort').reset_index(drop=True)
+
+        imei = s['imei'].to_numpy()
+        first_row = _block_starts(imei)
+        codes = np.cumsum(first_row) - 1
+        starts = np.flatnonzero(first_row)
+        ends = np.append(starts[1:] - 1, len(s) - 1)
+
+        # Each part continuing a device adds the diffs across its boundary
+        # with the previous part (rows without an IMEI get no diffs)
+        follows = ~first_row & ~pd.isna(imei)
+        previous = s[[f'last_{name}' for name in BOUNDARY_FIELDS]].shift()
+        first_time, last_time = s['first_time'], previous['last_time']
+        ordered = first_time.isna() | (last_time.notna() & (last_time <= first_time))
+        out_of_order = follows & ~ordered.to_numpy()
+        if out_of_order.any():
+            raise ValueError(f"{int(out_of_order.sum())} device parts are not in time order")
+        steps = _step_indicators(
+            (s['first_mileage'] - previous['last_mileage']).to_numpy(dtype=float),
+            (s['first_lat'] - previous['last_lat']).to_numpy(dtype=float),
+            (s['first_lng'] - previous['last_lng']).to_numpy(dtype=float))
+        for column, step in zip(('odo_drops', 'frozen_odo', 'dist_change'), steps):
+            s[column] = s[column].to_numpy() + (step & follows)
+
+        grouped = s.groupby(codes, sort=False)
+        agg = grouped.agg(
+            **{column: (column, 'sum') for column in SUM_FIELDS},
+            **{column: (column, how) for column, how in EXTREME_FIELDS.items()},
+            **{f'{name}_most': (f'{name}_distinct', 'max') for name in SKETCH_FIELDS},
+            **{f'{name}_values': (f'{name}_value', 'nunique') for name in SKETCH_FIELDS},
+            **{f'{name}_value': (f'{name}_value', 'first') for name in SKETCH_FIELDS},
+            driver=('driver', 'first'),
+        )
+
+        state = {'imei': imei[starts]}
+        for column in STATE_COLUMNS[1:]:
+            if column in agg.columns:
+                state[column] = agg[column].array
+        for name in SKETCH_FIELDS:
+            # Distinct values of the union: a part already at the limit, or
+            # the parts' sample values
+            state[f'{name}_distinct'] = np.where(
+                agg[f'{name}_most'].to_numpy() >= DISTINCT_LIMIT, DISTINCT_LIMIT,
+                np.minimum(agg[f'{name}_values'].to_numpy(), DISTINCT_LIMIT))
+        for name in BOUNDARY_FIELDS:
+            state[f'first_{name}'] = s[f'first_{name}'].array[starts]
+            state[f'last_{name}'] = s[f'last_{name}'].array[ends]
+        return cls(pd.DataFrame(state, columns=STATE_COLUMNS))
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Serialize the state as JSON-ready records, one per device."""
+        return frame_to_records(self.state)
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> 'PartialMetrics':
+        """Rebuild a state serialized by to_records."""
+        if not records:
+            return cls.empty()
+        state = pd.DataFrame.from_records(records, columns=STATE_COLUMNS)
+        for column in STATE_COLUMNS:
+            if column in _INT_STATE_COLUMNS:
+                state[column] = state[column].astype(np.int64)
+            elif column in _TIME_STATE_COLUMNS:
+                state[column] = pd.to_datetime(state[column], format='ISO8601', utc=True)
+            elif column not in _TEXT_STATE_COLUMNS:
+                state[column] = state[column].astype(float)
+        return cls(state)
+
+    def finalize(self) -> Tuple[pd.DataFrame, Dict[str, float]]:
+        """Compute the scorecard, per-device statistics and global radar.
+
+        Returns:
+            (scorecard, global_quality): one scorecard row per IMEI, sorted
+            by IMEI, with SCORECARD_COLUMNS followed by STATS_COLUMNS; and
+            the fleet-wide radar values
+        """
+        s = self.state
+        if s.empty:
+            return pd.DataFrame(columns=SCORECARD_COLUMNS + STATS_COLUMNS), {k: 0.0 for k in RADAR_FIELDS}
+
+        total = s['total'].to_numpy()
+        c = {name: s[name].to_numpy() for name in SUM_FIELDS}
+
+        # 1. Odometer Quality
+        odo_score = np.maximum(0, 100 - (c['odo_drops'] + c['frozen_odo']) / total * 100)
+
+        # 2. CAN Bus Completeness: mean of the six per-field completeness ratios
+        canbus_score = sum(c[field] / total for field in CANBUS_FIELDS) / len(CANBUS_FIELDS) * 100
+
+        # 3. Latency (NaN average scores 0, like max(0, nan) in the reference)
+        avg_delay = _mean(c['delay_sum'], c['delay_count'])
+        delay_score = np.where(avg_delay <= 30, 100, np.fmax(0, 100 - (avg_delay - 30) * (100/270)))
+
+        # 4. GPS Integrity
+        gps_score = (c['gps_ok'] / total) * 100
+
+        # 5. Ignition Balance
+        ign_on, ign_off = c['ign_on'], c['ign_off']
+        ign_balance = np.abs(ign_on - ign_off)
+        ign_score = np.where(ign_balance <= 1, 100, np.maximum(0, 100 - ign_balance * 10))
+
+        # 6. Frozen Sensor Penalties
+        moving_any = c['moving'] > 0
+        rpm_variability = np.where(moving_any, s['moving_rpm_distinct'].to_numpy(), 2)
+        rpm_mean_zero = _mean(c['moving_rpm_sum'], c['moving_rpm_count']) == 0
+        rpm_frozen_penalty = np.where(moving_any & ((rpm_variability <= 1) | rpm_mean_zero), 15, 0)
+
+        has_temp = c['temp_count'] > 0
+        temp_variability = np.where(has_temp, s['temp_distinct'].to_numpy(), 2)
+        temp_frozen_penalty = np.where(has_temp & (temp_variability <= 1) & (total > 10), 10, 0)
+
+        final_score = (canbus_score * 0.35 + odo_score * 0.25 + gps_score * 0.20 + delay_score * 0.10 + ign_score * 0.10)
+        final_score = np.fmax(0, final_score - rpm_frozen_penalty - temp_frozen_penalty)
+        rpm_anormal_penalty = c['rpm_high'] / total * 50
+        final_score = np.fmax(0, final_score - rpm_anormal_penalty)
+
+        # Ignition radar quality (see calc_ignition_quality)
+        no_ign_events = (ign_on == 0) & (ign_off == 0)
+        max_ign = np.maximum(ign_on, ign_off)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ign_ratio = np.where(max_ign > 0, np.minimum(ign_on, ign_off) / max_ign * 100, 0.0)
+        ignition_quality = np.where(
+            no_ign_events, np.where(c['has_ignition'] > 0, 100.0, 0.0),
+            np.where(ign_balance <= 1, 100.0, ign_ratio)
+        )
+
+        frozen_sensors = pd.Series(np.where(rpm_frozen_penalty > 0, 'RPM ', '')) + \
+            pd.Series(np.where(temp_frozen_penalty > 0, 'Temp', ''))
+        frozen_sensors = frozen_sensors.str.strip().replace('', 'None')
+
+        harsh_events = c['harsh_breaking'] + c['harsh_accel'] + c['harsh_turn']
+        driver = s['driver']
+        km_start = s['km_start'].to_numpy(dtype=float)
+        km_end = s['km_end'].to_numpy(dtype=float)
+
+        scorecard = pd.DataFrame({
+            'imei': s['imei'].to_numpy(),
+            'Puntaje_Calidad': np.round(final_score, 2),
+            'Total_Reportes': total,
+            'Delay_Avg': np.round(avg_delay, 2),
+            'Odo_Quality_Score': np.round(odo_score, 2),
+            'Canbus_Completeness': np.round(canbus_score, 2),
+            'GPS_Integrity': np.round(gps_score, 2),
+            'Ignition_Balance': ign_balance,
+            'Ignition_On': ign_on,
+            'Ignition_Off': ign_off,
+            'Harsh_Events': harsh_events,
+            'SOS_Count': c['sos'],
+            'Harsh_Breaking': c['harsh_breaking'],
+            'Harsh_Acceleration': c['harsh_accel'],
+            'Harsh_Turn': c['harsh_turn'],
+            'RPM_Anormal_Count': c['rpm_high'],
+            'Lat_Lng_Correct_Variation': np.where(c['dist_change'] > 0, 'OK', 'Static'),
+            'Driver_ID': driver.where(driver.notna(), 'N/A').astype(str).to_numpy(),
+            'Frozen_Sensors': frozen_sensors.to_numpy(),
+            'Radar_GPS': np.round(gps_score, 2),
+            'Radar_Ignition': np.round(ignition_quality, 2),
+            'Radar_Delay': np.round(c['delay_ok'] / total * 100, 2),
+            'Radar_RPM': np.round(c['has_rpm'] / total * 100, 2),
+            'Radar_Speed': np.round(c['has_speed'] / total * 100, 2),
+            'Radar_Temp': np.round(c['has_temp'] / total * 100, 2),
+            'Radar_Dist': np.round(c['has_dist'] / total * 100, 2),
+            'Radar_Fuel': np.round(c['has_fuel_total'] / total * 100, 2),
+            # --- STATISTICS ---
+            'Distancia_Recorrida_(KM)': np.clip(km_end - km_start, 0, None),
+            'KM_Inicial': km_start,
+            'KM_Final': km_end,
+            'Primer_Reporte': s['first_report'].array,
+            'Ultimo_Reporte': s['last_report'].array,
+            'Velocidad_Promedio_(KPH)': _mean(c['speed_sum'], c['speed_count']),
+            'Velocidad_Maxima_(KPH)': s['speed_max'].to_numpy(dtype=float),
+            'RPM_Promedio': _mean(c['rpm_sum'], c['rpm_count']),
+            'Nivel_Combustible_Promedio_%': _mean(c['fuel_sum'], c['fuel_count']),
+        })
+
+        has_imei = scorecard['imei'].notna().to_numpy()
+        scorecard = scorecard[has_imei].reset_index(drop=True)
+
+        # --- GLOBAL RADAR DATA ---
+        rows = total.sum()
+        global_quality = {
+            'gps_validity': c['gps_ok'].sum() / rows * 100,
+            'ignition': float(ignition_quality[has_imei].mean()) if has_imei.any() else 0.0,
+            'delay': c['delay_ok'].sum() / rows * 100,
+            'rpm': c['has_rpm'].sum() / rows * 100,
+            'speed': c['has_speed'].sum() / rows * 100,
+            'temp': c['has_temp'].sum() / rows * 100,
+            'dist': c['has_dist'].sum() / rows * 100,
+            'fuel': c['has_fuel_total'].sum() / rows * 100
+        }
+        return scorecard, {k: float(v) for k, v in global_quality.items()}
+
+
+def compute_fleet_metrics(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """Compute the scorecard, per-device statistics and global radar in one pass.
+
+    Vectorized equivalent of df.groupby('imei').apply(calculate_v2_metrics)
+    merged with the per-device statistics aggregation and the fleet radar:
+    the PartialMetrics of the whole frame, finalized.
+
+    Returns:
+        (scorecard, global_quality): one scorecard row per IMEI, sorted by
+        IMEI, with SCORECARD_COLUMNS followed by STATS_COLUMNS; and the
+        fleet-wide radar values
+    """
+    return PartialMetrics.from_frame(df).finalize()
@@ -0,0 +1,127 @@
+"""JSON serialization of analysis results and API responses.
+
+DataFrames become JSON-ready records column by column: NaN/Inf become
+None and timestamps become strings in one vectorized pass per column, with
+no recursive walk over the rows. Responses are encoded with orjson when it
+is installed, and with the standard library otherwise.
+"""
+import json
+import math
+import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # The standard library encoder is used instead
+    orjson = None
+
+# Types pandas infers for object columns that hold only native Python
+# values, which need no per-value conversion
+_NATIVE_TYPES = frozenset({'string', 'bytes', 'empty'})
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+
+def json_backend() -> str:
+    """Return the name of the JSON encoder in use ('orjson' or 'json')."""
+    return 'orjson' if orjson is not None else 'json'
+
+
+def _column_values(series: pd.Series) -> list:
+    """Return a column as a list of JSON-ready Python values."""
+    kind = series.dtype.kind
+    if kind == 'M':
+        return _datetime_strings(series)
+    if kind == 'f':
+        floats = series.to_numpy()
+        values = floats.astype(object)
+        values[~np.isfinite(floats)] = None
+        return values.tolist()
+    if kind in 'iub':
+        return series.tolist()
+
+    values = series.to_numpy(dtype=object, copy=True)
+    values[pd.isna(values)] = None
+    if pd.api.types.infer_dtype(values, skipna=True) in _NATIVE_TYPES:
+        return values.tolist()
+    return [_native(v) for v in values]
+
+
+def _datetime_strings(series: pd.Series) -> list:
+    """Format timestamps as str(Timestamp) does, e.g. '2024-01-15 08:00:00+00:00'.
+
+    Whole-second UTC or naive timestamps (what the pipeline produces) are
+    formatted by numpy; anything else goes through pandas.
+    """
+    tz = series.dt.tz
+    suffix = '' if tz is None else '+00:00' if str(tz) == 'UTC' else None
+    if suffix is not None:
+        stamps = (series.dt.tz_convert(None) if tz is not None else series).to_numpy()
+        missing = np.isnat(stamps)
+        present = stamps[~missing]
+        if (present.astype('datetime64[s]') == present).all():
+            text = np.datetime_as_string(stamps, unit='s').astype(object)
+            return [None if gone else t.replace('T', ' ') + suffix
+                    for t, gone in zip(text.tolist(), missing.tolist())]
+
+    values = series.astype(str).to_numpy(dtype=object)
+    values[series.isna().to_numpy()] = None
+    return values.tolist()
+
+
+def _native(value: Any) -> Any:
+    """Return a value of a mixed object column as a JSON-ready Python value."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert a DataFrame to a list of JSON-ready record dictionaries.
+
+    Each column is converted once (NaN, Inf and NaT to None, timestamps to
+    strings, numpy scalars to Python values) and the records are zipped
+    from the converted columns.
+
+    Args:
+        df: The frame to convert
+
+    Returns:
+        One dictionary per row, keyed by column name
+    """
+    names = list(df.columns)
+    columns = [_column_values(df[name]) for name in names]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def _default(obj: Any) -> Any:
+    """Encode the non-JSON types that can reach a response."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime.datetime, datetime.date, pd.Timestamp)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode an object as compact UTF-8 JSON.
+
+    With orjson, NaN and Inf are written as null; the standard library
+    writes them as NaN / Infinity, so sanitize payloads first.
+
+    Args:
+        obj: JSON-ready object (numpy scalars and timestamps are accepted)
+
+    Returns:
+        The JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default, separators=(',', ':')).encode('utf-8')
@@ -202,7 +202,7 @@
 
             const loaderText = app.elements.loader.querySelector('p');
             if (loaderText) {
-                loaderText.textContent = `${app.localization.t().processing} ${data.progress}%`;
+                loaderText.textContent = app.utils.formatJobProgress(data);
             }
 
             if (data.status === 'completed') {
@@ -266,7 +266,7 @@
 
                 const loaderText = app.elements.loader.querySelector('p');
                 if (loaderText) {
-                    loaderText.textContent = `${app.localization.t().processing} ${data.progress}%`;
+                    loaderText.textContent = app.utils.formatJobProgress(data);
                 }
 
                 if (data.status === 'completed') {
@@ -310,15 +310,53 @@
             app.state.rawPages = data.pages;
             app.state.rawTotal = data.total;
             app.tables.renderRaw(data.rows, data);
-            // Update map with telemetry points
-            if (data.rows && data.rows.length > 0) {
-                app.mapModule.render(data.rows);
-            }
         } catch (e) {
             console.error('Failed to load telemetry page', e);
         }
     };
 
+    /**
+     * Load the fleet view of the map: all devices, clustered for the
+     * viewport. With fit, the whole fleet is loaded and the map fitted
+     * to it (which loads the clusters of the fitted viewport).
+     */
+    app.api.loadFleetMap = async function(analysisId, fit) {
+        try {
+            const map = app.mapModule.ensureMap();
+            const params = new URLSearchParams({ zoom: map.getZoom() });
+            const bounds = map.getBounds();
+            if (!fit && bounds.getEast() - bounds.getWest() < 360) {
+                const wrap = lng => ((lng + 540) % 360) - 180;
+                params.set('bbox', [
+                    wrap(bounds.getWest()), Math.max(bounds.getSouth(), -90),
+                    wrap(bounds.getEast()), Math.min(bounds.getNorth(), 90)
+                ].join(','));
+            }
+            const res = await fetch(`/api/result/${analysisId}/map?${params}`);
+            if (!res.ok) throw new Error('Failed to load fleet map');
+            const data = await res.json();
+            // The selection may have changed while loading
+            if (app.state.selectedImei === 'all' && app.state.currentAnalysisId === analysisId) {
+                app.mapModule.renderFleet(data, fit);
+            }
+        } catch (e) {
+            console.error('Failed to load fleet map', e);
+        }
+    };
+
+    /**
+     * Load a device's full route, simplified server-side, into the map
+     */
+    app.api.loadRoute = async function(analysisId, imei) {
+        try {
+            const res = await fetch(`/api/result/${analysisId}/route/${encodeURIComponent(imei)}`);
+            if (!res.ok) throw new Error('Failed to load route');
+            app.mapModule.renderRoute(await res.json());
+        } catch (e) {
+            console.error('Failed to load route', e);
+        }
+    };
+
     /**
      * Load a saved result by ID
      */
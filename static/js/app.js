@@ -187,9 +187,12 @@ window.GPSAnalyzer = window.GPSAnalyzer || {};
                 app.state.rawPerPage,
                 app.state.selectedImei
             );
+            if (app.state.selectedImei === 'all') {
+                app.api.loadFleetMap(app.state.currentAnalysisId, true);
+            } else {
+                app.api.loadRoute(app.state.currentAnalysisId, app.state.selectedImei);
+            }
         }
-
-        // Map is rendered by loadTelemetryPage after data arrives
     };
 
     // Initialize when DOM is ready
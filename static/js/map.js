@@ -8,113 +8,146 @@
     app.mapModule = app.mapModule || {};
 
     /**
-     * Render map with telemetry points
+     * Create the map on first use
      */
-    app.mapModule.render = function(rows) {
-        // Initialize map if needed
+    app.mapModule.ensureMap = function() {
         if (!app.map.instance) {
             app.map.instance = L.map('map-container').setView([0, 0], 2);
             const isLight = document.documentElement.getAttribute('data-theme') === 'light';
             app.theme.updateMap(isLight ? 'light' : 'dark');
+
+            // Fleet view: reload the clusters of the new viewport
+            app.map.instance.on('moveend', () => {
+                if (app.state.selectedImei === 'all' && app.state.currentAnalysisId) {
+                    app.api.loadFleetMap(app.state.currentAnalysisId, false);
+                }
+            });
         }
+        return app.map.instance;
+    };
+
+    /**
+     * Create the map if needed and clear the previous layers
+     */
+    function resetMap() {
+        app.mapModule.ensureMap();
 
         // Clear previous layers
         if (app.map.polyline) app.map.instance.removeLayer(app.map.polyline);
+        app.map.polyline = null;
         app.map.markers.forEach(m => app.map.instance.removeLayer(m));
         app.map.markers = [];
+    }
 
-        // Valid GPS points only
-        const points = rows.filter(r => r.lat && r.lng && r.lat !== 0 && r.lng !== 0);
-
-        if (points.length === 0) return;
-
-        // Auto fitting bounds
-        const latlngs = points.map(p => [p.lat, p.lng]);
-        const bounds = L.latLngBounds(latlngs);
-
-        if (app.state.selectedImei === 'all') {
-            // Show start position of each unique IMEI
-            const uniqueImeis = [...new Set(points.map(p => p.imei))];
-
-            uniqueImeis.forEach(imei => {
-                const firstPoint = points.find(p => p.imei === imei);
-                if (firstPoint) {
-                    const marker = L.circleMarker([firstPoint.lat, firstPoint.lng], {
-                        radius: 5, color: '#3b82f6', fillOpacity: 0.8
-                    }).bindPopup(`<b>${imei}</b><br>${firstPoint.time}`);
-                    marker.addTo(app.map.instance);
-                    app.map.markers.push(marker);
-                }
-            });
-            app.map.instance.fitBounds(bounds, { padding: [50, 50] });
-
-        } else {
-            // Single IMEI - Draw Path
-            app.map.polyline = L.polyline(latlngs, { color: '#10b981', weight: 4 }).addTo(app.map.instance);
-
-            // Add Start/End markers
-            const start = points[0];
-            const end = points[points.length - 1];
-
-            if (start) app.map.markers.push(L.marker([start.lat, start.lng]).addTo(app.map.instance).bindPopup("Start"));
-            if (end) app.map.markers.push(L.marker([end.lat, end.lng]).addTo(app.map.instance).bindPopup("End"));
-
-            // Add Event Markers
-            const eventPoints = points.filter(p => p.event_type && p.event_type !== 'null' && p.event_type !== null);
-
-            eventPoints.forEach(point => {
-                let color = '#94a3b8';
-                let icon = '📍';
-
-                switch (point.event_type) {
-                    case 'Ignition On':
-                        color = '#10b981';
-                        icon = '🟢';
-                        break;
-                    case 'Ignition Off':
-                        color = '#ef4444';
-                        icon = '🔴';
-                        break;
-                    case 'Harsh Breaking':
-                    case 'Harsh Acceleration':
-                    case 'Harsh Turn':
-                        color = '#f59e0b';
-                        icon = '⚠️';
-                        break;
-                    case 'SOS':
-                        color = '#dc2626';
-                        icon = '🆘';
-                        break;
-                }
-
-                const eventMarker = L.circleMarker([point.lat, point.lng], {
-                    radius: 6,
-                    color: color,
-                    fillColor: color,
-                    fillOpacity: 0.8,
-                    weight: 2
-                }).bindPopup(`
-                    <b>${icon} ${point.event_type}</b><br>
-                    Time: ${point.time}<br>
-                    Speed: ${point.speed || 'N/A'} km/h
-                `);
-
-                eventMarker.addTo(app.map.instance);
-                app.map.markers.push(eventMarker);
-            });
-
-            app.map.instance.fitBounds(bounds, { padding: [50, 50] });
-        }
+    /**
+     * Fit the map to the bounds, again once the container has its size
+     */
+    function fitMap(bounds) {
+        app.map.instance.fitBounds(bounds, { padding: [50, 50] });
 
         // Invalidate size and refit bounds
         setTimeout(() => {
             if (app.map.instance) {
                 app.map.instance.invalidateSize();
-                if (points.length > 0) {
-                    app.map.instance.fitBounds(bounds, { padding: [50, 50] });
-                }
+                app.map.instance.fitBounds(bounds, { padding: [50, 50] });
             }
         }, 300);
+    }
+
+    /**
+     * Marker color and icon of an event type
+     */
+    function eventStyle(eventType) {
+        switch (eventType) {
+            case 'Ignition On':
+                return { color: '#10b981', icon: '🟢' };
+            case 'Ignition Off':
+                return { color: '#ef4444', icon: '🔴' };
+            case 'Harsh Breaking':
+            case 'Harsh Acceleration':
+            case 'Harsh Turn':
+                return { color: '#f59e0b', icon: '⚠️' };
+            case 'SOS':
+                return { color: '#dc2626', icon: '🆘' };
+            default:
+                return { color: '#94a3b8', icon: '📍' };
+        }
+    }
+
+    /**
+     * Render the fleet view: every device's first position, clustered
+     * server-side for the viewport (GeoJSON from the map endpoint)
+     */
+    app.mapModule.renderFleet = function(collection, fit) {
+        resetMap();
+
+        collection.features.forEach(feature => {
+            const [lng, lat] = feature.geometry.coordinates;
+            const props = feature.properties;
+            let marker;
+
+            if (props.devices === 1) {
+                marker = L.circleMarker([lat, lng], {
+                    radius: 5, color: '#3b82f6', fillOpacity: 0.8
+                }).bindPopup(`<b>${props.imei}</b><br>${props.time}`);
+            } else {
+                // Cluster: zoom in on click
+                marker = L.marker([lat, lng], {
+                    icon: L.divIcon({
+                        className: 'map-cluster',
+                        html: `<span>${props.devices.toLocaleString()}</span>`,
+                        iconSize: [36, 36]
+                    })
+                }).on('click', () => app.map.instance.setView([lat, lng], app.map.instance.getZoom() + 2));
+            }
+            marker.addTo(app.map.instance);
+            app.map.markers.push(marker);
+        });
+
+        // bbox is [west, south, east, north] of the whole fleet
+        if (fit && collection.bbox) {
+            const [west, south, east, north] = collection.bbox;
+            fitMap(L.latLngBounds([south, west], [north, east]));
+        }
+    };
+
+    /**
+     * Render a device's full route, as simplified by the route endpoint
+     */
+    app.mapModule.renderRoute = function(route) {
+        resetMap();
+
+        if (!route.points || route.points.length === 0) return;
+
+        // Single IMEI - Draw Path
+        app.map.polyline = L.polyline(route.points, { color: '#10b981', weight: 4 }).addTo(app.map.instance);
+
+        // Add Start/End markers
+        const { start, end } = route;
+        if (start) app.map.markers.push(L.marker([start.lat, start.lng]).addTo(app.map.instance).bindPopup("Start"));
+        if (end) app.map.markers.push(L.marker([end.lat, end.lng]).addTo(app.map.instance).bindPopup("End"));
+
+        // Add Event Markers
+        route.events.forEach(point => {
+            const { color, icon } = eventStyle(point.event_type);
+
+            const eventMarker = L.circleMarker([point.lat, point.lng], {
+                radius: 6,
+                color: color,
+                fillColor: color,
+                fillOpacity: 0.8,
+                weight: 2
+            }).bindPopup(`
+                <b>${icon} ${point.event_type}</b><br>
+                Time: ${point.time}<br>
+                Speed: ${point.speed || 'N/A'} km/h
+            `);
+
+            eventMarker.addTo(app.map.instance);
+            app.map.markers.push(eventMarker);
+        });
+
+        fitMap(app.map.polyline.getBounds());
     };
 
 })(window.GPSAnalyzer);
@@ -307,51 +307,16 @@
     /**
      * Export data as CSV
      */
-    app.tables.exportCSV = async function() {
+    app.tables.exportCSV = function() {
         if (!app.state.currentAnalysisId) return;
 
+        // The server streams the whole export as one download
         const imei = app.state.selectedImei;
-        const perPage = 500;
-        let page = 1;
-        let allRows = [];
-        let totalPages = 1;
-
-        // Fetch all pages
-        try {
-            while (page <= totalPages) {
-                const params = new URLSearchParams({ page, per_page: perPage });
-                if (imei && imei !== 'all') params.set('imei', imei);
-                const res = await fetch(`/api/result/${app.state.currentAnalysisId}/telemetry?${params}`);
-                if (!res.ok) throw new Error('Export failed');
-                const data = await res.json();
-                allRows = allRows.concat(data.rows);
-                totalPages = data.pages;
-                page++;
-            }
-        } catch (e) {
-            alert("Error exporting data: " + e.message);
-            return;
-        }
-
-        if (allRows.length === 0) {
-            alert("No data to export");
-            return;
-        }
+        const params = new URLSearchParams({ format: 'csv' });
+        if (imei && imei !== 'all') params.set('imei', imei);
 
-        const headers = Object.keys(allRows[0]);
-        const csvContent = [
-            headers.join(','),
-            ...allRows.map(row => headers.map(fieldName => {
-                let cell = row[fieldName] === null ? '' : row[fieldName];
-                return JSON.stringify(cell);
-            }).join(','))
-        ].join('\n');
-
-        const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
-        const url = URL.createObjectURL(blob);
         const link = document.createElement("a");
-        link.setAttribute("href", url);
-        link.setAttribute("download", `export_${imei}_${new Date().toISOString()}.csv`);
+        link.setAttribute("href", `/api/result/${app.state.currentAnalysisId}/export?${params}`);
         link.style.visibility = 'hidden';
         document.body.appendChild(link);
         link.click();
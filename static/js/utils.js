@@ -18,6 +18,22 @@
         }
     };
 
+    /**
+     * Loader text for a job status: progress, and the ETA when known
+     */
+    app.utils.formatJobProgress = function(data) {
+        const t = app.localization.t();
+        let text = `${t.processing} ${data.progress}%`;
+        if (data.eta_seconds != null) {
+            const seconds = Math.max(1, Math.round(data.eta_seconds));
+            const eta = seconds >= 60
+                ? `${Math.floor(seconds / 60)}m ${seconds % 60}s`
+                : `${seconds}s`;
+            text += ` (~${eta} ${t.time_left})`;
+        }
+        return text;
+    };
+
     /**
      * Show skeleton loaders
      */
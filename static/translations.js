@@ -6,6 +6,7 @@ const translations = {
         "ready_title": "Ready to Analyze",
         "ready_desc": "Upload a JSON log file to generate insights and quality metrics.",
         "processing": "Processing Data...",
+        "time_left": "left",
         "report_title": "Analysis Report",
         "filter_label": "Filter by Device (IMEI):",
         "all_devices": "All Devices",
@@ -53,6 +54,7 @@ const translations = {
         "ready_title": "Listo para Analizar",
         "ready_desc": "Sube un archivo de logs JSON para generar métricas de calidad.",
         "processing": "Procesando Datos...",
+        "time_left": "restante",
         "report_title": "Reporte de Análisis",
         "filter_label": "Filtrar por Dispositivo (IMEI):",
         "all_devices": "Todos los Dispositivos",
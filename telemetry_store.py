@@ -0,0 +1,358 @@
+"""Columnar on-disk store for the raw telemetry rows of analyses.
+
+Each analysis is a directory of numpy (.npy) files, one per column, read
+back memory-mapped so a page only touches the rows it returns:
+
+- Rows are grouped by IMEI, each IMEI's rows forming one contiguous chunk
+  sorted by (time, id), and order.npy lists the row positions in
+  analysis-wide (time, id) order.
+- Text columns are dictionary-encoded: <column>.npy holds int32 codes
+  into the sorted UTF-8 values of <column>.values.npy, -1 for NULL. Since
+  the values are sorted, comparing time codes compares the times.
+- Numeric columns are float64 (NaN for NULL) and flags are int8 (-1 for
+  NULL).
+
+A row's id is its position in the saved result; it plays the part of the
+telemetry_data id in ordering and in page cursors. Values are normalized
+the way SQLite column affinity would store them, so rows read back equal
+to those of the telemetry_data table.
+
+Range queries (see StoredTelemetry.select) bisect the time-sorted view for
+a time range and evaluate the other conditions as vectorized masks over
+the rows left, reading only the columns they test.
+"""
+import os
+import json
+import shutil
+import bisect
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Bumped when the on-disk layout changes
+FORMAT_VERSION = 1
+
+# Column kinds
+TEXT = 'text'
+REAL = 'real'
+FLAG = 'flag'
+
+MANIFEST_FILE = 'manifest.json'
+
+# Analyses kept open (with their memory maps) between reads; the files of
+# an analysis never change once written
+OPEN_ANALYSES = 32
+
+
+class ColumnarTelemetryStore:
+    """Telemetry rows of each analysis as memory-mapped column files."""
+
+    def __init__(self, root: str, columns: Sequence[Tuple[str, str, str]]):
+        """Initialize the store.
+
+        Args:
+            root: Directory holding one subdirectory per analysis
+            columns: (column, result key, kind) triples in row tuple order;
+                kind is TEXT, REAL or FLAG, and an 'imei' and a 'time' TEXT
+                column are required
+        """
+        self.root = root
+        self.columns = list(columns)
+        self._open: 'OrderedDict[str, StoredTelemetry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, analysis_id: str) -> str:
+        return os.path.join(self.root, analysis_id)
+
+    def exists(self, analysis_id: str) -> bool:
+        """Return True if the analysis has stored telemetry."""
+        return os.path.exists(os.path.join(self._path(analysis_id), MANIFEST_FILE))
+
+    def write(self, analysis_id: str, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Store the telemetry rows of an analysis.
+
+        The files are written to a temporary directory that is renamed
+        into place, so readers never see a partial analysis.
+
+        Args:
+            analysis_id: The analysis identifier
+            rows: Result row dictionaries (raw_data_sample), in id order
+
+        Returns:
+            Row count per non-empty IMEI
+        """
+        columns = {column: _encode(kind, [row.get(key) for row in rows])
+                   for column, key, kind in self.columns}
+        count = len(rows)
+        ids = np.arange(count, dtype=np.int64)
+
+        # Group by IMEI (NULL first), each chunk in (time, id) order
+        imei_codes = columns['imei'][0]
+        time_codes = columns['time'][0]
+        layout = np.lexsort((ids, time_codes, imei_codes))
+        order = np.lexsort((ids[layout], time_codes[layout]))
+
+        os.makedirs(self.root, exist_ok=True)
+        staging = os.path.join(self.root, f'.{analysis_id}.{uuid.uuid4().hex}')
+        os.makedirs(staging)
+        try:
+            np.save(os.path.join(staging, 'id.npy'), ids[layout])
+            np.save(os.path.join(staging, 'order.npy'), order.astype(np.int64))
+            for column, (data, values) in columns.items():
+                np.save(os.path.join(staging, f'{column}.npy'), data[layout])
+                if values is not None:
+                    np.save(os.path.join(staging, f'{column}.values.npy'), values)
+            with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+                json.dump({'format': FORMAT_VERSION, 'rows': count}, f)
+            os.replace(staging, self._path(analysis_id))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        imeis = columns['imei'][1]
+        counts = np.bincount(imei_codes[imei_codes >= 0], minlength=len(imeis))
+        return {imei.decode('utf-8'): int(n) for imei, n in zip(imeis, counts) if imei and n}
+
+    def delete(self, analysis_id: str) -> None:
+        """Remove the telemetry of an analysis, if stored."""
+        with self._lock:
+            self._open.pop(analysis_id, None)
+        shutil.rmtree(self._path(analysis_id), ignore_errors=True)
+
+    def open(self, analysis_id: str) -> 'StoredTelemetry':
+        """Open the stored telemetry of an analysis for reading.
+
+        The most recently read analyses are kept open, so repeated reads
+        skip loading the column files.
+
+        Raises:
+            FileNotFoundError: If the analysis has no stored telemetry
+        """
+        with self._lock:
+            stored = self._open.get(analysis_id)
+            if stored is not None:
+                self._open.move_to_end(analysis_id)
+                return stored
+
+        path = self._path(analysis_id)
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported telemetry store format in {path}")
+        stored = StoredTelemetry(path, self.columns)
+        with self._lock:
+            self._open[analysis_id] = stored
+            while len(self._open) > OPEN_ANALYSES:
+                self._open.popitem(last=False)
+        return stored
+
+
+def _encode(kind: str, values: list) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Encode a column's values as (data, dictionary values or None)."""
+    if kind == FLAG:
+        return np.array([-1 if v is None else 1 if v else 0 for v in values], dtype=np.int8), None
+    if kind == REAL:
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float64), None
+
+    # TEXT affinity stores numbers as their text
+    series = pd.Series([_text(v) for v in values], dtype=object)
+    codes, uniques = pd.factorize(series, sort=True, use_na_sentinel=True)
+    encoded = np.array([u.encode('utf-8') for u in uniques], dtype=bytes)
+    return codes.astype(np.int32), encoded
+
+
+def _text(value: Any) -> Optional[str]:
+    """A value as SQLite TEXT affinity stores it."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
+
+class _SortKeys:
+    """(time code, id) sort keys of a row view, for bisect."""
+
+    def __init__(self, view, time_codes: np.ndarray, ids: np.ndarray):
+        self.view = view
+        self.time_codes = time_codes
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, k):
+        p = self.view[k]
+        return int(self.time_codes[p]), int(self.ids[p])
+
+
+class StoredTelemetry:
+    """Memory-mapped telemetry of one analysis."""
+
+    def __init__(self, path: str, columns: Sequence[Tuple[str, str, str]]):
+        self.path = path
+        self.columns = list(columns)
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def _array(self, name: str) -> np.ndarray:
+        array = self._arrays.get(name)
+        if array is None:
+            array = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+            self._arrays[name] = array
+        return array
+
+    def _view(self, imei: Optional[str], filters: Optional[Dict[str, Any]] = None):
+        """Row positions of the analysis (or one IMEI) in (time, id) order."""
+        if filters:
+            return self.select(imei, filters)
+        if not imei:
+            return self._array('order')
+        imeis = self._array('imei.values')
+        key = imei.encode('utf-8')
+        code = int(np.searchsorted(imeis, key))
+        if code == len(imeis) or imeis[code] != key:
+            return range(0)
+        codes = self._array('imei')
+        start = int(np.searchsorted(codes, code, 'left'))
+        return range(start, int(np.searchsorted(codes, code, 'right')))
+
+    def select(self, imei: Optional[str], filters: Dict[str, Any]) -> np.ndarray:
+        """Row positions matching range-query filters, in (time, id) order.
+
+        Args:
+            imei: Optional IMEI filter
+            filters: Conditions as documented in Database.get_telemetry_page:
+                'start'/'end' times, 'bbox' (west, south, east, north) on
+                the lat/lng columns, 'event_types' and numeric 'ranges'
+                {column: (low, high)}, None for an open bound
+        """
+        view = self._view(imei)
+        start, end = filters.get('start'), filters.get('end')
+        if start is not None or end is not None:
+            time_codes = self._array('time')
+            # Timed rows follow the NULL-time ones (code -1), sorted by code
+            low = 0 if start is None else self._time_code(start)
+            first = bisect.bisect_left(view, low, key=lambda p: time_codes[p])
+            last = len(view) if end is None else \
+                bisect.bisect_right(view, self._time_code(end), key=lambda p: time_codes[p])
+            view = view[first:max(first, last)]
+        positions = np.asarray(view, dtype=np.int64)
+
+        mask = None
+
+        def narrow(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        event_types = filters.get('event_types')
+        if event_types is not None:
+            values = self._array('event_type.values')
+            keys = [t.encode('utf-8') for t in event_types]
+            codes = [c for c, key in zip(np.searchsorted(values, keys).tolist(), keys)
+                     if c < len(values) and values[c] == key]
+            narrow(np.isin(self._array('event_type')[positions], codes))
+        for column, (low, high) in (filters.get('ranges') or {}).items():
+            data = self._array(column)[positions]
+            if low is not None:
+                narrow(data >= low)
+            if high is not None:
+                narrow(data <= high)
+        bbox = filters.get('bbox')
+        if bbox is not None:
+            west, south, east, north = bbox
+            lat = self._array('lat')[positions]
+            lng = self._array('lng')[positions]
+            narrow((lat >= south) & (lat <= north))
+            # A box crossing the antimeridian wraps around
+            narrow((lng >= west) & (lng <= east) if west <= east else (lng >= west) | (lng <= east))
+
+        return positions if mask is None else positions[mask]
+
+    def count(self, imei: Optional[str] = None, filters: Optional[Dict[str, Any]] = None) -> int:
+        """Return the number of rows of the analysis, or of one IMEI."""
+        return len(self._view(imei, filters))
+
+    def slice(self, imei: Optional[str], offset: int, limit: int,
+              filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return rows [offset, offset + limit) in (time, id) order."""
+        view = self._view(imei, filters)
+        return self._rows(np.asarray(view[offset:offset + limit], dtype=np.int64))
+
+    def seek(self, imei: Optional[str], position: Optional[Tuple[str, Optional[str], int]],
+             limit: int, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return up to `limit` rows next to a cursor position, in (time, id) order.
+
+        Args:
+            imei: Optional IMEI filter
+            position: Decoded cursor (direction, time, id), None for the start
+            limit: Rows to return at most
+            filters: Optional range-query filters (see select)
+        """
+        view = self._view(imei, filters)
+        if position is None:
+            return self._rows(np.asarray(view[:limit], dtype=np.int64))
+
+        direction, time, row_id = position
+        keys = _SortKeys(view, self._array('time'), self._array('id'))
+        target = (self._time_code(time), row_id)
+        if direction == 'n':
+            start = bisect.bisect_right(keys, target)
+            selected = view[start:start + limit]
+        else:
+            end = bisect.bisect_left(keys, target)
+            selected = view[max(0, end - limit):end]
+        return self._rows(np.asarray(selected, dtype=np.int64))
+
+    def _time_code(self, time: Optional[str]) -> float:
+        """Sort position of a time among the stored ones (between two codes if absent)."""
+        if time is None:
+            return -1
+        times = self._array('time.values')
+        key = time.encode('utf-8')
+        code = int(np.searchsorted(times, key))
+        if code < len(times) and times[code] == key:
+            return code
+        return code - 0.5
+
+    def _column_values(self, column: str, kind: str, positions: np.ndarray) -> list:
+        data = self._array(column)[positions]
+        if kind == FLAG:
+            values = data.astype(object)
+            values[data < 0] = None
+            return values.tolist()
+        if kind == REAL:
+            values = data.astype(object)
+            values[np.isnan(data)] = None
+            return values.tolist()
+        dictionary = self._array(f'{column}.values')
+        return [dictionary[c].decode('utf-8') if c >= 0 else None for c in data.tolist()]
+
+    def _rows(self, positions: np.ndarray) -> List[Dict[str, Any]]:
+        """Rows at file positions, as dictionaries keyed by column (plus id)."""
+        names = ['id'] + [column for column, _, _ in self.columns]
+        values = [self._array('id')[positions].tolist()]
+        values.extend(self._column_values(column, kind, positions)
+                      for column, _, kind in self.columns)
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def column_lists(self, imei: Optional[str], columns: Sequence[str]) -> Dict[str, list]:
+        """Return whole columns of the analysis (or one IMEI) in (time, id) order."""
+        kinds = {column: kind for column, _, kind in self.columns}
+        positions = np.asarray(self._view(imei), dtype=np.int64)
+        return {column: self._column_values(column, kinds[column], positions) for column in columns}
+
+    def iter_tuples(self, imei: Optional[str] = None, batch_size: int = 5000) -> Iterator[List[tuple]]:
+        """Stream rows in (time, id) order as tuples in column order.
+
+        Yields:
+            Lists of up to `batch_size` row tuples (flags as 0/1, or None)
+        """
+        view = self._view(imei)
+        for start in range(0, len(view), batch_size):
+            positions = np.asarray(view[start:start + batch_size], dtype=np.int64)
+            yield list(zip(*(self._column_values(column, kind, positions)
+                             for column, _, kind in self.columns)))
@@ -0,0 +1,447 @@
+"""Tests for the SQLite storage layer."""
+import pytest
+import sqlite3
+import threading
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from database import (
+    Database, bulk_load_pragmas, _insert_many, _filter_conditions,
+    TELEMETRY_COLUMN_MAP, DEVICE_HISTORY_COLUMNS, SQLITE_STORAGE, COLUMNAR_STORAGE
+)
+from app import process_log_data
+
+# Analysis 'a1' with (total_devices, total_records) parameters
+_ANALYSIS_ROW = '''
+    INSERT INTO analyses (id, filename, original_filename, processed_at, total_devices,
+        total_records, total_distance_km, average_quality_score)
+    VALUES ('a1', 'f', 'f', 'now', ?, ?, 0, 0)
+'''
+
+@pytest.fixture
+def db(tmp_path):
+    """Empty database in a temporary directory."""
+    return Database(str(tmp_path / 'test.db'))
+
+
+@pytest.fixture
+def analysis(sample_telemetry):
+    """A processed analysis result for the sample fixture."""
+    return process_log_data(sample_telemetry, 'test.json')
+
+
+class TestSaveAnalysis:
+    """Test cases for the bulk save path."""
+
+    def test_round_trip(self, db, analysis):
+        """Saved scorecard and telemetry should read back unchanged."""
+        db.save_analysis('a1', analysis)
+        stored = db.get_analysis('a1')
+        assert stored['summary'] == analysis['summary']
+        assert [r['imei'] for r in stored['scorecard']] == [r['imei'] for r in analysis['scorecard']]
+        assert stored['scorecard'][0]['Puntaje_Calidad'] == analysis['scorecard'][0]['Puntaje_Calidad']
+
+        page = db.get_telemetry_page('a1', per_page=1000)
+        assert page['total'] == len(analysis['raw_data_sample'])
+
+    def test_flags_stored_as_integers(self, db):
+        """isMoving and ignitionOn should be stored as 0/1, or NULL when absent."""
+        rows = [
+            {'imei': '1', 'time': '2024-01-01', 'isMoving': True, 'ignitionOn': None},
+            {'imei': '1', 'time': '2024-01-02', 'isMoving': False, 'ignitionOn': 1},
+            {'imei': '1', 'time': '2024-01-03', 'ignitionOn': False},
+        ]
+        with db.get_connection() as conn:
+            conn.execute(_ANALYSIS_ROW, (1, 2))
+            assert _insert_many(conn, 'telemetry_data', TELEMETRY_COLUMN_MAP, 'a1', rows, batch_size=1) == 3
+            stored = conn.execute(
+                'SELECT is_moving, ignition_on FROM telemetry_data ORDER BY time'
+            ).fetchall()
+        assert [tuple(r) for r in stored] == [(1, None), (0, 1), (None, 0)]
+
+    def test_failed_save_leaves_no_rows(self, db, analysis):
+        """A failure mid-import should roll back every table."""
+        analysis['raw_data_sample'].append({'imei': object()})
+        with pytest.raises(sqlite3.Error):
+            db.save_analysis('a1', analysis)
+        assert not db.analysis_exists('a1')
+        with db.get_connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM scorecard').fetchone()[0] == 0
+            assert conn.execute('SELECT COUNT(*) FROM telemetry_data').fetchone()[0] == 0
+
+
+class TestBulkLoadPragmas:
+    """The import pragmas must not leak past the import."""
+
+    def test_restores_settings(self, tmp_path):
+        conn = sqlite3.connect(str(tmp_path / 'p.db'))
+        before = [conn.execute(f'PRAGMA {p}').fetchone()[0]
+                  for p in ('synchronous', 'cache_size', 'temp_store')]
+        with bulk_load_pragmas(conn):
+            assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1
+            conn.execute('CREATE TABLE t (x)')
+        after = [conn.execute(f'PRAGMA {p}').fetchone()[0]
+                 for p in ('synchronous', 'cache_size', 'temp_store')]
+        assert after == before
+        conn.close()
+
+
+def _seed_telemetry(db, times):
+    """Insert one telemetry row per time (alternating IMEIs) into analysis 'a1'."""
+    rows = [{'imei': ('A', 'B')[i % 2], 'time': t, 'speed': float(i)} for i, t in enumerate(times)]
+    with db.get_connection() as conn:
+        conn.execute(_ANALYSIS_ROW, (2, len(rows)))
+        _insert_many(conn, 'telemetry_data', TELEMETRY_COLUMN_MAP, 'a1', rows)
+
+
+def _walk(db, per_page, direction='next_cursor', start='', **kwargs):
+    """Follow cursors from `start`, returning the speed of every row seen."""
+    seen, cursor = [], start
+    while cursor is not None:
+        page = db.get_telemetry_page('a1', per_page=per_page, cursor=cursor, **kwargs)
+        seen.append([r['speed'] for r in page['rows']])
+        cursor = page[direction]
+    return seen
+
+
+class TestKeysetPagination:
+    """Cursor paging must visit the same rows as page-number paging."""
+
+    TIMES = [None, '2024-01-01 00:00:02', '2024-01-01 00:00:01', None,
+             '2024-01-01 00:00:02', '2024-01-01 00:00:03', '2024-01-01 00:00:01',
+             None, '2024-01-01 00:00:02', '2024-01-01 00:00:04']
+
+    @pytest.mark.parametrize('per_page', [1, 2, 3, 4, 20])
+    @pytest.mark.parametrize('imei', [None, 'A'])
+    def test_forward_matches_pages(self, db, per_page, imei):
+        _seed_telemetry(db, self.TIMES)
+        first = db.get_telemetry_page('a1', per_page=per_page, imei=imei)
+        expected = [
+            [r['speed'] for r in db.get_telemetry_page('a1', page=p, per_page=per_page, imei=imei)['rows']]
+            for p in range(1, first['pages'] + 1)
+        ]
+        assert _walk(db, per_page, imei=imei) == expected
+
+    @pytest.mark.parametrize('per_page', [1, 3, 4])
+    def test_backward_returns_previous_pages(self, db, per_page):
+        _seed_telemetry(db, self.TIMES)
+        forward = _walk(db, per_page)
+        last = db.get_telemetry_page('a1', page=len(forward), per_page=per_page)
+        backward = _walk(db, per_page, direction='prev_cursor', start=last['prev_cursor'])
+        assert backward[::-1] == forward[:-1]
+
+    def test_nulls_first_and_cursor_boundaries(self, db):
+        _seed_telemetry(db, self.TIMES)
+        page = db.get_telemetry_page('a1', per_page=3, cursor='')
+        assert [r['time'] for r in page['rows']] == [None, None, None]
+        assert page['prev_cursor'] is None and page['next_cursor']
+        assert 'total' not in page
+
+    def test_page_mode_exposes_cursors(self, db):
+        _seed_telemetry(db, self.TIMES)
+        page2 = db.get_telemetry_page('a1', page=2, per_page=3)
+        after = db.get_telemetry_page('a1', per_page=3, cursor=page2['next_cursor'])
+        assert after['rows'] == db.get_telemetry_page('a1', page=3, per_page=3)['rows']
+
+    def test_invalid_cursor(self, db):
+        _seed_telemetry(db, self.TIMES)
+        with pytest.raises(ValueError):
+            db.get_telemetry_page('a1', cursor='not-a-cursor')
+
+    def test_seek_uses_index(self, db):
+        """Cursor queries should be index range scans, not full scans."""
+        with db.get_connection() as conn:
+            plan = conn.execute(
+                'EXPLAIN QUERY PLAN SELECT * FROM telemetry_data WHERE analysis_id = ? '
+                'AND (time, id) > (?, ?) ORDER BY time, id LIMIT 10', ('a1', 't', 1)
+            ).fetchall()
+        detail = ' '.join(r[3] for r in plan)
+        assert 'idx_telemetry_analysis_time' in detail and 'TEMP B-TREE' not in detail
+
+
+class TestTelemetryCounts:
+    """Row counts are materialized at save time and used for paging."""
+
+    def test_counts_saved_with_analysis(self, db, analysis):
+        db.save_analysis('a1', analysis)
+        with db.get_connection() as conn:
+            counts = dict(conn.execute(
+                "SELECT imei, row_count FROM telemetry_counts WHERE analysis_id = 'a1'"
+            ).fetchall())
+        raw = analysis['raw_data_sample']
+        assert counts[''] == len(raw)
+        for imei in {r['imei'] for r in raw}:
+            assert counts[imei] == sum(r['imei'] == imei for r in raw)
+            assert db.get_telemetry_page('a1', imei=imei)['total'] == counts[imei]
+
+    def test_page_total_does_not_count_rows(self, db):
+        """The page total comes from telemetry_counts, not COUNT(*)."""
+        _seed_telemetry(db, TestKeysetPagination.TIMES)
+        assert db.get_telemetry_page('a1')['total'] == 10
+        with db.get_connection() as conn:
+            conn.execute("UPDATE telemetry_counts SET row_count = 99 WHERE imei = ''")
+        assert db.get_telemetry_page('a1')['total'] == 99
+        assert db.get_telemetry_page('a1', imei='A')['total'] == 5
+        assert db.get_telemetry_page('a1', imei='missing')['total'] == 0
+
+    def test_backfill_and_cascade(self, db, analysis):
+        db.save_analysis('a1', analysis)
+        with db.get_connection() as conn:
+            conn.execute('DELETE FROM telemetry_counts')
+        assert db.get_telemetry_page('a1')['total'] == len(analysis['raw_data_sample'])
+
+        db.delete_analysis('a1')
+        with db.get_connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM telemetry_counts').fetchone()[0] == 0
+
+
+def _query_rows(count=400):
+    """Telemetry rows spread over time, space, events, speed and RPM (some missing)."""
+    rows = []
+    for i in range(count):
+        rows.append({
+            'imei': f'D{i % 4}',
+            'time': None if i % 50 == 0 else f'2024-01-15 {10 + i % 5:02d}:{i % 60:02d}:00+00:00',
+            'lat': None if i % 37 == 0 else 19.0 + (i * 7 % 100) / 100,
+            'lng': 179.5 if i % 41 == 0 else -99.0 + (i * 13 % 100) / 100,
+            'speed': None if i % 29 == 0 else float(i * 17 % 130),
+            'engineRPM': float(600 + i * 31 % 4000),
+            'event_type': ('Harsh Breaking', 'SOS', None, None, None)[i % 5],
+        })
+    return rows
+
+
+def _matches(row, filters):
+    """Reference implementation of the range-query filters, on a saved row."""
+    if filters.get('start') and not (row['time'] and row['time'] >= filters['start']):
+        return False
+    if filters.get('end') and not (row['time'] and row['time'] <= filters['end']):
+        return False
+    if filters.get('event_types') and row['event_type'] not in filters['event_types']:
+        return False
+    for column, (low, high) in filters.get('ranges', {}).items():
+        value = row[{'speed': 'speed', 'engine_rpm': 'engineRPM'}[column]]
+        if value is None or (low is not None and value < low) or (high is not None and value > high):
+            return False
+    if filters.get('bbox'):
+        west, south, east, north = filters['bbox']
+        lat, lng = row['lat'], row['lng']
+        if lat is None or not south <= lat <= north:
+            return False
+        if not (west <= lng <= east if west <= east else lng >= west or lng <= east):
+            return False
+    return True
+
+
+class TestRangeQueries:
+    """Filtered pages return exactly the matching rows, through indexes."""
+
+    FILTERS = [
+        {'start': '2024-01-15 11:00:00+00:00', 'end': '2024-01-15 12:30:00+00:00'},
+        {'end': '2024-01-15 10:59:59+00:00'},
+        {'event_types': ['SOS']},
+        {'event_types': ['SOS', 'Harsh Breaking', 'Unknown']},
+        {'ranges': {'speed': (100.0, None)}},
+        {'ranges': {'speed': (20.0, 40.0), 'engine_rpm': (None, 2500.0)}},
+        {'bbox': (-98.8, 19.2, -98.4, 19.6)},
+        {'bbox': (179.0, 18.0, -98.5, 20.0)},
+        {'bbox': (-99.0, 19.0, -98.0, 20.0), 'start': '2024-01-15 11:00:00+00:00',
+         'event_types': ['SOS'], 'ranges': {'speed': (10.0, None)}},
+    ]
+
+    @pytest.fixture(params=[SQLITE_STORAGE, COLUMNAR_STORAGE])
+    def query_db(self, request, tmp_path, analysis):
+        db = Database(str(tmp_path / 'query.db'), telemetry_storage=request.param)
+        db.save_analysis('a1', dict(analysis, raw_data_sample=_query_rows()))
+        return db
+
+    @pytest.mark.parametrize('filters', FILTERS)
+    @pytest.mark.parametrize('imei', [None, 'D1'])
+    def test_matches_reference(self, query_db, filters, imei):
+        rows = [r for r in _query_rows() if (not imei or r['imei'] == imei) and _matches(r, filters)]
+        page = query_db.get_telemetry_page('a1', per_page=500, imei=imei, filters=filters)
+        assert page['total'] == len(rows) > 0
+        assert sorted(repr((r['time'], r['speed'], r['lat'])) for r in page['rows']) == \
+            sorted(repr((r['time'], r['speed'], r['lat'])) for r in rows)
+        times = [r['time'] or '' for r in page['rows']]
+        assert times == sorted(times)
+
+        # Cursor walks visit the same rows as page-number paging
+        walked, cursor = [], ''
+        while cursor is not None:
+            step = query_db.get_telemetry_page('a1', per_page=7, imei=imei, cursor=cursor, filters=filters)
+            walked += step['rows']
+            cursor = step['next_cursor']
+        assert walked == page['rows']
+
+    def test_storages_agree(self, tmp_path, analysis):
+        databases = []
+        for storage in (SQLITE_STORAGE, COLUMNAR_STORAGE):
+            db = Database(str(tmp_path / f'{storage}.db'), telemetry_storage=storage)
+            db.save_analysis('a1', dict(analysis, raw_data_sample=_query_rows()))
+            databases.append(db)
+        for filters in self.FILTERS:
+            sqlite_page, columnar_page = (db.get_telemetry_page('a1', page=2, per_page=5, filters=filters)
+                                          for db in databases)
+            assert sqlite_page['rows'] == columnar_page['rows']
+
+    @pytest.mark.parametrize('filters, index', [
+        ({'start': '2024-01-15 11:00:00+00:00'}, 'idx_telemetry_analysis_time'),
+        ({'event_types': ['SOS']}, 'idx_telemetry_analysis_event'),
+        ({'ranges': {'speed': (100.0, None)}}, 'idx_telemetry_analysis_speed'),
+        ({'ranges': {'engine_rpm': (4000.0, None)}}, 'idx_telemetry_analysis_rpm'),
+        ({'bbox': (-99.0, 19.0, -98.0, 20.0)}, 'idx_telemetry_analysis_position'),
+        ({'bbox': (179.0, 18.0, -98.5, 20.0)}, 'idx_telemetry_analysis_position'),
+    ])
+    def test_filters_use_indexes(self, db, filters, index):
+        conditions, params = _filter_conditions(filters)
+        with db.get_connection() as conn:
+            plan = conn.execute(
+                f'EXPLAIN QUERY PLAN SELECT * FROM telemetry_data WHERE analysis_id = ?{conditions} '
+                'ORDER BY time, id LIMIT 10', ['a1'] + params
+            ).fetchall()
+        detail = ' '.join(r[3] for r in plan)
+        assert index in detail and 'SCAN telemetry_data' not in detail
+
+    def test_drops_spatial_rtree(self, tmp_path):
+        path = str(tmp_path / 'old.db')
+        Database(path)
+        with sqlite3.connect(path) as conn:
+            conn.executescript('''
+                CREATE VIRTUAL TABLE telemetry_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng);
+                CREATE TRIGGER telemetry_rtree_delete AFTER DELETE ON telemetry_data BEGIN
+                    DELETE FROM telemetry_rtree WHERE id = old.id;
+                END;
+            ''')
+        Database(path)
+        with sqlite3.connect(path) as conn:
+            names = {r[0] for r in conn.execute('SELECT name FROM sqlite_master')}
+        assert 'telemetry_rtree' not in names and 'telemetry_rtree_delete' not in names
+        assert 'idx_telemetry_analysis_position' in names
+
+    def test_unsupported_range_column(self, db):
+        _seed_telemetry(db, TestKeysetPagination.TIMES)
+        with pytest.raises(ValueError):
+            db.get_telemetry_page('a1', filters={'ranges': {'speed > 0 OR 1': (1, None)}})
+
+    def test_endpoint(self, client, monkeypatch, query_db):
+        monkeypatch.setattr(app_module, 'db', query_db)
+        data = client.get('/api/result/a1/telemetry?start=2024-01-15T11:00:00Z&end=2024-01-15 12:30'
+                          '&event_type=panic&min_speed=10&bbox=-99,19,-98,20').get_json()
+        expected = {'start': '2024-01-15 11:00:00+00:00', 'end': '2024-01-15 12:30:00+00:00',
+                    'event_types': ['SOS'], 'ranges': {'speed': (10.0, None)},
+                    'bbox': (-99.0, 19.0, -98.0, 20.0)}
+        assert data['total'] == sum(_matches(r, expected) for r in _query_rows()) > 0
+        # Offsets are converted to UTC
+        shifted = client.get('/api/result/a1/telemetry?start=2024-01-15T05:00:00-06:00').get_json()
+        assert shifted['total'] == sum(_matches(r, {'start': '2024-01-15 11:00:00+00:00'})
+                                       for r in _query_rows())
+        for query in ('start=yesterday', 'min_rpm=fast', 'bbox=1,2'):
+            assert client.get(f'/api/result/a1/telemetry?{query}').status_code == 400
+
+
+class TestDeviceHistory:
+    """A device's scorecards across analyses come from one covering index."""
+
+    def _save(self, db, analysis, analysis_id, first_report, score):
+        scorecard = [dict(row, Primer_Reporte=first_report, Puntaje_Calidad=score)
+                     for row in analysis['scorecard']]
+        db.save_analysis(analysis_id, dict(analysis, scorecard=scorecard))
+
+    def test_history_in_period_order(self, db, analysis):
+        imei = analysis['scorecard'][0]['imei']
+        self._save(db, analysis, 'b', '2024-02-01 00:00:00+00:00', 80.0)
+        self._save(db, analysis, 'a', '2024-01-01 00:00:00+00:00', 90.0)
+        self._save(db, analysis, 'c', '2024-03-01 00:00:00+00:00', 70.0)
+        db.update_filename('b', 'February')
+
+        result = db.get_device_history(imei)
+        assert result['imei'] == imei and result['total'] == 3
+        assert [h['analysis_id'] for h in result['history']] == ['a', 'b', 'c']
+        assert [h['Puntaje_Calidad'] for h in result['history']] == [90.0, 80.0, 70.0]
+        assert result['history'][1]['filename'] == 'February'
+        assert set(result['history'][0]) >= {'processed_at', 'Ultimo_Reporte', 'GPS_Integrity', 'Delay_Avg'}
+
+        latest = db.get_device_history(imei, limit=2)
+        assert latest['total'] == 3
+        assert [h['analysis_id'] for h in latest['history']] == ['b', 'c']
+
+        db.delete_analysis('c')
+        assert db.get_device_history(imei)['total'] == 2
+        assert db.get_device_history('unknown') == {'imei': 'unknown', 'total': 0, 'history': []}
+
+    def test_reads_covering_index(self, db):
+        columns = ', '.join(f's.{c}' for c in DEVICE_HISTORY_COLUMNS)
+        with db.get_connection() as conn:
+            plan = conn.execute(
+                f'EXPLAIN QUERY PLAN SELECT {columns} FROM scorecard s WHERE s.imei = ? '
+                'ORDER BY s.primer_reporte DESC, s.analysis_id DESC', ('x',)
+            ).fetchall()
+        detail = ' '.join(r[3] for r in plan)
+        assert 'COVERING INDEX idx_scorecard_imei_history' in detail and 'TEMP B-TREE' not in detail
+
+    def test_endpoint(self, client, monkeypatch, db, analysis):
+        monkeypatch.setattr(app_module, 'db', db)
+        imei = analysis['scorecard'][0]['imei']
+        self._save(db, analysis, 'a', '2024-01-01 00:00:00+00:00', 90.0)
+        self._save(db, analysis, 'b', '2024-02-01 00:00:00+00:00', 80.0)
+        data = client.get(f'/api/devices/{imei}/history?limit=1').get_json()
+        assert data['total'] == 2
+        assert [h['Puntaje_Calidad'] for h in data['history']] == [80.0]
+
+
+class TestConnectionPool:
+    """Connections are reused per thread and configured for WAL."""
+
+    def test_reused_within_thread(self, db):
+        with db.get_connection() as first:
+            pass
+        with db.get_connection() as second:
+            assert second is first
+
+    def test_separate_per_thread(self, db):
+        with db.get_connection() as main:
+            pass
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(db._thread_connection()))
+        thread.start()
+        thread.join()
+        assert seen[0] is not main
+
+    def test_pragmas(self, db):
+        with db.get_connection() as conn:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+            assert conn.execute('PRAGMA busy_timeout').fetchone()[0] > 0
+
+    def test_nested_blocks_share_transaction(self, db):
+        """An error in the outer block also rolls back the inner writes."""
+        with pytest.raises(RuntimeError):
+            with db.get_connection():
+                with db.get_connection() as conn:
+                    conn.execute("INSERT INTO processing_jobs (id, filename) VALUES ('j1', 'f')")
+                raise RuntimeError
+        assert db.get_job('j1') is None
+
+    def test_reconnects_after_fork(self, db, monkeypatch):
+        with db.get_connection() as parent:
+            pass
+        monkeypatch.setattr(db._local, 'pid', -1)
+        with db.get_connection() as child:
+            assert child is not parent
+
+    def test_reader_not_blocked_by_open_write(self, db):
+        """Under WAL a reader sees committed data while a write is in progress."""
+        db.create_job('j1', 'f')
+        writer = sqlite3.connect(db.db_path, isolation_level=None)
+        # Locks out every reader under a rollback journal; not under WAL
+        writer.execute('BEGIN EXCLUSIVE')
+        writer.execute("UPDATE processing_jobs SET progress = 50 WHERE id = 'j1'")
+        try:
+            assert db.get_job('j1')['progress'] == 0
+        finally:
+            writer.rollback()
+            writer.close()
@@ -0,0 +1,104 @@
+"""Tests for streaming telemetry exports."""
+import pytest
+import csv
+import io
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from database import Database
+from export import EXPORT_COLUMNS, stream_csv, stream_parquet, parquet_available
+
+
+@pytest.fixture
+def saved(tmp_path, monkeypatch, sample_telemetry):
+    """A temporary database with the sample analysis saved as 'a1'."""
+    db = Database(str(tmp_path / 'export.db'))
+    result = app_module.process_log_data(sample_telemetry, 'test.json')
+    db.save_analysis('a1', result)
+    monkeypatch.setattr(app_module, 'db', db)
+    return db
+
+
+def _all_rows(db, imei=None):
+    page = db.get_telemetry_page('a1', per_page=10000, imei=imei)
+    return page['rows']
+
+
+def _flag_text(value):
+    return '' if value is None else str(value).lower()
+
+
+class TestCsvExport:
+    """CSV export streams every row in paging order."""
+
+    def test_matches_paged_rows(self, saved):
+        chunks = list(stream_csv(saved.iter_telemetry('a1', batch_size=1)))
+        rows = _all_rows(saved)
+        assert len(chunks) == len(rows) + 1  # header, then one chunk per batch
+        reader = csv.DictReader(io.StringIO(b''.join(chunks).decode('utf-8')))
+        assert reader.fieldnames == EXPORT_COLUMNS
+        exported = list(reader)
+        assert [r['imei'] for r in exported] == [r['imei'] for r in rows]
+        assert [r['time'] for r in exported] == [r['time'] for r in rows]
+        assert [r['isMoving'] for r in exported] == [_flag_text(r['isMoving']) for r in rows]
+
+    def test_null_flags(self, tmp_path, sample_telemetry):
+        """A flag the payload did not carry is an empty cell, not false."""
+        db = Database(str(tmp_path / 'flags.db'))
+        result = app_module.process_log_data(sample_telemetry, 'test.json')
+        db.save_analysis('f1', dict(result, raw_data_sample=[
+            {'imei': '1', 'time': '2024-01-01T00:00:00Z', 'ignitionOn': None, 'isMoving': False},
+            {'imei': '1', 'time': '2024-01-01T00:00:01Z', 'ignitionOn': True},
+        ]))
+        exported = list(csv.DictReader(io.StringIO(b''.join(stream_csv(db.iter_telemetry('f1'))).decode())))
+        assert [(r['ignitionOn'], r['isMoving']) for r in exported] == [('', 'false'), ('true', '')]
+        rows = db.get_telemetry_page('f1')['rows']
+        assert [(r['ignitionOn'], r['isMoving']) for r in rows] == [(None, False), (True, None)]
+
+    def test_endpoint_filters_by_imei(self, saved, client):
+        imei = _all_rows(saved)[0]['imei']
+        response = client.get(f'/api/result/a1/export?imei={imei}')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        assert f'export_{imei}_a1.csv' in response.headers['Content-Disposition']
+        exported = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        assert len(exported) == len(_all_rows(saved, imei=imei))
+        assert {r['imei'] for r in exported} == {imei}
+
+    def test_endpoint_errors(self, saved, client):
+        assert client.get('/api/result/missing/export').status_code == 404
+        assert client.get('/api/result/a1/export?format=xlsx').status_code == 400
+
+
+@pytest.mark.skipif(not parquet_available(), reason="pyarrow not installed")
+class TestParquetExport:
+    """Parquet export writes one row group per batch."""
+
+    def test_round_trip(self, saved):
+        import pyarrow.parquet as pq
+        data = b''.join(stream_parquet(saved.iter_telemetry('a1', batch_size=2)))
+        table = pq.read_table(io.BytesIO(data))
+        rows = _all_rows(saved)
+        assert table.column_names == EXPORT_COLUMNS
+        assert table.num_rows == len(rows)
+        assert table.column('imei').to_pylist() == [r['imei'] for r in rows]
+        assert table.column('isMoving').to_pylist() == [r['isMoving'] for r in rows]
+
+    def test_null_flags(self, tmp_path, sample_telemetry):
+        import pyarrow.parquet as pq
+        db = Database(str(tmp_path / 'flags.db'))
+        result = app_module.process_log_data(sample_telemetry, 'test.json')
+        db.save_analysis('f1', dict(result, raw_data_sample=[
+            {'imei': '1', 'time': '2024-01-01T00:00:00Z', 'ignitionOn': None},
+            {'imei': '1', 'time': '2024-01-01T00:00:01Z', 'ignitionOn': 0},
+        ]))
+        table = pq.read_table(io.BytesIO(b''.join(stream_parquet(db.iter_telemetry('f1')))))
+        assert table.column('ignitionOn').to_pylist() == [None, False]
+
+    def test_endpoint(self, saved, client):
+        response = client.get('/api/result/a1/export?format=parquet')
+        assert response.status_code == 200
+        assert response.get_data()[:4] == b'PAR1'
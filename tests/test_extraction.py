@@ -0,0 +1,120 @@
+"""Tests for columnar telemetry extraction."""
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction import TelemetryColumns, extract_telemetry, extract_telemetry_parallel, FIELDS
+
+
+def _point(**overrides):
+    point = {
+        'imei': '123456789012345',
+        'time': '2024-01-15T10:29:55Z',
+        'lat': 19.4326,
+        'lng': -99.1332,
+        'speed': 45,
+        'quality': 'Good',
+        'addOns': {'mileage': 15000, 'ignitionOn': 1, 'canbus': {'engineRPM': 2500}},
+        'event': {'type': 6}
+    }
+    point.update(overrides)
+    return point
+
+
+class TestTelemetryColumns:
+    """Test cases for the columnar accumulator."""
+
+    def test_dataframe_layout(self):
+        """Should expose every field with typed numeric and flag columns."""
+        columns = TelemetryColumns()
+        columns.append_point(_point(), '2024-01-15T10:30:00Z')
+        df = columns.to_dataframe()
+
+        assert list(df.columns) == list(FIELDS)
+        assert df['lat'].dtype == np.float64
+        assert df['gps_ok'].dtype == np.bool_
+        assert df['imei'].dtype == object
+        assert df.loc[0, 'event_type'] == 'Ignition On'
+        assert bool(df.loc[0, 'has_rpm']) is True
+        assert bool(df.loc[0, 'has_speed']) is False
+
+    def test_missing_and_invalid_numbers_become_nan(self):
+        """Should store None and non-numeric strings as NaN."""
+        columns = TelemetryColumns()
+        columns.append_point(_point(lat=None, speed='fast', heading='90'), None)
+        df = columns.to_dataframe()
+
+        assert np.isnan(df.loc[0, 'lat'])
+        assert np.isnan(df.loc[0, 'speed'])
+        assert df.loc[0, 'heading'] == 90.0
+
+    def test_strings_are_interned(self):
+        """Equal imei strings should share a single object."""
+        columns = TelemetryColumns()
+        columns.append_point(_point(imei=''.join(['1', '23'])), None)
+        columns.append_point(_point(imei=''.join(['12', '3'])), None)
+        df = columns.to_dataframe()
+
+        assert df.loc[0, 'imei'] is df.loc[1, 'imei']
+
+    def test_malformed_point_keeps_columns_aligned(self):
+        """A point that fails mid-way must not leave partial rows behind."""
+        columns = TelemetryColumns()
+        with pytest.raises(AttributeError):
+            columns.append_point(_point(event='not-a-dict'), None)
+        columns.append_point(_point(), None)
+
+        df = columns.to_dataframe()
+        assert len(df) == 1
+
+    def test_dataframe_shares_buffers(self):
+        """Numeric columns should be views over the accumulator buffers."""
+        columns = TelemetryColumns()
+        columns.append_point(_point(), None)
+        df = columns.to_dataframe()
+
+        assert not df['lat'].values.flags.owndata
+
+
+class TestExtractTelemetry:
+    """Test cases for extract_telemetry."""
+
+    def test_sample_telemetry(self, sample_telemetry):
+        """Should extract points and count consumed entries."""
+        columns = extract_telemetry(sample_telemetry)
+        assert columns.entries_seen == len(sample_telemetry)
+        assert len(columns) > 0
+
+    def test_entries_without_payload_are_skipped(self):
+        """Entries without AdditionalInformation produce no points."""
+        columns = extract_telemetry([{'no_jsonPayload': True}, {'jsonPayload': 'x'}])
+        assert len(columns) == 0
+        assert columns.entries_seen == 2
+
+
+class TestExtractTelemetryParallel:
+    """Test cases for process-pool extraction."""
+
+    def test_matches_serial_extraction(self, sample_telemetry):
+        """Chunked parallel extraction should preserve content and order."""
+        logs = sample_telemetry * 5
+        serial = extract_telemetry(logs).to_dataframe()
+        merged = extract_telemetry_parallel(logs, workers=2, chunk_size=3)
+
+        assert merged.entries_seen == len(logs)
+        pd.testing.assert_frame_equal(merged.to_dataframe(), serial)
+
+    def test_merged_strings_are_interned(self, sample_telemetry):
+        """Strings from different chunks should be interned on merge."""
+        merged = extract_telemetry_parallel(sample_telemetry * 4, workers=2, chunk_size=2)
+        df = merged.to_dataframe()
+        assert df.loc[0, 'imei'] is df.loc[len(df) - 1, 'imei']
+
+    def test_single_worker_runs_inline(self, sample_telemetry):
+        """workers=1 should extract in-process."""
+        columns = extract_telemetry_parallel(iter(sample_telemetry), workers=1)
+        assert len(columns) == len(extract_telemetry(sample_telemetry))
@@ -0,0 +1,200 @@
+"""Tests for route simplification, the fleet map grid and their endpoints."""
+import pytest
+import math
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import app as app_module
+from database import Database, SQLITE_STORAGE, COLUMNAR_STORAGE
+from geo import (simplify, build_route, zoom_tolerance, grid_cell, first_fixes, parse_bbox,
+                 _segment_distances2)
+
+
+def _route_points(n, events=None):
+    """A winding track of n points heading north-east, with optional events."""
+    t = np.arange(n)
+    lat = (19.4 + t * 1e-5 + 1e-4 * np.sin(t / 50)).tolist()
+    lng = (-99.1 + t * 1e-5).tolist()
+    event_type = [None] * n
+    for i, name in (events or {}).items():
+        event_type[i] = name
+    return {
+        'time': [f'2024-01-15 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}+00:00' for i in range(n)],
+        'lat': lat, 'lng': lng, 'speed': [30.0] * n, 'event_type': event_type,
+    }
+
+
+class TestSimplify:
+    """Douglas-Peucker keeps the shape within the point budget."""
+
+    def test_straight_line_reduces_to_endpoints(self):
+        x = np.arange(100, dtype=float)
+        assert simplify(x, x * 2, tolerance=1e-6).tolist() == [0, 99]
+
+    def test_keeps_corner(self):
+        x = np.array([0, 1, 2, 3, 3, 3, 3], dtype=float)
+        y = np.array([0, 0, 0, 0, 1, 2, 3], dtype=float)
+        assert simplify(x, y).tolist() == [0, 3, 6]
+
+    def test_budget_and_tolerance(self):
+        t = np.linspace(0, 20 * math.pi, 5000)
+        x, y = t * 10, np.sin(t) * 100
+        assert len(simplify(x, y, max_points=50)) == 50
+        loose = simplify(x, y, tolerance=50.0)
+        tight = simplify(x, y, tolerance=1.0)
+        assert len(loose) < len(tight) < 5000
+        # Every dropped point is within tolerance of the kept polyline
+        for start, end in zip(tight[:-1], tight[1:]):
+            assert _segment_distances2(x, y, start, end).max(initial=0) <= 1.0
+
+    def test_keep_mask_on_top_of_budget(self):
+        x = np.arange(1000, dtype=float)
+        keep = np.zeros(1000, dtype=bool)
+        keep[[10, 500]] = True
+        assert simplify(x, x, max_points=2, keep=keep).tolist() == [0, 10, 500, 999]
+
+    def test_zoom_tolerance_halves_per_level(self):
+        assert zoom_tolerance(10, 0) == pytest.approx(2 * zoom_tolerance(11, 0))
+
+
+class TestBuildRoute:
+    def test_large_track_is_reduced(self):
+        route = build_route(_route_points(200000, {1234: 'SOS'}), max_points=2000)
+        assert route['total_points'] == 200000
+        assert len(route['points']) <= 2001
+        assert [e['event_type'] for e in route['events']] == ['SOS']
+        assert route['events'][0]['lat'] in {p[0] for p in route['points']}
+        assert route['start']['time'].startswith('2024-01-15 00:00:00')
+
+    def test_skips_points_without_fix(self):
+        points = _route_points(5)
+        points['lat'][0] = None
+        points['lng'][4] = 0.0
+        route = build_route(points)
+        assert route['total_points'] == 3
+        assert route['start']['lat'] == points['lat'][1]
+
+    def test_empty(self):
+        route = build_route({'time': [], 'lat': [], 'lng': [], 'speed': [], 'event_type': []})
+        assert route['points'] == [] and route['start'] is None
+
+
+class TestRouteEndpoint:
+    """The endpoint reads one device's rows from either telemetry storage."""
+
+    @pytest.mark.parametrize('storage', [SQLITE_STORAGE, COLUMNAR_STORAGE])
+    def test_route(self, tmp_path, monkeypatch, client, sample_telemetry, storage):
+        db = Database(str(tmp_path / 'route.db'), telemetry_storage=storage)
+        monkeypatch.setattr(app_module, 'db', db)
+        result = app_module.process_log_data(sample_telemetry, 'test.json')
+        db.save_analysis('a1', result)
+        imei = result['scorecard'][0]['imei']
+
+        data = client.get(f'/api/result/a1/route/{imei}?max_points=2').get_json()
+        rows = [r for r in result['raw_data_sample'] if r['imei'] == imei and r['lat'] and r['lng']]
+        assert data['imei'] == imei
+        assert data['total_points'] == len(rows)
+        assert len(data['points']) <= 2 + len(data['events'])
+        assert client.get('/api/result/missing/route/1').status_code == 404
+        assert client.get('/api/result/a1/route/unknown').get_json()['total_points'] == 0
+
+    @pytest.mark.parametrize('zoom', [5000, -2000, 'nan'])
+    def test_out_of_range_zoom(self, tmp_path, monkeypatch, client, sample_telemetry, zoom):
+        """Zoom levels beyond the map's are clamped to them."""
+        db = Database(str(tmp_path / 'route.db'))
+        monkeypatch.setattr(app_module, 'db', db)
+        result = app_module.process_log_data(sample_telemetry, 'test.json')
+        db.save_analysis('a1', result)
+        imei = result['scorecard'][0]['imei']
+
+        response = client.get(f'/api/result/a1/route/{imei}?zoom={zoom}')
+        assert response.status_code == 200
+        assert response.get_json()['total_points'] > 0
+
+
+class TestFleetGrid:
+    def test_grid_cell(self):
+        assert grid_cell(0.0, 0.0, level=1) == (1, 1)
+        assert grid_cell(45.0, -90.0, level=2) == (1, 1)
+        assert grid_cell(-89.0, 180.0, level=3) == (7, 7)
+        # A coarser cell is the finer cell shifted right
+        x, y = grid_cell(19.43, -99.13)
+        assert grid_cell(19.43, -99.13, level=10) == (x >> 14, y >> 14)
+
+    def test_first_fixes(self):
+        rows = [('A', '2024-01-02', 1.0, 2.0), ('A', '2024-01-01', 0.0, 0.0),
+                ('A', '2024-01-03', 3.0, 4.0), ('B', None, 5.0, 6.0), ('B', '2024-01-01', 7.0, 8.0),
+                ('C', '2024-01-01', None, None), (None, '2024-01-01', 1.0, 1.0)]
+        assert first_fixes(rows) == {'A': ('2024-01-02', 1.0, 2.0, 3), 'B': (None, 5.0, 6.0, 2)}
+
+    @pytest.mark.parametrize('text', ['1,2,3', 'a,b,c,d', '0,10,1,5', '0,0,200,1'])
+    def test_parse_bbox_rejects(self, text):
+        with pytest.raises(ValueError):
+            parse_bbox(text)
+
+
+class TestFleetMapEndpoint:
+    """The endpoint clusters every device's first fix from either telemetry storage."""
+
+    @pytest.fixture(params=[SQLITE_STORAGE, COLUMNAR_STORAGE])
+    def fleet(self, request, tmp_path, monkeypatch):
+        """An analysis of 200 devices in a 10x20 grid over Mexico City, 3 rows each."""
+        db = Database(str(tmp_path / 'map.db'), telemetry_storage=request.param)
+        monkeypatch.setattr(app_module, 'db', db)
+        rows = []
+        for d in range(200):
+            for t in range(3):
+                rows.append({'imei': f'35{d:013d}', 'time': f'2024-01-15 00:00:0{2 - t}+00:00',
+                             'lat': 19.0 + (d // 20) * 0.1 + t * 1e-3, 'lng': -99.0 + (d % 20) * 0.1})
+        rows.append({'imei': 'nofix', 'time': '2024-01-15 00:00:00+00:00', 'lat': 0.0, 'lng': 0.0})
+        summary = {'filename': 'fleet.json', 'processed_at': '2024-01-15T00:00:00', 'total_devices': 201,
+                   'total_records': len(rows), 'total_distance_km': 0, 'average_quality_score': 0}
+        db.save_analysis('a1', {'summary': summary, 'scorecard': [], 'raw_data_sample': rows})
+        return db
+
+    def test_clusters_count_all_devices(self, client, fleet):
+        data = client.get('/api/result/a1/map?zoom=3').get_json()
+        assert data['type'] == 'FeatureCollection'
+        assert data['devices'] == 200
+        assert len(data['features']) < 10
+        assert sum(f['properties']['devices'] for f in data['features']) == 200
+        assert sum(f['properties']['points'] for f in data['features']) == 600
+        west, south, east, north = data['bbox']
+        assert (west, south) == pytest.approx((-99.0, 19.002))
+        assert (east, north) == pytest.approx((-97.1, 19.902))
+
+    def test_single_devices_at_high_zoom(self, client, fleet):
+        features = client.get('/api/result/a1/map?zoom=22').get_json()['features']
+        assert len(features) == 200
+        first = min(features, key=lambda f: f['properties']['imei'])
+        assert first['properties'] == {'devices': 1, 'points': 3, 'imei': f'35{0:013d}',
+                                       'time': '2024-01-15 00:00:00+00:00'}
+        # The device is placed at its first fix in time
+        assert first['geometry']['coordinates'] == pytest.approx([-99.0, 19.002])
+
+    def test_bbox_filters_devices(self, client, fleet):
+        data = client.get('/api/result/a1/map?zoom=22&bbox=-99.05,18.95,-98.85,19.15').get_json()
+        assert len(data['features']) == 4
+        assert data['devices'] == 200
+        wrapped = client.get('/api/result/a1/map?zoom=22&bbox=170,18,-98.95,20').get_json()
+        assert len(wrapped['features']) == 10
+
+    def test_errors(self, client, fleet):
+        assert client.get('/api/result/a1/map?bbox=1,2,3').status_code == 400
+        assert client.get('/api/result/missing/map').status_code == 404
+
+    def test_index_built_on_first_access(self, client, fleet):
+        """Analyses saved before the map grid existed are indexed when first shown."""
+        with fleet.get_connection() as conn:
+            conn.execute('DELETE FROM device_positions')
+        assert client.get('/api/result/a1/map?zoom=22').get_json()['devices'] == 200
+        with fleet.get_connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM device_positions').fetchone()[0] == 200
+
+    def test_deleted_with_analysis(self, fleet):
+        fleet.delete_analysis('a1')
+        with fleet.get_connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM device_positions').fetchone()[0] == 0
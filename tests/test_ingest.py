@@ -0,0 +1,94 @@
+"""Tests for streaming log ingestion."""
+import pytest
+import io
+import json
+import hashlib
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import LogStreamReader, save_upload
+from app import process_log_data
+
+
+def _write(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding='utf-8')
+    return str(path)
+
+
+class TestLogStreamReader:
+    """Test cases for LogStreamReader."""
+
+    def test_json_array(self, tmp_path, sample_telemetry):
+        """Should yield every element of a pretty-printed JSON array."""
+        path = _write(tmp_path, 'logs.json', json.dumps(sample_telemetry, indent=2))
+        assert list(LogStreamReader(path)) == sample_telemetry
+
+    def test_json_array_small_chunks(self, tmp_path, sample_telemetry):
+        """Should reassemble entries that span chunk boundaries."""
+        path = _write(tmp_path, 'logs.json', json.dumps(sample_telemetry))
+        reader = LogStreamReader(path, chunk_size=7)
+        assert list(reader) == sample_telemetry
+        assert reader.entries_read == len(sample_telemetry)
+
+    def test_numbers_at_chunk_boundary(self, tmp_path):
+        """Should not split numeric elements across chunks."""
+        path = _write(tmp_path, 'numbers.json', '[12345, 67890]')
+        assert list(LogStreamReader(path, chunk_size=3)) == [12345, 67890]
+
+    def test_ndjson(self, tmp_path, sample_telemetry):
+        """Should yield one entry per line and skip blank/invalid lines."""
+        lines = [json.dumps(e) for e in sample_telemetry]
+        content = '\n'.join(lines[:1] + ['', 'not json'] + lines[1:]) + '\n'
+        path = _write(tmp_path, 'logs.ndjson', content)
+        reader = LogStreamReader(path)
+        assert list(reader) == sample_telemetry
+        assert reader.skipped_lines == 1
+
+    def test_empty_array(self, tmp_path):
+        """Should yield nothing for an empty array."""
+        path = _write(tmp_path, 'empty.json', '  [ ]  ')
+        assert list(LogStreamReader(path)) == []
+
+    def test_malformed_array_stops(self, tmp_path):
+        """Should yield the valid prefix of a truncated array."""
+        path = _write(tmp_path, 'broken.json', '[{"a": 1}, {"b": 2}, {"c":')
+        assert list(LogStreamReader(path)) == [{"a": 1}, {"b": 2}]
+
+    def test_reports_bytes_consumed(self, tmp_path, sample_telemetry):
+        """Should report progress up to the full file size."""
+        path = _write(tmp_path, 'logs.json', json.dumps(sample_telemetry))
+        calls = []
+        reader = LogStreamReader(path, on_progress=lambda r, t: calls.append((r, t)), chunk_size=64)
+        list(reader)
+        total = os.path.getsize(path)
+        assert calls[-1] == (total, total)
+        assert [c[0] for c in calls] == sorted(c[0] for c in calls)
+        assert reader.bytes_read == total
+
+
+class TestSaveUpload:
+    def test_writes_and_hashes(self, tmp_path):
+        content = b'{"imei": "1"}\n' * 1000
+        path = str(tmp_path / 'upload.json')
+        size, digest = save_upload(io.BytesIO(content), path, chunk_size=100)
+        assert size == len(content)
+        assert digest == hashlib.sha256(content).hexdigest()
+        with open(path, 'rb') as f:
+            assert f.read() == content
+
+
+class TestStreamingProcessing:
+    """process_log_data should accept a stream of entries."""
+
+    def test_stream_matches_list(self, tmp_path, sample_telemetry):
+        """Streaming and in-memory input should produce the same analysis."""
+        path = _write(tmp_path, 'logs.json', json.dumps(sample_telemetry))
+        from_list = process_log_data(sample_telemetry, 'test.json')
+        from_stream = process_log_data(LogStreamReader(path), 'test.json')
+
+        for result in (from_list, from_stream):
+            result['summary'].pop('processed_at')
+        assert from_stream == from_list
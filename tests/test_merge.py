@@ -0,0 +1,150 @@
+"""Tests for merging analyses from their stored telemetry."""
+import pytest
+import json
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from analysis import ANALYZER_VERSION, process_log_data, stored_telemetry_frame, merge_frames
+from database import Database, TELEMETRY_COLUMN_MAP, SQLITE_STORAGE, COLUMNAR_STORAGE
+
+KEYS = [key for _, key in TELEMETRY_COLUMN_MAP]
+
+
+def _logs(entries, per_entry=20, devices=12, seed=7, fuel_level=True):
+    """Gateway log entries with a mix of CAN bus, ignition and GPS quality per device.
+
+    ignitionOn is absent for every fourth device, true, false, or either;
+    devices 2, 4, 8 and 10 have no ignition events. fuel_level=False leaves
+    fuelLevelInput out of every point.
+    """
+    rng = random.Random(seed)
+    logs = []
+    for i in range(entries):
+        points = []
+        for j in range(per_entry):
+            n = i * per_entry + j
+            d = n % devices
+            point = {
+                'imei': f'35{d:013d}',
+                'time': f'2024-01-15T{n // 3600:02d}:{n // 60 % 60:02d}:{n % 60:02d}Z',
+                'lat': 19.4 + n * 1e-4, 'lng': -99.1 + rng.random() / 1000,
+                'speed': rng.randint(0, 120),
+                'quality': 'Good' if rng.random() > 0.1 else 'Bad',
+                'addOns': {'mileage': 15000 + n // devices, 'driverId': f'D{d}'},
+                'event': {'type': rng.choice([None, None, 'panic'] if d % 6 in (2, 4) else
+                                             [None, None, 6, 7, 'panic', 'Ignition On'])}
+            }
+            if d % 4:
+                point['addOns']['ignitionOn'] = {1: 1, 2: False, 3: rng.random() > 0.5}[d % 4]
+            if d % 3:
+                point['addOns']['canbus'] = {
+                    'engineRPM': rng.randint(800, 3000), 'vehicleSpeed': rng.randint(0, 120),
+                    'totalDistance': 15000 + n // devices
+                }
+                if fuel_level:
+                    point['addOns']['canbus']['fuelLevelInput'] = 64
+            points.append(point)
+        additional = json.dumps({'Arguments': json.dumps({'message': json.dumps(points)})})
+        logs.append({'receiveTimestamp': '2024-01-15T12:00:00Z',
+                     'jsonPayload': {'data': {'AdditionalInformation': additional}}})
+    return logs
+
+
+@pytest.fixture(params=[SQLITE_STORAGE, COLUMNAR_STORAGE])
+def db(request, tmp_path, monkeypatch):
+    db = Database(str(tmp_path / 'merge.db'), telemetry_storage=request.param)
+    monkeypatch.setattr(app_module, 'db', db)
+    return db
+
+
+def _merge(db, analysis_ids):
+    return merge_frames([stored_telemetry_frame(db.iter_telemetry(i), KEYS) for i in analysis_ids],
+                        'merged')
+
+
+class TestMergeFrames:
+    """A merge scores the same as processing the uploads' logs together."""
+
+    @pytest.mark.parametrize('fuel_level', [True, False])
+    def test_matches_processing_all_logs(self, db, fuel_level):
+        logs = _logs(30, fuel_level=fuel_level)
+        # The uploads overlap by five entries, duplicated rows included
+        first, second = logs[:20], logs[15:]
+        db.save_analysis('a', process_log_data(first, 'a.json'))
+        db.save_analysis('b', process_log_data(second, 'b.json'))
+
+        expected = process_log_data(first + second, 'merged')
+        merged = _merge(db, ['a', 'b'])
+        assert merged['summary']['total_records'] == expected['summary']['total_records'] == 600
+        assert merged['summary']['total_devices'] == expected['summary']['total_devices']
+        assert merged['summary']['total_distance_km'] == pytest.approx(expected['summary']['total_distance_km'])
+        assert merged['scorecard'] == expected['scorecard']
+        assert merged['data_quality'] == pytest.approx(expected['data_quality'])
+        assert merged['chart_data'] == expected['chart_data']
+
+    def test_ignition_without_events(self, db):
+        """A device reporting only ignitionOn false has ignition data; one without it has none."""
+        logs = _logs(10)
+        db.save_analysis('a', process_log_data(logs[:5], 'a.json'))
+        db.save_analysis('b', process_log_data(logs[5:], 'b.json'))
+        frame = stored_telemetry_frame(db.iter_telemetry('a'), KEYS)
+        has_ignition = frame.groupby('imei')['has_ignition'].any()
+        assert has_ignition[f'35{2:013d}']
+        assert not has_ignition[f'35{4:013d}']
+
+        expected = process_log_data(logs, 'merged')
+        assert _merge(db, ['a', 'b'])['data_quality'] == pytest.approx(expected['data_quality'])
+
+    def test_first_analysis_wins_duplicates(self, db):
+        logs = _logs(5)
+        db.save_analysis('a', process_log_data(logs, 'a.json'))
+        db.save_analysis('b', process_log_data(logs, 'b.json'))
+        merged = _merge(db, ['a', 'b'])
+        assert merged['summary']['total_records'] == 100
+        assert merged['scorecard'] == process_log_data(logs, 'merged')['scorecard']
+
+    def test_zero_flag_rows(self, db):
+        """Rows of older analyses only count a true ignitionOn as ignition data."""
+        db.save_analysis('a', process_log_data(_logs(5), 'a.json'))
+        frame = stored_telemetry_frame(db.iter_telemetry('a'), KEYS, null_flags=False)
+        has_ignition = frame.groupby('imei')['has_ignition'].any()
+        assert has_ignition[f'35{1:013d}']
+        assert not has_ignition[f'35{2:013d}']
+
+    def test_no_rows(self, db):
+        assert merge_frames([stored_telemetry_frame([], KEYS)], 'merged') is None
+
+
+class TestMergeEndpoint:
+    def test_merge(self, client, db):
+        logs = _logs(10)
+        db.save_analysis('a', process_log_data(logs[:5], 'a.json'), analyzer_version=ANALYZER_VERSION)
+        db.save_analysis('b', process_log_data(logs[5:], 'b.json'), analyzer_version=ANALYZER_VERSION)
+
+        response = client.post('/api/merge', json={'analysis_ids': ['a', 'b'], 'filename': 'week.json'})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['data']['summary']['filename'] == 'week.json'
+        assert data['data']['summary']['total_records'] == 200
+        assert data['data']['raw_data_sample'] == []
+        assert data['data']['data_quality'] == pytest.approx(process_log_data(logs, 'x')['data_quality'])
+        stored = db.get_analysis(data['id'])
+        assert stored['summary']['total_records'] == 200
+        assert db.get_telemetry_page(data['id'], page=1, per_page=1)['total'] == 200
+
+        default = client.post('/api/merge', json={'analysis_ids': ['a', 'b']}).get_json()
+        assert default['data']['summary']['filename'] == 'merged_2_analyses'
+
+    @pytest.mark.parametrize('body', [None, {}, {'analysis_ids': 'a'}, {'analysis_ids': ['a']},
+                                      {'analysis_ids': ['a', 'a']}, {'analysis_ids': ['a', 1]}])
+    def test_bad_request(self, client, db, body):
+        assert client.post('/api/merge', json=body).status_code == 400
+
+    def test_unknown_analysis(self, client, db):
+        db.save_analysis('a', process_log_data(_logs(2), 'a.json'))
+        response = client.post('/api/merge', json={'analysis_ids': ['a', 'missing']})
+        assert response.status_code == 404
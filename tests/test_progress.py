@@ -0,0 +1,137 @@
+"""Tests for pipeline progress reporting."""
+import pytest
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progress import ProgressTracker, START_PROGRESS, STAGE_RANGES
+import analysis
+from analysis import process_log_data
+from database import Database
+from ingest import LogStreamReader
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def tracked():
+    """A tracker on a fake clock, with the list of states it published."""
+    published = []
+    clock = FakeClock()
+    return ProgressTracker(published.append, interval=1.0, clock=clock), published, clock
+
+
+class TestProgressTracker:
+    """The tracker maps stage counters to a throttled percentage and ETA."""
+
+    def test_maps_stages_to_percent(self, tracked):
+        tracker, published, clock = tracked
+        tracker('read', 500, 1000)
+        assert published[-1]['progress'] == 30
+        assert published[-1]['stage'] == 'read'
+        assert published[-1]['detail']['bytes_read'] == 500
+        tracker('save', 1000, 1000)
+        assert published[-1]['progress'] == STAGE_RANGES['save'][1]
+
+    def test_throttles_updates(self, tracked):
+        tracker, published, clock = tracked
+        tracker('read', 100, 1000)
+        for n in range(200, 900, 100):
+            tracker('read', n, 1000)
+        assert len(published) == 1
+        clock.now = 1.0
+        tracker('read', 900, 1000)
+        assert len(published) == 2
+        # Counter-only stages never publish between intervals
+        tracker('parse', 5000)
+        assert len(published) == 2
+        # Stage ends and stage changes are always published
+        tracker('read', 1000, 1000)
+        tracker('score', 0, 10)
+        assert len(published) == 4
+        assert published[-1]['detail']['records_parsed'] == 5000
+
+    def test_never_goes_backwards(self, tracked):
+        tracker, published, clock = tracked
+        tracker('read', 1000, 1000)
+        tracker('read', 10, 1000)
+        assert tracker.progress == STAGE_RANGES['read'][1]
+
+    def test_eta_from_throughput(self, tracked):
+        tracker, published, clock = tracked
+        assert tracker.eta_seconds() is None
+        tracker('read', 0, 1000)
+        assert published[-1]['eta_seconds'] is None
+        clock.now = 10.0
+        tracker('read', 500, 1000)
+        # Half the stage in 10 s leaves 10 s of reading; 25 points in 10 s
+        # overall leaves 45 points (18 s) for the stages after it
+        assert published[-1]['eta_seconds'] == pytest.approx(28.0)
+
+
+class TestPipelineReporting:
+    """The pipeline and the save report every stage."""
+
+    def test_process_log_data_reports_stages(self, tmp_path, sample_telemetry):
+        path = tmp_path / 'upload.json'
+        path.write_text(json.dumps(sample_telemetry))
+        calls = []
+        result = process_log_data(LogStreamReader(str(path)), 'upload.json',
+                                  progress=lambda *args: calls.append(args))
+
+        assert ('parse', len(sample_telemetry), None) in calls
+        size = path.stat().st_size
+        assert ('read', size, size) in calls
+        devices = result['summary']['total_devices']
+        assert ('score', devices, devices) in calls
+        rows = len(result['raw_data_sample'])
+        assert calls[-1] == ('convert', rows, rows)
+
+    def test_scoring_reports_parts(self, monkeypatch, sample_telemetry):
+        monkeypatch.setattr(analysis, 'PROGRESS_DEVICES', 1)
+        monkeypatch.setattr(analysis, 'PROGRESS_ROWS', 3)
+        calls = []
+        reported = process_log_data(sample_telemetry, 'test.json', progress=lambda *args: calls.append(args))
+        devices = reported['summary']['total_devices']
+        rows = len(reported['raw_data_sample'])
+        assert [c[1] for c in calls if c[0] == 'score'] == list(range(devices + 1))
+        assert [c[1] for c in calls if c[0] == 'convert'] == [*range(0, rows, 3), rows]
+
+        # Scored in parts, the result is the same
+        result = process_log_data(sample_telemetry, 'test.json')
+        for key in ('scorecard', 'raw_data_sample', 'data_quality', 'chart_data'):
+            assert reported[key] == result[key]
+
+    def test_save_reports_rows_persisted(self, tmp_path, sample_telemetry):
+        result = process_log_data(sample_telemetry, 'test.json')
+        total = len(result['scorecard']) + len(result['raw_data_sample'])
+        calls = []
+        Database(str(tmp_path / 'p.db')).save_analysis(
+            'a1', result, progress=lambda *args: calls.append(args)
+        )
+        assert calls[0] == ('save', 0, total)
+        assert calls[-1] == ('save', total, total)
+
+    def test_tracker_status_reaches_job_row(self, tmp_path):
+        db = Database(str(tmp_path / 'p.db'))
+        db.create_job('j1', 'upload.json')
+        tracker = ProgressTracker(lambda state: db.update_job_progress(
+            'j1', state['progress'], stage=state['stage'],
+            eta_seconds=state['eta_seconds'], detail=state['detail']
+        ))
+        tracker('parse', 250)
+        tracker('read', 2048, 4096)
+
+        job = db.get_job('j1')
+        assert job['progress'] > START_PROGRESS
+        assert job['stage'] == 'read'
+        assert job['detail']['records_parsed'] == 250
+        assert job['detail']['bytes_total'] == 4096
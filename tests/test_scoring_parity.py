@@ -0,0 +1,291 @@
+"""Parity harness: vectorized scorecard vs the per-group reference."""
+import pytest
+import json
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import (calculate_v2_metrics, calc_ignition_quality, compute_fleet_metrics,
+                     PartialMetrics, SCORECARD_COLUMNS, STATS_COLUMNS)
+
+EVENTS = [None, None, None, 'Ignition On', 'Ignition Off', 'Harsh Breaking',
+          'Harsh Acceleration', 'Harsh Turn', 'SOS', '42']
+
+
+def make_frame(seed, devices=40):
+    """Synthetic pre-scoring frame covering the scorecard edge cases."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for d in range(devices):
+        n = int(rng.integers(1, 40))
+        profile = d % 5
+        t0 = pd.Timestamp('2024-01-15T00:00:00Z')
+        times = t0 + pd.to_timedelta(rng.permutation(n * 3)[:n] * 7, unit='s')
+        mileage = 1000 + np.cumsum(rng.choice([0, 0, 1, 2, -1], size=n)).astype(float)
+        mileage[rng.random(n) < 0.1] = np.nan
+        lat = 19.4 + np.cumsum(rng.choice([0, 0.00005, 0.001], size=n))
+        lng = -99.1 + np.cumsum(rng.choice([0, 0.002], size=n))
+        if profile == 0:
+            lat[:] = 19.4
+            lng[:] = -99.1
+        rpm = rng.choice([0.0, 1500.0, 2500.0, 9000.0, np.nan], size=n)
+        if profile == 1:
+            rpm[:] = 1800.0
+        if profile == 2:
+            rpm[:] = 0.0
+        temp = rng.choice([80.0, 85.0, 90.0, np.nan], size=n)
+        if profile == 3:
+            temp[:] = 85.0
+        if profile == 4:
+            temp[:] = np.nan
+        delay = rng.choice([5.0, 20.0, 45.0, 120.0, 400.0, np.nan], size=n)
+        if profile == 2:
+            delay[:] = np.nan
+        drivers = rng.choice([None, None, 'D1', 'D2'], size=n).astype(object)
+        frames.append(pd.DataFrame({
+            'imei': f'35{d:013d}',
+            'time': times,
+            'lat': lat,
+            'lng': lng,
+            'speed': rng.choice([0.0, 3.0, 30.0, 80.0, np.nan], size=n),
+            'ignitionOn': pd.Series(rng.choice([1, 0, None, True], size=n), dtype=object),
+            'mileage': mileage,
+            'engineRPM': rpm,
+            'engineCoolantTemperature': temp,
+            'fuelLevelInput': rng.choice([10.0, 55.5, 100.0, np.nan], size=n),
+            'driverId': drivers,
+            'event_type': pd.Series(rng.choice(EVENTS, size=n), dtype=object),
+            'delay_seconds': delay,
+            'has_rpm': rng.random(n) < 0.8,
+            'has_speed': rng.random(n) < 0.7,
+            'has_temp': rng.random(n) < 0.6,
+            'has_dist': rng.random(n) < 0.9,
+            'has_fuel_total': rng.random(n) < 0.5,
+            'has_fuel_level': rng.random(n) < 0.4,
+            'has_ignition': np.full(n, profile != 4),
+            'gps_ok': rng.random(n) < 0.95,
+        }))
+    # Interleave devices the way raw uploads arrive
+    df = pd.concat(frames, ignore_index=True)
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def reference_scorecard(df):
+    return df.groupby('imei').apply(calculate_v2_metrics).reset_index()
+
+
+def reference_stats(df):
+    """The per-device statistics aggregation the scorecard used to merge in."""
+    stats = df.groupby('imei').agg({
+        'time': [('Primer_Reporte', 'min'), ('Ultimo_Reporte', 'max')],
+        'mileage': [('KM_Inicial', 'min'), ('KM_Final', 'max')],
+        'speed': [('Velocidad_Promedio_(KPH)', 'mean'), ('Velocidad_Maxima_(KPH)', 'max')],
+        'engineRPM': [('RPM_Promedio', 'mean')],
+        'fuelLevelInput': [('Nivel_Combustible_Promedio_%', 'mean')]
+    })
+    stats.columns = stats.columns.droplevel(0)
+    stats = stats.reset_index()
+    stats['Distancia_Recorrida_(KM)'] = (stats['KM_Final'] - stats['KM_Inicial']).clip(lower=0)
+    return stats
+
+
+def reference_global_quality(df):
+    """The fleet radar as computed from separate whole-frame passes."""
+    return {
+        'gps_validity': df['gps_ok'].mean() * 100,
+        'ignition': float(df.groupby('imei').apply(calc_ignition_quality).mean()),
+        'delay': (df['delay_seconds'] < 60).mean() * 100,
+        'rpm': df['has_rpm'].mean() * 100,
+        'speed': df['has_speed'].mean() * 100,
+        'temp': df['has_temp'].mean() * 100,
+        'dist': df['has_dist'].mean() * 100,
+        'fuel': df['has_fuel_total'].mean() * 100
+    }
+
+
+def assert_scorecards_equal(actual, expected):
+    assert list(actual.columns) == SCORECARD_COLUMNS + STATS_COLUMNS
+    assert list(actual['imei']) == list(expected['imei'])
+    for column in SCORECARD_COLUMNS[1:]:
+        a = actual[column].tolist()
+        e = expected[column].tolist()
+        if isinstance(e[0], str):
+            assert a == e, column
+        else:
+            np.testing.assert_allclose(
+                np.asarray(a, dtype=float), np.asarray(e, dtype=float),
+                rtol=0, atol=1e-9, equal_nan=True, err_msg=column
+            )
+
+
+class TestScorecardParity:
+    """compute_fleet_metrics must reproduce calculate_v2_metrics."""
+
+    @pytest.mark.parametrize('seed', range(8))
+    def test_synthetic_fleets(self, seed):
+        """Randomized fleets with frozen sensors, drops, NaNs and events."""
+        df = make_frame(seed)
+        scorecard, _ = compute_fleet_metrics(df)
+        assert_scorecards_equal(scorecard, reference_scorecard(df))
+
+    def test_single_row_device(self):
+        """A device with one point has no diffs."""
+        df = make_frame(0, devices=1).head(1)
+        scorecard, _ = compute_fleet_metrics(df)
+        assert_scorecards_equal(scorecard, reference_scorecard(df))
+
+    def test_empty_frame(self):
+        """An empty frame yields an empty scorecard with all columns."""
+        df = make_frame(0, devices=1).head(0)
+        scorecard, global_quality = compute_fleet_metrics(df)
+        assert list(scorecard.columns) == SCORECARD_COLUMNS + STATS_COLUMNS
+        assert all(v == 0.0 for v in global_quality.values())
+
+
+class TestFleetStatsParity:
+    """The fused pass must also reproduce the statistics and the radar."""
+
+    @pytest.mark.parametrize('seed', range(4))
+    def test_statistics(self, seed):
+        df = make_frame(seed)
+        scorecard, _ = compute_fleet_metrics(df)
+        expected = reference_stats(df)
+        assert scorecard['imei'].tolist() == expected['imei'].tolist()
+        for column in ('Primer_Reporte', 'Ultimo_Reporte'):
+            assert scorecard[column].tolist() == expected[column].tolist(), column
+        for column in STATS_COLUMNS:
+            if column in ('Primer_Reporte', 'Ultimo_Reporte'):
+                continue
+            np.testing.assert_allclose(
+                scorecard[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                rtol=1e-12, atol=1e-9, equal_nan=True, err_msg=column
+            )
+
+    @pytest.mark.parametrize('seed', range(4))
+    def test_global_quality(self, seed):
+        df = make_frame(seed)
+        _, global_quality = compute_fleet_metrics(df)
+        expected = reference_global_quality(df)
+        assert global_quality.keys() == expected.keys()
+        for key, value in expected.items():
+            assert global_quality[key] == pytest.approx(value, abs=1e-9), key
+
+    def test_rows_without_imei(self):
+        """Rows without an IMEI count towards the radar but get no scorecard row."""
+        df = make_frame(1, devices=6)
+        df.loc[df.index[::5], 'imei'] = None
+        scorecard, global_quality = compute_fleet_metrics(df)
+        assert_scorecards_equal(scorecard, reference_scorecard(df))
+        expected = reference_global_quality(df)
+        for key, value in expected.items():
+            assert global_quality[key] == pytest.approx(value, abs=1e-9), key
+
+
+def _time_chunks(df, parts):
+    """Split a frame into consecutive time ranges, ties kept in input order."""
+    ordered = df.sort_values('time', kind='mergesort')
+    return [ordered.iloc[i] for i in np.array_split(np.arange(len(ordered)), parts)]
+
+
+def assert_fleet_metrics_equal(actual, expected):
+    scorecard, global_quality = actual
+    expected_scorecard, expected_quality = expected
+    assert_scorecards_equal(scorecard, expected_scorecard)
+    for column in STATS_COLUMNS:
+        np.testing.assert_array_equal(scorecard[column].isna(), expected_scorecard[column].isna(), column)
+        if column in ('Primer_Reporte', 'Ultimo_Reporte'):
+            assert scorecard[column].tolist() == expected_scorecard[column].tolist(), column
+        else:
+            np.testing.assert_allclose(
+                scorecard[column].to_numpy(dtype=float), expected_scorecard[column].to_numpy(dtype=float),
+                rtol=1e-12, atol=1e-9, equal_nan=True, err_msg=column
+            )
+    assert global_quality == pytest.approx(expected_quality, abs=1e-9)
+
+
+
+class TestPartialMetrics:
+    """Merged partial states finalize into the scorecard of the whole frame."""
+
+    @pytest.mark.parametrize('column', ['fuelLevelInput', 'speed', 'engineRPM', 'delay_seconds'])
+    def test_column_without_values(self, column):
+        """An all-null object column (as read back from storage) averages to NaN."""
+        df = make_frame(2)
+        df[column] = np.nan
+        expected = compute_fleet_metrics(df)
+        df[column] = pd.Series([None] * len(df), dtype=object)
+        assert_fleet_metrics_equal(compute_fleet_metrics(df), expected)
+
+    @pytest.mark.parametrize('seed', range(4))
+    @pytest.mark.parametrize('parts', [2, 7])
+    def test_time_chunks(self, seed, parts):
+        df = make_frame(seed)
+        df.loc[df.index[::9], 'imei'] = None
+        merged = PartialMetrics.merge(PartialMetrics.from_frame(c) for c in _time_chunks(df, parts))
+        assert_fleet_metrics_equal(merged.finalize(), compute_fleet_metrics(df))
+
+    def test_device_groups(self):
+        """Parts with disjoint devices, as parallel workers would score them."""
+        df = make_frame(5)
+        parts = [df[df['imei'].str[-1].astype(int) % 3 == k] for k in range(3)]
+        merged = PartialMetrics.merge(PartialMetrics.from_frame(p) for p in parts)
+        assert_fleet_metrics_equal(merged.finalize(), compute_fleet_metrics(df))
+
+    def test_equal_times_across_parts(self):
+        """Rows with the same time keep the part order, as in a stable sort."""
+        df = make_frame(2, devices=3)
+        df['time'] = df['time'].dt.floor('h')
+        chunks = _time_chunks(df, 5)
+        merged = PartialMetrics.merge(PartialMetrics.from_frame(c) for c in chunks)
+        assert_fleet_metrics_equal(merged.finalize(), compute_fleet_metrics(pd.concat(chunks)))
+
+    def test_missing_times_come_last(self):
+        df = make_frame(3, devices=5)
+        df.loc[df.index[::4], 'time'] = pd.NaT
+        chunks = _time_chunks(df, 3)
+        merged = PartialMetrics.merge(PartialMetrics.from_frame(c) for c in chunks)
+        assert_fleet_metrics_equal(merged.finalize(), compute_fleet_metrics(df))
+
+    def test_sketch_counts_distinct_values_across_parts(self):
+        """A sensor frozen within each part but changing between parts is not frozen."""
+        df = make_frame(0, devices=5)
+        df['engineCoolantTemperature'] = np.where(df['time'] < df['time'].median(), 80.0, 90.0)
+        parts = [PartialMetrics.from_frame(c) for c in _time_chunks(df, 2)]
+        assert (parts[0].state['temp_distinct'] <= 1).any()
+        merged = PartialMetrics.merge(parts)
+        assert_fleet_metrics_equal(merged.finalize(), compute_fleet_metrics(df))
+
+    def test_serialization_round_trip(self):
+        df = make_frame(6)
+        df.loc[df.index[::7], 'imei'] = None
+        records = PartialMetrics.from_frame(df).to_records()
+        restored = PartialMetrics.from_records(json.loads(json.dumps(records)))
+        assert_fleet_metrics_equal(restored.finalize(), compute_fleet_metrics(df))
+
+    def test_out_of_order_parts(self):
+        first, second = _time_chunks(make_frame(1), 2)
+        with pytest.raises(ValueError):
+            PartialMetrics.merge([PartialMetrics.from_frame(second), PartialMetrics.from_frame(first)])
+
+    def test_empty_parts(self):
+        df = make_frame(4)
+        merged = PartialMetrics.merge([PartialMetrics.from_frame(df.head(0)), PartialMetrics.from_frame(df)])
+        assert_fleet_metrics_equal(merged.finalize(), compute_fleet_metrics(df))
+        scorecard, _ = PartialMetrics.merge([]).finalize()
+        assert list(scorecard.columns) == SCORECARD_COLUMNS + STATS_COLUMNS
+
+    def test_chunks_with_column_without_values(self):
+        df = make_frame(3)
+        df['fuelLevelInput'] = pd.Series([None] * len(df), dtype=object)
+        chunks = [PartialMetrics.from_frame(c) for c in _time_chunks(df, 4)]
+        restored = [PartialMetrics.from_records(json.loads(json.dumps(p.to_records()))) for p in chunks]
+        expected = compute_fleet_metrics(df.assign(fuelLevelInput=np.nan))
+        assert_fleet_metrics_equal(PartialMetrics.merge(restored).finalize(), expected)
+
+    def test_empty_state(self):
+        scorecard, global_quality = PartialMetrics.empty().finalize()
+        assert list(scorecard.columns) == SCORECARD_COLUMNS + STATS_COLUMNS
+        assert all(v == 0.0 for v in global_quality.values())
@@ -0,0 +1,81 @@
+"""Tests for the JSON serialization layer."""
+import pytest
+import json
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serialization
+from serialization import frame_to_records, dumps
+from analysis import sanitize_for_json
+from extraction import extract_telemetry
+
+
+def reference_records(df):
+    """The previous copy / replace / to_dict / recursive sanitize pipeline."""
+    df_clean = df.copy()
+    for col in df_clean.select_dtypes(include=['datetime64[ns]', 'datetime64[ns, UTC]', 'datetime64']).columns:
+        df_clean[col] = df_clean[col].astype(str).replace(['NaT', 'nan', 'None'], None)
+    df_clean = df_clean.replace([np.inf, -np.inf, np.nan], None)
+    return sanitize_for_json(df_clean.to_dict(orient='records'))
+
+
+class TestFrameToRecords:
+    """frame_to_records matches the previous sanitizing pipeline."""
+
+    def test_edge_values(self):
+        df = pd.DataFrame({
+            'time': pd.to_datetime(['2024-01-15T08:00:00Z', None, '2024-01-15T08:00:05Z'], utc=True),
+            'speed': [1.5, np.nan, np.inf],
+            'count': np.array([1, 2, 3], dtype=np.int64),
+            'flag': [True, False, True],
+            'imei': ['1', None, '3'],
+            'mixed': pd.Series([np.float64(-np.inf), np.int64(4), 'x'], dtype=object),
+            'naive': pd.to_datetime(['2024-01-15 08:00:00', '2024-01-15 08:00:01', None]),
+            'subsecond': pd.to_datetime(['2024-01-15T08:00:00.5Z', None, '2024-01-15T08:00:01Z'], format='ISO8601', utc=True),
+            'local': pd.to_datetime(['2024-01-15T08:00:00Z'] * 3, utc=True).tz_convert('America/Mexico_City'),
+        })
+        records = frame_to_records(df)
+        assert records == reference_records(df)
+        assert {k: records[1][k] for k in ('time', 'speed', 'count', 'flag', 'imei', 'mixed')} == {
+            'time': None, 'speed': None, 'count': 2, 'flag': False, 'imei': None, 'mixed': 4}
+        assert records[0]['time'] == '2024-01-15 08:00:00+00:00'
+        assert type(records[0]['count']) is int
+        assert type(records[1]['mixed']) is int
+        assert records[0]['mixed'] is None and records[2]['speed'] is None
+
+    def test_matches_reference_on_telemetry(self, sample_telemetry):
+        df = extract_telemetry(sample_telemetry).to_dataframe()
+        df['time'] = pd.to_datetime(df['time'], format='ISO8601', errors='coerce', utc=True)
+        records = frame_to_records(df)
+        assert records == reference_records(df)
+        assert json.loads(dumps(records)) == records
+
+    def test_empty_frame(self):
+        assert frame_to_records(pd.DataFrame({'a': []})) == []
+
+
+class TestDumps:
+    """dumps produces compact JSON with either backend."""
+
+    @pytest.mark.parametrize('backend', ['orjson', 'json'])
+    def test_backends_agree(self, backend, monkeypatch):
+        if backend == 'json':
+            monkeypatch.setattr(serialization, 'orjson', None)
+        elif serialization.orjson is None:
+            pytest.skip("orjson not installed")
+        payload = {'a': [1, 2.5, None, 'x'], 'n': np.int64(3), 'f': np.float32(0.5),
+                   't': pd.Timestamp('2024-01-15T08:00:00Z')}
+        assert json.loads(dumps(payload)) == {
+            'a': [1, 2.5, None, 'x'], 'n': 3, 'f': 0.5, 't': '2024-01-15T08:00:00+00:00'
+        }
+
+    def test_api_responses_use_backend(self, client):
+        response = client.get('/api/jobs/queue')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/json'
+        assert b'": ' not in response.get_data()  # compact encoding
+        assert 'queued' in response.get_json()
@@ -0,0 +1,133 @@
+"""Tests for the columnar telemetry store."""
+import pytest
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, COLUMNAR_STORAGE, SQLITE_STORAGE, TELEMETRY_COLUMN_MAP
+from app import process_log_data
+from export import stream_csv
+
+TIMES = [None, '2024-01-01 00:00:02', '2024-01-01 00:00:01', None,
+         '2024-01-01 00:00:02', '2024-01-01 00:00:03', '2024-01-01 00:00:01',
+         None, '2024-01-01 00:00:02', '2024-01-01 00:00:04']
+
+
+@pytest.fixture
+def stores(tmp_path, sample_telemetry):
+    """The same analyses saved to a SQLite-backed and a columnar database.
+
+    'a1' is the sample fixture; 'a2' has NULL and repeated times, mixed
+    value types and missing values.
+    """
+    analysis = process_log_data(sample_telemetry, 'test.json')
+    crafted = dict(analysis, raw_data_sample=[
+        {'imei': ('A', 'B', None)[i % 3], 'time': t, 'speed': float(i) if i % 4 else None,
+         'heading': i, 'reportMode': i if i % 2 else 'mode', 'isMoving': i % 2 == 0,
+         'ignitionOn': (None, 1, False, True)[i % 4],
+         'driverId': 'Ñandú' if i == 5 else None}
+        for i, t in enumerate(TIMES)
+    ])
+    databases = []
+    for storage in (SQLITE_STORAGE, COLUMNAR_STORAGE):
+        db = Database(str(tmp_path / f'{storage}.db'), telemetry_storage=storage)
+        db.save_analysis('a1', analysis)
+        db.save_analysis('a2', crafted)
+        databases.append(db)
+    return databases
+
+
+def _walk(db, analysis_id, per_page, direction='next_cursor', start='', **kwargs):
+    """Follow cursors from `start`, returning every page's rows."""
+    pages, cursor = [], start
+    while cursor is not None:
+        page = db.get_telemetry_page(analysis_id, per_page=per_page, cursor=cursor, **kwargs)
+        pages.append(page['rows'])
+        cursor = page[direction]
+    return pages
+
+
+class TestColumnarStore:
+    """Telemetry served from column files equals the telemetry_data rows."""
+
+    def test_rows_not_in_sqlite(self, stores):
+        _, columnar = stores
+        with columnar.get_connection() as conn:
+            assert conn.execute('SELECT COUNT(*) FROM telemetry_data').fetchone()[0] == 0
+        assert os.path.isdir(os.path.join(columnar.telemetry_dir, 'a1'))
+
+    @pytest.mark.parametrize('analysis_id', ['a1', 'a2'])
+    @pytest.mark.parametrize('per_page', [1, 3, 100])
+    def test_pages_match(self, stores, analysis_id, per_page):
+        sqlite_db, columnar = stores
+        imeis = {r['imei'] for r in sqlite_db.get_telemetry_page(analysis_id, per_page=1000)['rows']}
+        for imei in [None, 'missing'] + sorted(i for i in imeis if i):
+            first = sqlite_db.get_telemetry_page(analysis_id, per_page=per_page, imei=imei)
+            for page in range(1, first['pages'] + 1):
+                expected = sqlite_db.get_telemetry_page(analysis_id, page=page, per_page=per_page, imei=imei)
+                actual = columnar.get_telemetry_page(analysis_id, page=page, per_page=per_page, imei=imei)
+                assert {k: v for k, v in actual.items() if not k.endswith('cursor')} == \
+                    {k: v for k, v in expected.items() if not k.endswith('cursor')}
+
+    @pytest.mark.parametrize('per_page', [1, 2, 4])
+    @pytest.mark.parametrize('imei', [None, 'A'])
+    def test_cursor_walks_match(self, stores, per_page, imei):
+        sqlite_db, columnar = stores
+        forward = _walk(columnar, 'a2', per_page, imei=imei)
+        assert forward == _walk(sqlite_db, 'a2', per_page, imei=imei)
+
+        last = columnar.get_telemetry_page('a2', page=len(forward), per_page=per_page, imei=imei)
+        if last['prev_cursor']:
+            backward = _walk(columnar, 'a2', per_page, direction='prev_cursor',
+                             start=last['prev_cursor'], imei=imei)
+            assert backward[::-1] == forward[:-1]
+
+    def test_export_matches(self, stores):
+        sqlite_db, columnar = stores
+        for analysis_id in ('a1', 'a2'):
+            assert b''.join(stream_csv(columnar.iter_telemetry(analysis_id, batch_size=3))) == \
+                b''.join(stream_csv(sqlite_db.iter_telemetry(analysis_id)))
+
+    def test_rows_match(self, stores):
+        """Row tuples read back alike, absent flags as None."""
+        rows = [[row for batch in db.iter_telemetry('a2') for row in batch] for db in stores]
+        assert rows[0] == rows[1]
+        position = [key for _, key in TELEMETRY_COLUMN_MAP].index('ignitionOn')
+        assert {row[position] for row in rows[1]} == {None, 0, 1}
+
+    def test_delete_removes_files(self, stores):
+        _, columnar = stores
+        columnar.delete_analysis('a1')
+        assert not os.path.exists(os.path.join(columnar.telemetry_dir, 'a1'))
+        assert columnar.get_telemetry_page('a1') is None
+
+    def test_failed_save_leaves_no_files(self, stores, sample_telemetry):
+        _, columnar = stores
+        with pytest.raises(Exception):
+            columnar.save_analysis('a1', process_log_data(sample_telemetry, 'again.json'))
+        assert columnar.get_telemetry_page('a1')['total'] > 0
+
+        broken = process_log_data(sample_telemetry, 'broken.json')
+        broken['scorecard'].append({'imei': object()})
+        with pytest.raises(Exception):
+            columnar.save_analysis('a3', broken)
+        assert not os.path.exists(os.path.join(columnar.telemetry_dir, 'a3'))
+
+    def test_reads_both_storages(self, stores):
+        """Switching backends keeps earlier analyses readable."""
+        sqlite_db, columnar = stores
+        reopened = Database(sqlite_db.db_path, telemetry_storage=COLUMNAR_STORAGE,
+                            telemetry_dir=columnar.telemetry_dir)
+        assert reopened.get_telemetry_page('a1') == sqlite_db.get_telemetry_page('a1')
+
+    def test_pickles_with_storage(self, stores):
+        _, columnar = stores
+        copy = pickle.loads(pickle.dumps(columnar))
+        assert copy.telemetry_storage == COLUMNAR_STORAGE
+        assert copy.get_telemetry_page('a2') == columnar.get_telemetry_page('a2')
+
+    def test_unknown_storage(self, tmp_path):
+        with pytest.raises(ValueError):
+            Database(str(tmp_path / 'x.db'), telemetry_storage='csv')
@@ -0,0 +1,88 @@
+"""Tests for the synchronous upload endpoint."""
+import pytest
+import io
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from database import Database
+
+
+@pytest.fixture
+def upload(tmp_path, monkeypatch, client, sample_telemetry):
+    """Post the sample fixture to /api/upload against a temporary database."""
+    db = Database(str(tmp_path / 'upload.db'))
+    monkeypatch.setattr(app_module, 'db', db)
+    monkeypatch.setattr(app_module, 'UPLOAD_FOLDER', str(tmp_path))
+    body = json.dumps(sample_telemetry).encode('utf-8')
+
+    def post(query=''):
+        return client.post(f'/api/upload{query}', data={'file': (io.BytesIO(body), 'sample.json')},
+                           content_type='multipart/form-data')
+    return db, post
+
+
+class TestUploadResponse:
+    """The upload response leaves out telemetry rows unless asked for."""
+
+    def test_lean_by_default(self, upload):
+        db, post = upload
+        response = post()
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['data']['raw_data_sample'] == []
+        stored = db.get_analysis(body['id'])
+        assert body['data']['summary'] == stored['summary']
+        assert body['data']['data_quality'] == stored['data_quality']
+        assert [r['imei'] for r in body['data']['scorecard']] == [r['imei'] for r in stored['scorecard']]
+        # The rows are still saved, for paging
+        assert db.get_telemetry_page(body['id'])['total'] == stored['summary']['total_records']
+
+    def test_full_opt_in(self, upload):
+        db, post = upload
+        lean = post()
+        full = post('?full=true')
+        rows = full.get_json()['data']['raw_data_sample']
+        assert len(rows) == full.get_json()['data']['summary']['total_records']
+        assert len(full.get_data()) > len(lean.get_data())
+
+
+class TestDeduplication:
+    """Identical uploads reuse the analysis of the same analyzer version."""
+
+    def test_repeat_upload_reuses_analysis(self, upload):
+        db, post = upload
+        first = post().get_json()
+        second = post().get_json()
+        assert second['deduplicated'] is True
+        assert second['id'] == first['id']
+        assert second['data']['summary'] == first['data']['summary']
+        assert second['data']['raw_data_sample'] == []
+        assert len(db.get_history()) == 1
+
+    def test_full_rows_from_store(self, upload):
+        db, post = upload
+        processed = post('?full=true&reprocess=true').get_json()
+        reused = post('?full=true').get_json()
+        assert reused['deduplicated'] is True
+        rows = reused['data']['raw_data_sample']
+        assert len(rows) == len(processed['data']['raw_data_sample'])
+
+    def test_reprocess_bypasses_cache(self, upload):
+        db, post = upload
+        first = post().get_json()
+        second = post('?reprocess=true').get_json()
+        assert 'deduplicated' not in second
+        assert second['id'] != first['id']
+
+    def test_new_analyzer_version_reprocesses(self, upload, monkeypatch):
+        db, post = upload
+        first = post().get_json()
+        monkeypatch.setattr(app_module, 'ANALYZER_VERSION', 'next')
+        second = post().get_json()
+        assert second['id'] != first['id']
+        # Later uploads reuse the analysis of the new version
+        assert post().get_json()['id'] == second['id']
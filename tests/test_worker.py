@@ -0,0 +1,439 @@
+"""Tests for the background job worker pool."""
+import pytest
+import json
+import time
+import sqlite3
+import threading
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import worker
+from analysis import ANALYZER_VERSION, process_log_data
+from database import Database
+
+
+def slow_process(logs_data, filename, progress=None):
+    """Job body that never finishes in time."""
+    time.sleep(60)
+
+
+def hungry_process(logs_data, filename, progress=None):
+    """Job body that allocates far more than its memory limit."""
+    return bytearray(8 * 1024 ** 3)
+
+
+def crashing_process(logs_data, filename, progress=None):
+    """Job body that kills its own process."""
+    os._exit(3)
+
+
+def parallel_process(logs_data, filename, progress=None):
+    """process_log_data extracting one log entry per chunk on two processes."""
+    import analysis
+    analysis.EXTRACTION_WORKERS = 2
+    analysis.EXTRACTION_CHUNK_SIZE = 1
+    return analysis.process_log_data(logs_data, filename, progress=progress)
+
+
+@pytest.fixture
+def jobs(tmp_path, sample_telemetry):
+    """Database holding the queue, and an upload file."""
+    path = tmp_path / 'upload.json'
+    path.write_text(json.dumps(sample_telemetry))
+    return Database(str(tmp_path / 'jobs.db')), str(path)
+
+
+def _wait_for(db, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = worker.get_job_status(job_id, db)
+        if status['status'] in ('completed', 'failed'):
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def _run(jobs, process_func, **kwargs):
+    db, path = jobs
+    pool = worker.BackgroundWorker(process_func, db, poll_interval=0.1, **kwargs)
+    pool.start()
+    try:
+        job_id = worker.submit_job(path, 'upload.json', db)
+        return job_id, _wait_for(db, job_id)
+    finally:
+        pool.stop()
+
+
+def _slow_save(monkeypatch, seconds):
+    """Make Database.save_analysis hold its transaction `seconds` longer."""
+    import database
+    store_positions = database._store_device_positions
+
+    def slow_store_positions(*args):
+        time.sleep(seconds)
+        return store_positions(*args)
+    monkeypatch.setattr(database, '_store_device_positions', slow_store_positions)
+
+
+class TestIsolatedJobs:
+    """Jobs run in child processes supervised by the worker threads."""
+
+    def test_completes_and_saves(self, jobs, sample_telemetry):
+        db, _ = jobs
+        job_id, status = _run(jobs, process_log_data)
+        assert status['progress'] == 100
+        assert 'data' not in status
+        assert db.analysis_exists(status['analysis_id'])
+        stored = db.get_job(job_id)
+        assert stored['status'] == 'completed'
+        # Counters reported by the pipeline in the child process
+        assert stored['detail']['records_parsed'] == len(sample_telemetry)
+        assert stored['detail']['devices_scored'] > 0
+        assert stored['eta_seconds'] is None
+
+    def test_parallel_extraction(self, jobs, sample_telemetry):
+        """The job process can start the extraction pool's processes."""
+        db, _ = jobs
+        job_id, status = _run(jobs, parallel_process)
+        assert status['status'] == 'completed', status.get('error')
+        assert db.get_job(job_id)['detail']['records_parsed'] == len(sample_telemetry)
+
+    def test_time_limit(self, jobs):
+        db, _ = jobs
+        job_id, status = _run(jobs, slow_process, job_timeout=1)
+        assert status['status'] == 'failed'
+        assert 'time limit' in status['error']
+        assert db.get_job(job_id)['status'] == 'failed'
+
+    def test_memory_limit(self, jobs):
+        _, status = _run(jobs, hungry_process, memory_limit_mb=4096)
+        assert status['status'] == 'failed'
+        assert status['error'] == 'MemoryError'
+
+    def test_process_crash_is_retried(self, jobs):
+        db, _ = jobs
+        job_id, status = _run(jobs, crashing_process, max_attempts=2)
+        assert status['status'] == 'failed'
+        assert 'exit code 3' in status['error']
+        assert 'gave up after 2 attempts' in status['error']
+        assert db.get_job(job_id)['attempts'] == 2
+
+
+class TestInThreadJobs:
+    """Without isolation the job runs on the worker thread."""
+
+    def test_completes_without_payload_in_memory(self, jobs):
+        db, _ = jobs
+        job_id, status = _run(jobs, process_log_data, isolate=False)
+        assert status['status'] == 'completed'
+        assert 'data' not in status
+        assert 'data' not in worker.job_results.get(job_id)
+        assert db.analysis_exists(status['analysis_id'])
+
+    def test_endpoint_loads_payload(self, jobs, client, monkeypatch):
+        """/api/job/<id> reads the completed analysis from the database."""
+        import app as app_module
+        db, _ = jobs
+        monkeypatch.setattr(app_module, 'db', db)
+        job_id, status = _run(jobs, process_log_data, isolate=False)
+
+        data = client.get(f'/api/job/{job_id}').get_json()
+        assert data['status'] == 'completed'
+        assert data['data'] == db.get_analysis(status['analysis_id'])
+        assert data['data']['summary']['total_devices'] > 0
+
+    def test_reuses_analysis_of_identical_content(self, jobs, sample_telemetry):
+        db, path = jobs
+        result = process_log_data(sample_telemetry, 'earlier.json')
+        db.save_analysis('earlier', result, content_hash='abc', analyzer_version=ANALYZER_VERSION)
+        pool = worker.BackgroundWorker(slow_process, db, poll_interval=0.1, isolate=False)
+        pool.start()
+        try:
+            job_id = worker.submit_job(path, 'upload.json', db, content_hash='abc')
+            status = _wait_for(db, job_id, timeout=10)
+        finally:
+            pool.stop()
+        assert status['status'] == 'completed'
+        assert status['analysis_id'] == 'earlier'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStatusCache:
+    """In-memory job statuses are bounded by age and count."""
+
+    def test_expires_after_ttl(self):
+        clock = FakeClock()
+        evicted = []
+        cache = worker.StatusCache(max_entries=10, ttl_seconds=60,
+                                   on_evict=evicted.append, clock=clock)
+        cache['a'] = {'status': 'completed'}
+        clock.now = 60
+        assert cache.get('a') == {'status': 'completed'}
+        clock.now = 61
+        assert 'a' not in cache
+        assert evicted == ['a']
+
+    def test_evicts_least_recently_used(self):
+        clock = FakeClock()
+        cache = worker.StatusCache(max_entries=2, ttl_seconds=60, clock=clock)
+        cache['a'] = {'status': 'processing'}
+        cache['b'] = {'status': 'processing'}
+        cache.get('a')
+        cache['c'] = {'status': 'pending'}
+        assert 'b' not in cache
+        assert 'a' in cache and 'c' in cache
+        assert len(cache) == 2
+
+    def test_updates_expire_stale_entries(self):
+        clock = FakeClock()
+        cache = worker.StatusCache(max_entries=10, ttl_seconds=60, clock=clock)
+        cache['old'] = {'status': 'completed'}
+        clock.now = 100
+        cache['new'] = {'status': 'pending'}
+        assert len(cache) == 1
+
+    def test_evicted_job_answered_by_database(self, jobs):
+        db, path = jobs
+        job_id = worker.submit_job(path, 'upload.json', db)
+        with worker.job_lock:
+            worker.job_results[job_id] = {'status': 'processing', 'progress': 50}
+            worker.job_results.pop(job_id)
+        assert worker.get_job_status(job_id, db)['status'] == 'pending'
+
+
+class TestDurableQueue:
+    """processing_jobs is the queue, shared by every worker on the database."""
+
+    def test_claims_are_exclusive(self, jobs):
+        db, path = jobs
+        ids = [worker.submit_job(path, f'upload{i}.json', db) for i in range(3)]
+        claimed = [db.claim_job(f'owner{i}', 60) for i in range(4)]
+        assert [c['id'] for c in claimed[:3]] == ids
+        assert claimed[3] is None
+        assert all(c['status'] == 'processing' and c['attempts'] == 1 for c in claimed[:3])
+
+    def test_heartbeat_keeps_lease(self, jobs):
+        db, path = jobs
+        job_id = worker.submit_job(path, 'upload.json', db)
+        db.claim_job('me', 10, now=1000)
+        assert db.heartbeat_job(job_id, 'me', 10, now=1008)
+        assert not db.heartbeat_job(job_id, 'someone-else', 10, now=1008)
+        # Renewed until 1018: not abandoned at 1015
+        assert db.recover_jobs(max_attempts=3, now=1015) == (0, 0)
+
+    def test_recovers_abandoned_jobs(self, jobs):
+        db, path = jobs
+        requeue_id = worker.submit_job(path, 'a.json', db)
+        exhausted_id = worker.submit_job(path, 'b.json', db)
+        db.claim_job('dead', 10, now=1000)
+        db.claim_job('dead', 10, now=1000)
+        with db.get_connection() as conn:
+            conn.execute('UPDATE processing_jobs SET attempts = 3 WHERE id = ?', (exhausted_id,))
+
+        assert db.recover_jobs(max_attempts=3, now=1011) == (1, 1)
+        assert db.get_job(requeue_id)['status'] == 'pending'
+        assert db.get_job(exhausted_id)['status'] == 'failed'
+        assert not db.heartbeat_job(requeue_id, 'dead', 10, now=1012)
+
+    def test_requeued_job_rejects_original_runner(self, jobs):
+        db, path = jobs
+        job_id = worker.submit_job(path, 'upload.json', db)
+        db.claim_job('slow', 10, now=1000)
+        assert db.recover_jobs(max_attempts=3, now=1011) == (1, 0)
+
+        assert not db.update_job_progress(job_id, 50, owner='slow')
+        assert not db.complete_job(job_id, 'late', owner='slow')
+        assert not db.fail_job(job_id, 'late', owner='slow')
+        assert db.get_job(job_id)['status'] == 'pending'
+        assert db.get_job(job_id)['analysis_id'] is None
+
+    def test_runner_abandons_job_requeued_mid_run(self, jobs, sample_telemetry):
+        """The original runner saves nothing once its job was recovered."""
+        db, path = jobs
+        job_id = worker.submit_job(path, 'upload.json', db)
+        db.claim_job('slow', 10, now=1000)
+
+        def requeued_process(logs_data, filename, progress=None):
+            db.recover_jobs(max_attempts=3, now=time.time() + 3600)
+            return process_log_data(logs_data, filename)
+
+        pool = worker.BackgroundWorker(requeued_process, db, isolate=False)
+        job = worker.ProcessingJob(job_id, path, 'upload.json', owner='slow')
+        pool._process_job(job)
+
+        assert db.get_job(job_id)['status'] == 'pending'
+        assert db.get_history() == []
+        assert worker.job_results.get(job_id) is None
+
+    def test_save_renews_lease(self, jobs, sample_telemetry, monkeypatch):
+        """A save outlasting the lease keeps it: heartbeats are blocked by its transaction."""
+        db, path = jobs
+        job_id = worker.submit_job(path, 'upload.json', db)
+        db.claim_job('saver', 1)
+        _slow_save(monkeypatch, seconds=1.5)
+
+        db.save_analysis('a1', process_log_data(sample_telemetry, 'test.json'), lease=(job_id, 'saver', 1))
+        assert db.recover_jobs(max_attempts=3) == (0, 0)
+        assert db.holds_lease(job_id, 'saver')
+
+    def test_save_after_lease_lost(self, jobs, sample_telemetry):
+        db, path = jobs
+        job_id = worker.submit_job(path, 'upload.json', db)
+        db.claim_job('saver', 10, now=1000)
+        db.recover_jobs(max_attempts=3, now=1011)
+        with pytest.raises(worker.LeaseLost):
+            db.save_analysis('a1', process_log_data(sample_telemetry, 'test.json'), lease=(job_id, 'saver', 10))
+        assert not db.analysis_exists('a1')
+
+    def test_job_with_save_longer_than_lease(self, jobs, monkeypatch):
+        """A job whose save outlasts the lease is not requeued once it commits."""
+        import database
+        db, path = jobs
+        # Heartbeats give up while the save holds the write lock
+        monkeypatch.setattr(database, 'BUSY_TIMEOUT_MS', 200)
+        _slow_save(monkeypatch, seconds=2.5)
+        requeued = []
+        save = db.save_analysis
+
+        def save_then_recover(*args, **kwargs):
+            save(*args, **kwargs)
+            # Another worker's recovery, between the save and the job's completion
+            requeued.append(Database(db.db_path).recover_jobs(max_attempts=3)[0])
+        monkeypatch.setattr(db, 'save_analysis', save_then_recover)
+
+        job_id, status = _run(jobs, process_log_data, isolate=False, lease_seconds=1)
+        assert status['status'] == 'completed'
+        assert requeued == [0]
+        assert db.get_job(job_id)['attempts'] == 1
+        assert db.analysis_exists(status['analysis_id'])
+
+    def test_worker_startup_resumes_stuck_job(self, jobs):
+        """A job left 'processing' by a killed process is finished on restart."""
+        db, path = jobs
+        job_id = worker.submit_job(path, 'upload.json', db)
+        db.claim_job('killed', 60, now=0)
+
+        pool = worker.BackgroundWorker(process_log_data, db, poll_interval=0.1)
+        pool.start()
+        try:
+            status = _wait_for(db, job_id)
+        finally:
+            pool.stop()
+        assert status['status'] == 'completed'
+        assert db.get_job(job_id)['attempts'] == 2
+
+    def test_migrates_old_jobs_table(self, tmp_path):
+        """Databases created before the queue columns get them added."""
+        path = str(tmp_path / 'old.db')
+        conn = sqlite3.connect(path)
+        conn.execute('''CREATE TABLE processing_jobs (
+            id TEXT PRIMARY KEY, analysis_id TEXT, filename TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending', progress INTEGER DEFAULT 0,
+            error_message TEXT, created_at TEXT DEFAULT CURRENT_TIMESTAMP, completed_at TEXT)''')
+        conn.execute("INSERT INTO processing_jobs (id, filename, status) VALUES ('old', 'f', 'processing')")
+        conn.commit()
+        conn.close()
+
+        db = Database(path)
+        assert db.get_job('old')['attempts'] == 0
+        # Stuck without a lease or a file to process: failed, not requeued
+        assert db.recover_jobs(max_attempts=3) == (0, 1)
+
+
+class TestQueueStats:
+
+    def test_reports_queue_depth(self, jobs):
+        db, path = jobs
+        pool = worker.BackgroundWorker(process_log_data, db, workers=3)
+        worker.submit_job(path, 'upload.json', db)
+        stats = pool.stats()
+        assert stats['queued'] == 1
+        assert stats['workers'] == 3
+        assert stats['running'] == 0
+
+
+class TestProgressEvents:
+    """Progress streams block on status changes instead of polling."""
+
+    def test_local_publish_wakes_waiter(self):
+        publisher = worker.BackgroundWorker(process_log_data)
+        publisher._publish('local-job', {'status': 'processing', 'progress': 5})
+        version, status = worker.wait_for_job_change('local-job')
+        assert status['progress'] == 5
+
+        woke = []
+
+        def waiter():
+            woke.append(worker.wait_for_job_change('local-job', version, timeout=10))
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.05)
+        started = time.monotonic()
+        publisher._publish('local-job', {'status': 'processing', 'progress': 40})
+        thread.join()
+        assert time.monotonic() - started < 1
+        assert woke[0][0] > version
+        assert woke[0][1]['progress'] == 40
+
+    def test_wait_times_out_unchanged(self):
+        worker.BackgroundWorker(process_log_data)._publish('idle-job', {'status': 'pending'})
+        version, _ = worker.wait_for_job_change('idle-job')
+        assert worker.wait_for_job_change('idle-job', version, timeout=0.05)[0] == version
+
+    def test_stream_follows_other_process(self, jobs):
+        """Updates committed by another connection reach every open stream."""
+        db, path = jobs
+        job_id = worker.submit_job(path, 'upload.json', db)
+        streams = [worker.generate_progress_events(job_id, db) for _ in range(20)]
+        events = [[] for _ in streams]
+
+        def consume(stream, received):
+            for event in stream:
+                received.append(event)
+
+        threads = [threading.Thread(target=consume, args=pair) for pair in zip(streams, events)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        # One poller serves every stream on the database
+        assert list(worker._job_pollers) == [db.db_path]
+
+        other = Database(db.db_path)
+        other.update_job_progress(job_id, 42, stage='read')
+        time.sleep(worker.JOB_POLL_INTERVAL * 3)
+        other.complete_job(job_id, None)
+        for thread in threads:
+            thread.join(timeout=10)
+
+        for received in events:
+            statuses = [json.loads(e[len('data: '):]) for e in received]
+            assert [s['progress'] for s in statuses] == [0, 42, 100]
+            assert statuses[-1]['status'] == 'completed'
+        assert not worker._watched_jobs.get(db.db_path)
+        # The poller stops with the last stream
+        time.sleep(worker.JOB_POLL_INTERVAL * 3)
+        assert db.db_path not in worker._job_pollers
+
+    def test_keepalive_on_idle_stream(self, jobs):
+        db, path = jobs
+        job_id = worker.submit_job(path, 'upload.json', db)
+        stream = worker.generate_progress_events(job_id, db, keepalive=0.1)
+        assert next(stream).startswith('data: ')
+        assert next(stream) == ': keep-alive\n\n'
+        stream.close()
+        assert job_id not in worker._stored_status
+
+    def test_unknown_job(self, jobs):
+        db, _ = jobs
+        events = list(worker.generate_progress_events('missing', db))
+        assert events == [f"data: {json.dumps({'error': 'Job not found'})}\n\n"]
@@ -2,198 +2,656 @@
 import os
 import json
 import uuid
+import signal
+import socket
+import itertools
 import threading
-import queue
 import time
 import logging
-from typing import Dict, Any, Optional, Callable
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from ingest import LogStreamReader
+from analysis import ANALYZER_VERSION
+from database import LeaseLost
+from extraction import shutdown_pool
+from progress import ProgressTracker, START_PROGRESS
 
 logger = logging.getLogger(__name__)
 
-# Global job queue and results store
-job_queue = queue.Queue()
-job_results: Dict[str, Dict[str, Any]] = {}
+# Bounds of the in-memory job statuses: a status not updated for
+# JOB_STATUS_TTL_SECONDS is dropped, and so are the least recently used
+# beyond JOB_STATUS_CACHE_SIZE. The job row still answers for them.
+JOB_STATUS_CACHE_SIZE = 1000
+JOB_STATUS_TTL_SECONDS = 3600
+
+
+class StatusCache:
+    """Job statuses by job ID, evicted by age (TTL) and by count (LRU).
+
+    Holds status metadata only, never analysis payloads. Not thread-safe
+    on its own: guard it with job_lock like the rest of the job state.
+    """
+
+    def __init__(self, max_entries: int = JOB_STATUS_CACHE_SIZE,
+                 ttl_seconds: float = JOB_STATUS_TTL_SECONDS,
+                 on_evict: Optional[Callable[[str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Statuses kept at most
+            ttl_seconds: Seconds a status is kept after its last update
+            on_evict: Called with the job ID of each evicted status
+            clock: Monotonic time source (for tests)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self.clock = clock
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def get(self, job_id: str, default=None):
+        """Return a job's status, or default if absent or expired."""
+        entry = self._entries.get(job_id)
+        if entry is None:
+            return default
+        updated_at, status = entry
+        if self.clock() - updated_at > self.ttl_seconds:
+            self._evict(job_id)
+            return default
+        self._entries.move_to_end(job_id)
+        return status
+
+    def __setitem__(self, job_id: str, status: Dict[str, Any]) -> None:
+        self._entries[job_id] = (self.clock(), status)
+        self._entries.move_to_end(job_id)
+        self._evict_stale()
+
+    def pop(self, job_id: str, default=None):
+        """Remove and return a job's status."""
+        entry = self._entries.pop(job_id, None)
+        return default if entry is None else entry[1]
+
+    def _evict(self, job_id: str) -> None:
+        del self._entries[job_id]
+        if self.on_evict:
+            self.on_evict(job_id)
+
+    def _evict_stale(self) -> None:
+        """Drop entries beyond max_entries, then expired ones, oldest first."""
+        now = self.clock()
+        while self._entries:
+            job_id, (updated_at, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and now - updated_at <= self.ttl_seconds:
+                break
+            self._evict(job_id)
+
+
+def _forget_job_version(job_id: str) -> None:
+    """Drop the change sequence of an evicted status unless it is watched."""
+    if job_id not in _stored_status:
+        _job_versions.pop(job_id, None)
+
+
+# Status of the jobs processed by this process; the processing_jobs table
+# is the queue and the source of truth for every other job
+job_results = StatusCache(on_evict=_forget_job_version)
 job_lock = threading.Lock()
 
+# Notified on every job status change seen by this process, whether
+# published here or read from the database for a watched job
+job_changed = threading.Condition(job_lock)
+
+# Change sequence number of each job's status, from one counter
+_job_versions: Dict[str, int] = {}
+_job_sequence = itertools.count(1)
+
+# Jobs with open progress streams, per database ({db_path: {job_id:
+# watchers}}), their status as last read from the database, and the poller
+# thread of each database
+_watched_jobs: Dict[str, Dict[str, int]] = {}
+_stored_status: Dict[str, Optional[Dict[str, Any]]] = {}
+_job_pollers: Dict[str, threading.Thread] = {}
+
+# Seconds between checks for job changes committed by other connections
+# while progress streams are open
+JOB_POLL_INTERVAL = 0.5
+
+# Seconds between keep-alive comments on a progress stream with no updates
+SSE_KEEPALIVE_SECONDS = 15
+
+# Set by submit_job so idle workers in this process claim new jobs at once
+# instead of at their next poll
+_job_available = threading.Event()
+
 
 class ProcessingJob:
     """Represents a background processing job."""
 
-    def __init__(self, job_id: str, file_path: str, filename: str):
+    def __init__(self, job_id: str, file_path: str, filename: str,
+                 content_hash: Optional[str] = None, owner: Optional[str] = None):
         self.job_id = job_id
         self.file_path = file_path
         self.filename = filename
+        self.content_hash = content_hash
+        # Lease owner of the claim; the job's row is only changed while it
+        # holds the lease (None for jobs not claimed from the queue)
+        self.owner = owner
         self.status = 'pending'
         self.progress = 0
-        self.result = None
         self.error = None
         self.analysis_id = None
 
 
+def _job_process_context():
+    """Multiprocessing context for isolated job processes.
+
+    forkserver (or spawn) children start from a clean interpreter, so the
+    multi-threaded web server is never forked with locks held. The analysis
+    module is preloaded into the fork server so each job skips the pandas
+    import.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['analysis'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _job_process_main(process_func: Callable, db, job: 'ProcessingJob', channel,
+                      memory_limit_mb: Optional[int], lease_seconds: float) -> None:
+    """Entry point of an isolated job process.
+
+    Runs the job with a BackgroundWorker that publishes status changes
+    through `channel` instead of the (parent's) in-memory results store.
+    The process leads its own process group, so stopping it also stops the
+    processes it started (see _signal_job_process).
+    """
+    if hasattr(os, 'setpgid'):
+        os.setpgid(0, 0)
+    if memory_limit_mb:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            logger.warning(f"Could not apply memory limit to job {job.job_id}: {e}")
+
+    worker = BackgroundWorker(process_func, db, lease_seconds=lease_seconds)
+    worker._channel = channel
+    try:
+        worker._process_job(job)
+    finally:
+        channel.close()
+        # The extraction pool's processes would outlive this one
+        shutdown_pool()
+
+
+def _signal_job_process(process, kill: bool = False) -> None:
+    """Terminate (or kill) a job process together with its process group."""
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL if kill else signal.SIGTERM)
+            return
+        except (ProcessLookupError, PermissionError):
+            pass  # Not its own group leader yet, or already gone
+    if kill:
+        process.kill()
+    else:
+        process.terminate()
+
+
+class _LeaseKeeper:
+    """Renews a job's lease from a background thread while it is processed."""
+
+    def __init__(self, db, job_id: str, owner: str, lease_seconds: float):
+        self.db = db
+        self.job_id = job_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'lease-{job_id}', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.db.heartbeat_job(self.job_id, self.owner, self.lease_seconds):
+                    self.lost = True
+                    logger.warning(f"Lost the lease on job {self.job_id}")
+                    return
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {self.job_id} failed: {e}")
+
+
 class BackgroundWorker:
-    """Worker thread for processing large files in the background."""
+    """Pool of worker threads processing large files in the background.
+
+    Each thread claims jobs one at a time from the processing_jobs table,
+    which any number of app processes share as a queue: a claimed job is
+    leased to its worker, which renews the lease by heartbeat while it runs.
+    Jobs whose worker stopped heartbeating are requeued (up to max_attempts
+    claims) by whichever worker notices first, including at startup.
+
+    With isolation enabled (the default), a thread runs its job in a fresh
+    child process and supervises it, enforcing the per-job time limit; the
+    child applies the memory limit to itself. Without isolation the job runs
+    on the thread itself and the limits are not enforced.
+    """
 
-    def __init__(self, process_func: Callable, db=None):
+    def __init__(self, process_func: Callable, db=None, workers: int = 1,
+                 job_timeout: Optional[float] = None, memory_limit_mb: Optional[int] = None,
+                 isolate: bool = True, lease_seconds: float = 60, max_attempts: int = 3,
+                 poll_interval: float = 1.0):
         """Initialize the background worker.
 
         Args:
-            process_func: Function to process log data (process_log_data)
+            process_func: Function to process log data (process_log_data),
+                called as process_func(logs_data, filename, progress=...);
+                must be importable by module path when isolate is True
             db: Database instance for saving results
+            workers: Number of jobs processed concurrently
+            job_timeout: Seconds after which an isolated job is killed
+                (None or 0 for no limit)
+            memory_limit_mb: Address-space limit of an isolated job
+                process, in MB (None or 0 for no limit)
+            isolate: Run each job in its own process
+            lease_seconds: How long a claimed job stays leased without a
+                heartbeat; heartbeats are sent every third of it
+            max_attempts: Claims of a job before it is failed instead of
+                requeued after a crash or lost worker
+            poll_interval: Seconds between queue polls when idle
         """
         self.process_func = process_func
         self.db = db
+        self.workers = max(1, workers)
+        self.job_timeout = job_timeout or None
+        self.memory_limit_mb = memory_limit_mb or None
+        self.isolate = isolate
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.poll_interval = poll_interval
         self._running = False
-        self._thread = None
+        self._last_recovery = 0.0
+        self._threads: List[threading.Thread] = []
+        self._active: Dict[str, Optional[int]] = {}
+        self._processes: Dict[str, multiprocessing.process.BaseProcess] = {}
+        self._channel = None
 
     def start(self):
-        """Start the worker thread."""
+        """Start the worker threads."""
         if self._running:
             return
+        if self.db is None:
+            raise ValueError("BackgroundWorker needs a database to take jobs from")
 
+        self._recover_jobs()
         self._running = True
-        self._thread = threading.Thread(target=self._worker_loop, daemon=True)
-        self._thread.start()
-        logger.info("Background worker started")
+        self._threads = [
+            threading.Thread(target=self._worker_loop, name=f'job-worker-{n}', daemon=True)
+            for n in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        mode = 'process' if self.isolate else 'thread'
+        logger.info(f"Background worker started ({self.workers} {mode} worker(s))")
 
     def stop(self):
-        """Stop the worker thread."""
+        """Stop the worker threads, terminating the job processes they supervise.
+
+        Terminated jobs are requeued for the next worker to claim.
+        """
         self._running = False
-        if self._thread:
-            self._thread.join(timeout=5)
+        with job_lock:
+            processes = list(self._processes.values())
+        for process in processes:
+            if process.is_alive():
+                _signal_job_process(process)
+        for thread in self._threads:
+            thread.join(timeout=5)
         logger.info("Background worker stopped")
 
+    def stats(self) -> Dict[str, Any]:
+        """Return the shared queue depth and the jobs this process is running."""
+        counts = self.db.job_counts() if self.db else {}
+        with job_lock:
+            active = dict(self._active)
+        return {
+            'queued': counts.get('pending', 0),
+            'processing': counts.get('processing', 0),
+            'running': len(active),
+            'workers': self.workers,
+            'isolated': self.isolate,
+            'running_jobs': [
+                {'job_id': job_id, 'pid': pid} for job_id, pid in active.items()
+            ]
+        }
+
+    def _owner(self) -> str:
+        """Lease owner name of the calling worker thread."""
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+    def _recover_jobs(self):
+        """Requeue jobs abandoned by crashed or stopped workers."""
+        self._last_recovery = time.monotonic()
+        requeued, failed = self.db.recover_jobs(self.max_attempts)
+        if requeued or failed:
+            logger.warning(f"Recovered abandoned jobs: {requeued} requeued, {failed} failed")
+
     def _worker_loop(self):
-        """Main worker loop that processes jobs from the queue."""
+        """Main worker loop that claims and processes jobs from the queue."""
+        owner = self._owner()
         while self._running:
             try:
-                # Wait for a job with timeout to allow checking _running flag
-                try:
-                    job = job_queue.get(timeout=1)
-                except queue.Empty:
+                if time.monotonic() - self._last_recovery > self.lease_seconds:
+                    self._recover_jobs()
+
+                _job_available.clear()
+                row = self.db.claim_job(owner, self.lease_seconds)
+                if row is None:
+                    # Wait with timeout to allow checking _running flag
+                    _job_available.wait(self.poll_interval)
                     continue
 
-                self._process_job(job)
-                job_queue.task_done()
+                job = ProcessingJob(row['id'], row['file_path'], row['filename'],
+                                    row['content_hash'], owner)
+                logger.info(f"Claimed job {job.job_id} (attempt {row['attempts']})")
+                with job_lock:
+                    self._active[job.job_id] = None
+                try:
+                    with _LeaseKeeper(self.db, job.job_id, owner, self.lease_seconds) as lease:
+                        if self.isolate:
+                            self._run_isolated(job, lease)
+                        else:
+                            self._process_job(job, lease)
+                finally:
+                    with job_lock:
+                        self._active.pop(job.job_id, None)
 
             except Exception as e:
                 logger.error(f"Worker error: {e}")
-
-    def _process_job(self, job: ProcessingJob):
-        """Process a single job."""
-        logger.info(f"Starting job {job.job_id}: {job.filename}")
-
+                time.sleep(self.poll_interval)
+
+    def _forget(self, job_id: str):
+        """Stop answering for a job from memory: the database has its status."""
+        with job_changed:
+            job_results.pop(job_id, None)
+            _job_versions[job_id] = next(_job_sequence)
+            job_changed.notify_all()
+
+    def _drop_lost_job(self, job: 'ProcessingJob'):
+        """Leave a job whose lease was lost to the worker that recovered it."""
+        logger.warning(f"Job {job.job_id} lost its lease; leaving it to the queue")
+        self._forget(job.job_id)
+
+    def _requeue(self, job: 'ProcessingJob', error: str):
+        """Put a job back on the queue after a crash, or fail it for good."""
+        logger.error(f"Job {job.job_id} interrupted: {error}")
+        if job.owner and not self.db.holds_lease(job.job_id, job.owner):
+            self._drop_lost_job(job)
+            return
+        if self.db.retry_job(job.job_id, error, self.max_attempts, owner=job.owner):
+            # Any process may pick it up next; stop answering from memory
+            self._forget(job.job_id)
+        else:
+            stored = self.db.get_job(job.job_id)
+            self._publish(job.job_id, {
+                'status': 'failed',
+                'progress': 0,
+                'error': stored['error_message'] if stored else error
+            })
+
+    def _run_isolated(self, job: 'ProcessingJob', lease: Optional['_LeaseKeeper'] = None):
+        """Run a job in a child process and relay its status updates.
+
+        The child is not a daemon, so the pipeline can start its own
+        processes (parallel extraction); this thread, and stop(), make sure
+        it never outlives its job. It is also stopped if `lease` is lost, as
+        the job is then requeued for another worker.
+        """
+        context = _job_process_context()
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_job_process_main,
+            args=(self.process_func, self.db, job, sender, self.memory_limit_mb, self.lease_seconds),
+            name=f'job-{job.job_id}'
+        )
         try:
-            # Update job status
-            self._update_job_status(job, 'processing', 10)
-
-            # Read the file
-            logs_data = []
-            with open(job.file_path, 'r', encoding='utf-8') as f:
+            process.start()
+        except Exception as e:
+            self._requeue(job, f"Could not start job process: {e}")
+            return
+        finally:
+            sender.close()
+        with job_lock:
+            self._active[job.job_id] = process.pid
+            self._processes[job.job_id] = process
+
+        deadline = time.monotonic() + self.job_timeout if self.job_timeout else None
+        timed_out = lost = False
+        while True:
+            wait = 1.0 if deadline is None else max(0.0, min(1.0, deadline - time.monotonic()))
+            if receiver.poll(wait):
                 try:
-                    logs_data = json.load(f)
-                except json.JSONDecodeError:
-                    f.seek(0)
-                    for line in f:
-                        if line.strip():
-                            try:
-                                logs_data.append(json.loads(line))
-                            except json.JSONDecodeError:
-                                pass
-
-            self._update_job_status(job, 'processing', 30)
-
-            # Process the data
-            result = self.process_func(logs_data, job.filename)
+                    job_id, state = receiver.recv()
+                except EOFError:
+                    break  # child closed its end: finished or died
+                self._publish(job_id, state)
+            elif deadline is not None and time.monotonic() >= deadline:
+                timed_out = True
+                break
+            if lease is not None and lease.lost:
+                lost = True
+                break
+        receiver.close()
+
+        if timed_out or lost:
+            _signal_job_process(process)
+        process.join(timeout=5)
+        if process.is_alive():
+            _signal_job_process(process, kill=True)
+            process.join()
+        with job_lock:
+            self._processes.pop(job.job_id, None)
 
-            if not result:
-                raise ValueError("No valid telemetry data found")
+        status = get_job_status(job.job_id)
+        if status and status.get('status') in ('completed', 'failed'):
+            return
+        if lost or (job.owner and not self.db.holds_lease(job.job_id, job.owner)):
+            self._drop_lost_job(job)
+            return
+        if not timed_out:
+            self._requeue(job, f"Job process exited unexpectedly (exit code {process.exitcode})")
+            return
+        # Deterministic for the same input, so not retried
+        error = f"Job exceeded the time limit of {self.job_timeout:g} seconds"
+        logger.error(f"Job {job.job_id} failed: {error}")
+        if self.db.fail_job(job.job_id, error, owner=job.owner):
+            self._publish(job.job_id, {'status': 'failed', 'progress': 0, 'error': error})
+        else:
+            self._drop_lost_job(job)
+
+    def _publish(self, job_id: str, state: Dict[str, Any]):
+        """Record a job status change (relayed to the parent when isolated)."""
+        if self._channel is not None:
+            self._channel.send((job_id, state))
+            return
+        with job_changed:
+            job_results[job_id] = state
+            _job_versions[job_id] = next(_job_sequence)
+            job_changed.notify_all()
 
-            self._update_job_status(job, 'processing', 70)
+    def _process_job(self, job: ProcessingJob, lease: Optional[_LeaseKeeper] = None):
+        """Process a single job.
 
-            # Save to database
-            analysis_id = str(uuid.uuid4())
-            if self.db:
-                self.db.save_analysis(analysis_id, result)
-                logger.info(f"Saved analysis {analysis_id} to database")
+        Abandoned, with nothing recorded, once the job's lease is lost
+        (`lease` reports it, or an update of the job row matches no lease):
+        the worker that recovered the job owns it from then on.
+        """
+        logger.info(f"Starting job {job.job_id}: {job.filename}")
 
-            self._update_job_status(job, 'processing', 90)
+        try:
+            # Update job status
+            self._update_job_status(job, 'processing', START_PROGRESS, lease=lease)
+
+            # The pipeline reports its stages through the tracker, which
+            # publishes throttled status updates with counters and an ETA
+            tracker = ProgressTracker(
+                lambda state: self._update_job_status(job, 'processing', state['progress'], state,
+                                                      lease=lease)
+            )
+
+            # An identical upload may have been analyzed while this job waited
+            analysis_id = saved_id = None
+            if self.db and job.content_hash:
+                analysis_id = self.db.find_analysis_by_content(job.content_hash, ANALYZER_VERSION)
+
+            if analysis_id:
+                logger.info(f"Job {job.job_id} reuses analysis {analysis_id} of identical content")
+            else:
+                # Stream the file into the processing function
+                logs_data = LogStreamReader(job.file_path)
+
+                # Process the data
+                result = self.process_func(logs_data, job.filename, progress=tracker)
+
+                if not result:
+                    raise ValueError("No valid telemetry data found")
+
+                # Save to database
+                self._check_lease(job, lease)
+                analysis_id = str(uuid.uuid4())
+                if self.db:
+                    self.db.save_analysis(analysis_id, result, progress=tracker,
+                                          content_hash=job.content_hash,
+                                          analyzer_version=ANALYZER_VERSION,
+                                          lease=(job.job_id, job.owner, self.lease_seconds)
+                                          if job.owner else None)
+                    logger.info(f"Saved analysis {analysis_id} to database")
+                    saved_id = analysis_id
 
             # Mark job as complete
             job.status = 'completed'
             job.progress = 100
-            job.result = result
             job.analysis_id = analysis_id
 
-            with job_lock:
-                job_results[job.job_id] = {
-                    'status': 'completed',
-                    'progress': 100,
-                    'analysis_id': analysis_id,
-                    'data': result
-                }
+            # Status only: clients load the saved analysis by ID, so the
+            # payload is not kept in memory
+            state = {
+                'status': 'completed',
+                'progress': 100,
+                'analysis_id': analysis_id
+            }
 
-            if self.db:
-                self.db.complete_job(job.job_id, analysis_id)
+            if self.db and not self.db.complete_job(job.job_id, analysis_id, owner=job.owner):
+                # Requeued while saving: the worker processing it now saves its own
+                if saved_id:
+                    self.db.delete_analysis(saved_id)
+                raise LeaseLost()
+            self._publish(job.job_id, state)
 
             logger.info(f"Completed job {job.job_id}")
 
+        except LeaseLost:
+            self._drop_lost_job(job)
+
         except Exception as e:
-            logger.error(f"Job {job.job_id} failed: {e}")
+            # e.g. MemoryError under the job memory limit has no message
+            error = str(e) or type(e).__name__
+            logger.error(f"Job {job.job_id} failed: {error}")
             job.status = 'failed'
-            job.error = str(e)
+            job.error = error
+
+            if self.db and not self.db.fail_job(job.job_id, error, owner=job.owner):
+                self._drop_lost_job(job)
+                return
+            self._publish(job.job_id, {
+                'status': 'failed',
+                'progress': 0,
+                'error': error
+            })
+
+    def _check_lease(self, job: ProcessingJob, lease: Optional[_LeaseKeeper] = None):
+        """Raise LeaseLost if the job is no longer leased to this worker."""
+        if (lease is not None and lease.lost) or \
+                (self.db and job.owner and not self.db.holds_lease(job.job_id, job.owner)):
+            raise LeaseLost()
+
+    def _update_job_status(self, job: ProcessingJob, status: str, progress: int,
+                           state: Optional[Dict[str, Any]] = None,
+                           lease: Optional[_LeaseKeeper] = None):
+        """Update job status in results store and database.
 
-            with job_lock:
-                job_results[job.job_id] = {
-                    'status': 'failed',
-                    'progress': 0,
-                    'error': str(e)
-                }
-
-            if self.db:
-                self.db.fail_job(job.job_id, str(e))
-
-    def _update_job_status(self, job: ProcessingJob, status: str, progress: int):
-        """Update job status in results store and database."""
+        Args:
+            job: The job
+            status: Job status
+            progress: Overall progress (0-100)
+            state: Progress fields from the ProgressTracker (stage,
+                eta_seconds, detail)
+            lease: Lease of the job, if renewed by this process
+
+        Raises:
+            LeaseLost: If the job is no longer leased to this worker
+        """
+        if lease is not None and lease.lost:
+            raise LeaseLost()
         job.status = status
         job.progress = progress
-
-        with job_lock:
-            job_results[job.job_id] = {
-                'status': status,
-                'progress': progress
-            }
-
-        if self.db:
-            self.db.update_job_progress(job.job_id, progress, status)
-
-
-def submit_job(file_path: str, filename: str, db=None) -> str:
+        state = state or {}
+
+        self._publish(job.job_id, {
+            **state,
+            'status': status,
+            'progress': progress
+        })
+
+        # While saving, this thread holds the database's write transaction,
+        # so the job row would only change at commit: the rows persisted are
+        # reported through the results store alone
+        if self.db and state.get('stage') != 'save':
+            updated = self.db.update_job_progress(
+                job.job_id, progress, status, stage=state.get('stage'),
+                eta_seconds=state.get('eta_seconds'), detail=state.get('detail'), owner=job.owner
+            )
+            if not updated and job.owner:
+                raise LeaseLost()
+
+
+def submit_job(file_path: str, filename: str, db, content_hash: Optional[str] = None) -> str:
     """Submit a new processing job.
 
+    The job is added to the processing_jobs queue, where a worker in any
+    app process sharing the database can claim it.
+
     Args:
         file_path: Path to the uploaded file
         filename: Original filename
-        db: Database instance (optional)
+        db: Database instance holding the queue
+        content_hash: SHA-256 of the file; the job reuses an analysis of
+            identical content if one is saved before it runs
 
     Returns:
         Job ID
     """
     job_id = str(uuid.uuid4())
-
-    # Create job record in database
-    if db:
-        db.create_job(job_id, filename)
-
-    # Initialize job result
-    with job_lock:
-        job_results[job_id] = {
-            'status': 'pending',
-            'progress': 0
-        }
-
-    # Create and queue the job
-    job = ProcessingJob(job_id, file_path, filename)
-    job_queue.put(job)
+    db.create_job(job_id, filename, file_path, content_hash)
+    _job_available.set()
 
     logger.info(f"Submitted job {job_id}: {filename}")
     return job_id
@@ -211,8 +669,9 @@ def get_job_status(job_id: str, db=None) -> Optional[Dict[str, Any]]:
     """
     # Check in-memory results first
     with job_lock:
-        if job_id in job_results:
-            return job_results[job_id].copy()
+        status = job_results.get(job_id)
+        if status is not None:
+            return status.copy()
 
     # Check database
     if db:
@@ -221,37 +680,154 @@ def get_job_status(job_id: str, db=None) -> Optional[Dict[str, Any]]:
     return None
 
 
-def generate_progress_events(job_id: str, db=None):
-    """Generator for Server-Sent Events progress updates.
+def _poll_watched_jobs(db) -> None:
+    """Job poller thread: read watched jobs whenever the database changes.
+
+    One thread per process and database serves every open progress stream.
+    It checks SQLite's data_version, which changes on any commit by another
+    connection, and re-reads the watched jobs in one query only then. It
+    exits when no job is watched.
+    """
+    data_version = None
+    while True:
+        with job_changed:
+            job_ids = list(_watched_jobs.get(db.db_path, ()))
+            if not job_ids:
+                _watched_jobs.pop(db.db_path, None)
+                del _job_pollers[db.db_path]
+                return
+        try:
+            current = db.data_version()
+            if current != data_version:
+                data_version = current
+                rows = db.get_jobs(job_ids)
+                with job_changed:
+                    changed = False
+                    for job_id in job_ids:
+                        if job_id in _stored_status and rows.get(job_id) != _stored_status[job_id]:
+                            _stored_status[job_id] = rows.get(job_id)
+                            _job_versions[job_id] = next(_job_sequence)
+                            changed = True
+                    if changed:
+                        job_changed.notify_all()
+        except Exception as e:
+            logger.warning(f"Job poller error: {e}")
+        time.sleep(JOB_POLL_INTERVAL)
+
+
+@contextmanager
+def watch_job(job_id: str, db=None):
+    """Track a job's status changes for wait_for_job_change.
+
+    Changes published by this process need no watching. With a database,
+    the job is also followed through the processing_jobs table, for jobs
+    run by other processes.
 
     Args:
         job_id: The job identifier
         db: Database instance (optional)
-
-    Yields:
-        SSE formatted progress events
     """
-    last_progress = -1
-
-    while True:
-        status = get_job_status(job_id, db)
+    if db is None:
+        yield
+        return
+
+    stored = db.get_job(job_id)
+    with job_changed:
+        watched = _watched_jobs.setdefault(db.db_path, {})
+        if job_id not in watched:
+            _stored_status[job_id] = stored
+            _job_versions.setdefault(job_id, next(_job_sequence))
+        watched[job_id] = watched.get(job_id, 0) + 1
+        if db.db_path not in _job_pollers:
+            poller = threading.Thread(
+                target=_poll_watched_jobs, args=(db,), name='job-poller', daemon=True
+            )
+            _job_pollers[db.db_path] = poller
+            poller.start()
+    try:
+        yield
+    finally:
+        with job_changed:
+            watched[job_id] -= 1
+            if not watched[job_id]:
+                del watched[job_id]
+                _stored_status.pop(job_id, None)
+                if job_id not in job_results:
+                    _job_versions.pop(job_id, None)
+
+
+def wait_for_job_change(job_id: str, version: int = 0,
+                        timeout: Optional[float] = None) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """Wait until a job's status changes from the given version.
+
+    The status published by this process wins over the one read from the
+    database, as in get_job_status.
 
-        if not status:
-            yield f"data: {json.dumps({'error': 'Job not found'})}\n\n"
-            break
+    Args:
+        job_id: The job identifier (watched with watch_job unless this
+            process runs it)
+        version: Version returned by the previous call (0 for the first)
+        timeout: Seconds to wait at most (None waits indefinitely)
 
-        current_progress = status.get('progress', 0)
+    Returns:
+        The current (version, status); the version is unchanged on timeout,
+        and the status is None for an unknown job
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with job_changed:
+        while True:
+            current = _job_versions.get(job_id, 0)
+            if current != version or current == 0:
+                break
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            job_changed.wait(remaining)
+        status = job_results.get(job_id) or _stored_status.get(job_id)
+        return current, (status.copy() if status else None)
+
+
+def generate_progress_events(job_id: str, db=None,
+                             keepalive: float = SSE_KEEPALIVE_SECONDS):
+    """Generator for Server-Sent Events progress updates.
 
-        # Only send updates when progress changes
-        if current_progress != last_progress:
-            yield f"data: {json.dumps(status)}\n\n"
-            last_progress = current_progress
+    Blocks on job status changes instead of polling: updates published by
+    this process wake it directly, and changes made by other processes are
+    picked up by the shared job poller.
 
-        # Check if job is complete or failed
-        if status.get('status') in ('completed', 'failed'):
-            break
+    Args:
+        job_id: The job identifier
+        db: Database instance (optional)
+        keepalive: Seconds between keep-alive comments while nothing changes
 
-        time.sleep(0.5)
+    Yields:
+        SSE formatted progress events
+    """
+    last_status = None
+    version = 0
+
+    with watch_job(job_id, db):
+        while True:
+            previous = version
+            version, status = wait_for_job_change(job_id, version, timeout=keepalive)
+
+            if not status:
+                yield f"data: {json.dumps({'error': 'Job not found'})}\n\n"
+                break
+
+            # Only send updates when the status changes (progress, stage,
+            # counters or ETA)
+            if status != last_status:
+                yield f"data: {json.dumps(status)}\n\n"
+                last_status = status
+            elif version == previous:
+                # Keeps proxies from closing an idle stream, and ends this
+                # generator once the client has gone
+                yield ": keep-alive\n\n"
+
+            # Check if job is complete or failed
+            if status.get('status') in ('completed', 'failed'):
+                break
 
 
 # Threshold for background processing (10MB)